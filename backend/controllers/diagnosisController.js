@@ -2,71 +2,6 @@ const axios = require('axios');
 const Diagnosis = require('../models/Diagnosis');
 const ML_API_BASE_URL = process.env.ML_API_URL || 'http://127.0.0.1:5000';
 
-const calculateBMI = (height, weight) => {
-    const heightM = height / 100;
-    return weight / (heightM * heightM);
-};
-
-const calculateBMICategory = (bmi) => {
-    if (bmi < 18.5) return 1;
-    if (bmi < 25) return 2;
-    if (bmi < 30) return 3;
-    return 4;
-};
-
-const calculatePulsePressure = (systolic, diastolic) => {
-    return systolic - diastolic;
-};
-
-const calculateMAP = (systolic, diastolic) => {
-    return diastolic + (systolic - diastolic) / 3;
-};
-
-const calculateBPCategory = (systolic, diastolic) => {
-    if (systolic < 120 && diastolic < 80) return 1;
-    if (systolic < 130 && diastolic < 80) return 2;
-    if ((systolic >= 130 && systolic < 140) || (diastolic >= 80 && diastolic < 90)) return 3;
-    if ((systolic >= 140 && systolic < 180) || (diastolic >= 90 && diastolic < 120)) return 4;
-    return 5;
-};
-
-const calculateAgeGroup = (age) => {
-    if (age < 40) return 1;
-    if (age < 50) return 2;
-    if (age < 60) return 3;
-    return 4;
-};
-
-const calculateLifestyleRisk = (smoke, alco, active) => {
-    let risk = 0;
-    if (smoke === 1) risk += 2;
-    if (alco === 1) risk += 1;
-    if (active === 0) risk += 1;
-    return risk;
-};
-
-const calculateMetabolicRisk = (cholesterol, gluc, bmi) => {
-    let risk = 0;
-    if (cholesterol >= 2) risk += 1;
-    if (gluc >= 2) risk += 1;
-    if (bmi > 30) risk += 1;
-    return risk;
-};
-
-const calculateRiskScore = (age, bmi, systolic, diastolic, cholesterol, gluc, smoke, alco, active) => {
-    let score = 0;
-    score += age > 50 ? 2 : 0;
-    score += bmi > 30 ? 2 : 0;
-    score += systolic > 140 ? 2 : 0;
-    score += diastolic > 90 ? 1 : 0;
-    score += cholesterol >= 2 ? 1 : 0;
-    score += gluc >= 2 ? 1 : 0;
-    score += smoke === 1 ? 2 : 0;
-    score += alco === 1 ? 1 : 0;
-    score += active === 0 ? 1 : 0;
-    return Math.min(score, 10);
-};
-
 const saveDiagnosis = async (req, res) => {
     try {
         const diagnosisData = req.body;
@@ -252,41 +187,18 @@ const predictDiagnosis = async (req, res) => {
             return res.status(400).json({ error: 'Patient data is required' });
         }
 
-        const bmi = calculateBMI(patientData.height, patientData.weight);
-        const pulsePressure = calculatePulsePressure(patientData.ap_hi, patientData.ap_lo);
-        const map = calculateMAP(patientData.ap_hi, patientData.ap_lo);
-        const bpCategory = calculateBPCategory(patientData.ap_hi, patientData.ap_lo);
-        const ageGroup = calculateAgeGroup(patientData.age);
-        const bmiCategory = calculateBMICategory(bmi);
-        const lifestyleRisk = calculateLifestyleRisk(patientData.smoke, patientData.alco, patientData.active);
-        const metabolicRisk = calculateMetabolicRisk(patientData.cholesterol, patientData.gluc, bmi);
-        const riskScore = calculateRiskScore(
-            patientData.age, bmi, patientData.ap_hi, patientData.ap_lo,
-            patientData.cholesterol, patientData.gluc, patientData.smoke, 
-            patientData.alco, patientData.active
-        );
-        
         const mappedData = {
             age_years: patientData.age,
             gender: patientData.gender,
             height: patientData.height,
             weight: patientData.weight,
-            bmi: parseFloat(bmi.toFixed(2)),
             ap_hi: patientData.ap_hi,
             ap_lo: patientData.ap_lo,
-            pulse_pressure: pulsePressure,
-            bp_category: bpCategory,
             cholesterol: patientData.cholesterol,
             gluc: patientData.gluc,
             smoke: patientData.smoke,
             alco: patientData.alco,
-            active: patientData.active,
-            age_group: ageGroup,
-            lifestyle_risk: lifestyleRisk,
-            metabolic_risk: metabolicRisk,
-            bmi_category: bmiCategory,
-            map: parseFloat(map.toFixed(2)),
-            risk_score: riskScore
+            active: patientData.active
         };
 
         const mlPayload = {
@@ -373,37 +285,26 @@ const batchPredict = async (req, res) => {
             return res.status(400).json({ error: 'Patients array is required' });
         }
 
-        const predictions = [];
-        const errors = [];
-
-        for (let i = 0; i < patients.length; i++) {
-            try {
-                const patient = patients[i];
-                const mlPayload = {
-                    model: selectedModel,
-                    inputData: patient.data
-                };
-
-                const mlResponse = await axios.post(`${ML_API_BASE_URL}/predict`, mlPayload);
-                const predictionResult = mlResponse.data;
-
-                predictions.push({
-                    patientIndex: i,
-                    patientId: patient.id || `batch_patient_${i}`,
-                    prediction: predictionResult.result,
-                    riskLevel: predictionResult.prediction,
-                    probability: predictionResult.probability,
-                    confidence: predictionResult.confidence
-                });
-
-            } catch (error) {
-                errors.push({
-                    patientIndex: i,
-                    patientId: patients[i].id || `batch_patient_${i}`,
-                    error: error.response?.data?.error || error.message
-                });
-            }
-        }
+        const mlResponse = await axios.post(`${ML_API_BASE_URL}/predict/batch`, {
+            model: selectedModel,
+            records: patients.map(patient => patient.data)
+        });
+        const batchResult = mlResponse.data;
+
+        const predictions = batchResult.results.map(result => ({
+            patientIndex: result.index,
+            patientId: patients[result.index].id || `batch_patient_${result.index}`,
+            prediction: result.result,
+            riskLevel: result.prediction,
+            probability: result.probability,
+            confidence: Math.max(result.probabilities.low_risk, result.probabilities.high_risk)
+        }));
+
+        const errors = batchResult.errors.map(error => ({
+            patientIndex: error.index,
+            patientId: patients[error.index].id || `batch_patient_${error.index}`,
+            error: error.error
+        }));
 
         res.json({
             success: true,
@@ -53,7 +53,9 @@ const diagnosisSchema = new mongoose.Schema(
         "lightgbm",
         "catboost",
         "voting_ensemble",
-        "stacking_model"
+        "stacking_model",
+        "voting_ensemble_distilled",
+        "stacking_model_distilled"
       ],
     },
     modelDisplayName: {
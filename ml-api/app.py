@@ -4,12 +4,92 @@ import joblib
 import pandas as pd
 import numpy as np
 import os
+import io
+import json
+import time
+import logging
+from models.registry import ModelRegistry
+from models.pipeline import build_inference_pipeline
+from models.data_processor import FeatureEngineer
+from models.metrics import MetricsRegistry, StageTimer
+from models.fast_trees import compile_tree_model
+from models.fused_linear import FusedLogisticRegression, fuse_logistic_regression
+from models.prediction_cache import PredictionCache, canonical_key
+from models import artifacts
+from models.batching import MicroBatcher, batch_config, MICROBATCH_ENABLED
+from models.catalog import ModelCatalog, METRIC_KEYS, etag
+from models.multi_model import ReusePlanner, base_learners, score_models
+from models.schema import InputSchema, loads
+from models.explain import ExplainerCache
+from models.drift import DriftMonitor, read_reference, REFERENCE_PATH
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("ml_api")
+logger.setLevel(os.environ.get("ML_API_LOG_LEVEL", "WARNING").upper())
 
 app = Flask(__name__)
 CORS(app)
-scaler = joblib.load("models/scaler.pkl")
-feature_selector = joblib.load("models/feature_selector.pkl")
-original_features = joblib.load("models/original_features.pkl")
+
+def missing_artifacts():
+    manifest = artifacts.read_manifest()
+    if manifest is not None:
+        return [f for f in artifacts.manifest_files(manifest) if not os.path.exists(f)]
+    required_files = ["models/original_features.pkl"]
+    if not os.path.exists("models/inference_pipeline.pkl"):
+        required_files += ["models/scaler.pkl", "models/feature_selector.pkl"]
+    return [f for f in required_files if not os.path.exists(f)]
+
+def load_artifacts():
+    # The manifest describes the pipeline as raw arrays, so startup does not
+    # unpickle anything; pickles are the fallback for older model directories.
+    global original_features, inference_pipeline, pipeline_version, pipeline_from_manifest, input_schema
+    manifest = artifacts.read_manifest()
+    pipeline_from_manifest = manifest is not None
+    if manifest is not None:
+        original_features, inference_pipeline = artifacts.load_pipeline(manifest)
+        pipeline_version = manifest["pipeline"]["fingerprint"]
+        input_schema = InputSchema(original_features)
+        return
+    original_features = joblib.load("models/original_features.pkl")
+    input_schema = InputSchema(original_features)
+    if os.path.exists("models/inference_pipeline.pkl"):
+        pipeline_version = os.stat("models/inference_pipeline.pkl").st_mtime_ns
+        inference_pipeline = joblib.load("models/inference_pipeline.pkl")
+    else:
+        pipeline_version = os.stat("models/scaler.pkl").st_mtime_ns ^ os.stat("models/feature_selector.pkl").st_mtime_ns
+        inference_pipeline = build_inference_pipeline(
+            joblib.load("models/scaler.pkl"),
+            joblib.load("models/feature_selector.pkl"),
+            original_features
+        )
+
+original_features = None
+inference_pipeline = None
+input_schema = None
+pipeline_version = None
+pipeline_from_manifest = False
+if missing_artifacts():
+    logger.error("Missing model artifacts %s; predictions are disabled until they are trained", missing_artifacts())
+else:
+    load_artifacts()
+
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("chd_request_seconds", "End-to-end prediction request latency", ["model", "endpoint"])
+STAGE_SECONDS = metrics.histogram("chd_stage_seconds", "Prediction latency per pipeline stage", ["model", "endpoint", "stage"])
+PREDICTIONS_TOTAL = metrics.counter("chd_predictions_total", "Successful prediction requests", ["model", "endpoint"])
+PREDICTION_ERRORS_TOTAL = metrics.counter("chd_prediction_errors_total", "Prediction requests that failed with a server error", ["model", "endpoint"])
+BATCH_ROWS_TOTAL = metrics.counter("chd_batch_rows_total", "Rows scored through /predict/batch", ["model"])
+MODEL_CACHE_HITS = metrics.counter("chd_model_cache_hits_total", "Model registry lookups served from memory", ["model"])
+MODEL_CACHE_MISSES = metrics.counter("chd_model_cache_misses_total", "Model registry lookups that loaded from disk", ["model"])
+PREDICTION_CACHE_HITS = metrics.counter("chd_prediction_cache_hits_total", "Predictions served from the result cache")
+PREDICTION_CACHE_MISSES = metrics.counter("chd_prediction_cache_misses_total", "Prediction cache lookups that ran the model")
+MODEL_RESIDENT_BYTES = metrics.gauge("chd_model_resident_bytes", "Artifact size of resident models", ["model"])
+MICROBATCH_ROWS = metrics.histogram("chd_microbatch_rows", "Rows per coalesced /predict model call", ["model"],
+                                    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+MICROBATCH_WAIT_SECONDS = metrics.histogram("chd_microbatch_wait_seconds", "Queue time of the oldest row in a micro-batch", ["model"])
+MICROBATCH_QUEUE_DEPTH = metrics.gauge("chd_microbatch_queue_depth", "Rows waiting in the micro-batch queue", ["model"])
+
+RAW_INPUTS = ["gender", "height", "weight", "ap_hi", "ap_lo", "cholesterol", "gluc", "smoke", "alco", "active"]
 
 MODEL_PATHS = {
     "logistic_regression": "models/logistic_regression.pkl",
@@ -18,185 +98,633 @@ MODEL_PATHS = {
     "lightgbm": "models/lightgbm.pkl",
     "catboost": "models/catboost.pkl",
     "voting_ensemble": "models/voting_ensemble.pkl",
-    "stacking_model": "models/stacking_model.pkl"
+    "stacking_model": "models/stacking_model.pkl",
+    "voting_ensemble_distilled": "models/voting_ensemble_distilled.pkl",
+    "stacking_model_distilled": "models/stacking_model_distilled.pkl"
 }
 
-try:
-    model_metrics = joblib.load("models/model_metrics.pkl")
-    print("Loaded model metrics from pickle file")
-except:
-    model_metrics = {
-        "lr": {"accuracy": 0.7136, "auc": 0.78, "precision": 0.68, "recall": 0.64, "f1": 0.66},
-        "rf": {"accuracy": 0.7130, "auc": 0.77, "precision": 0.69, "recall": 0.67, "f1": 0.68},
-        "xgb": {"accuracy": 0.7319, "auc": 0.79, "precision": 0.70, "recall": 0.69, "f1": 0.695}
+FAST_TREES = os.environ.get("ML_API_FAST_TREES", "1") == "1"
+FUSED_LINEAR = os.environ.get("ML_API_FUSED_LINEAR", "1") == "1"
+
+_manifest_cache = {"mtime_ns": None, "manifest": None}
+
+def current_manifest():
+    # manifest.json is replaced atomically, so its mtime identifies a version
+    try:
+        mtime_ns = os.stat(os.path.join("models", artifacts.MANIFEST_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _manifest_cache["mtime_ns"] != mtime_ns:
+        _manifest_cache.update(mtime_ns=mtime_ns, manifest=artifacts.read_manifest())
+    return _manifest_cache["manifest"]
+
+def manifest_stamp(name):
+    manifest = current_manifest() if pipeline_from_manifest else None
+    entry = manifest["models"].get(name) if manifest else None
+    return entry["sha256"][:16] if entry else None
+
+def served_bytes(name):
+    manifest = current_manifest() if pipeline_from_manifest else None
+    if manifest is None or name not in manifest["models"]:
+        return None
+    return artifacts.served_bytes(manifest, name, fast_trees=FAST_TREES, fused_linear=FUSED_LINEAR)
+
+def load_model(path):
+    manifest = current_manifest() if pipeline_from_manifest else None
+    name = next((n for n, p in MODEL_PATHS.items() if p == path), None)
+    if manifest is not None and name in manifest["models"]:
+        return artifacts.load_model(manifest, name, pipeline_version,
+                                    inference_pipeline.named_steps["interactions"].n_output_features_,
+                                    fast_trees=FAST_TREES, fused_linear=FUSED_LINEAR)
+    model = joblib.load(path)
+    if FUSED_LINEAR and name == "logistic_regression":
+        return fuse_logistic_regression(model, inference_pipeline.named_steps["scaler"],
+                                        inference_pipeline.named_steps["interactions"]) or model
+    if FAST_TREES:
+        return compile_tree_model(model) or model
+    return model
+
+def artifact_status(model_key, manifest):
+    entry = manifest["models"].get(model_key) if manifest else None
+    if entry is None:
+        return None
+    error = artifacts.compatibility_error(manifest, model_key, pipeline_version,
+                                          inference_pipeline.named_steps["interactions"].n_output_features_)
+    return {
+        "format": entry["format"],
+        "version": entry["sha256"][:12],
+        "flat": bool(entry.get("flat")),
+        "fused": bool(entry.get("fused")),
+        "compatible": error is None,
+        "error": error
     }
 
+model_registry = ModelRegistry(
+    MODEL_PATHS,
+    max_bytes=int(os.environ.get("ML_API_MODEL_CACHE_BYTES", 2 * 1024 ** 3)),
+    loader=load_model,
+    stamp=manifest_stamp,
+    size=served_bytes
+)
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("ML_API_PREDICTION_CACHE_SIZE", 10000)),
+    ttl_seconds=float(os.environ.get("ML_API_PREDICTION_CACHE_TTL", 3600)),
+    db_path=os.environ.get("ML_API_PREDICTION_CACHE_DB") or None
+)
+# Explanations are larger and rarer than predictions, so they get their own
+# bounded cache and never take slots from, or skew the hit rate of, the above
+explanation_cache = PredictionCache(
+    max_entries=int(os.environ.get("ML_API_EXPLANATION_CACHE_SIZE", 1000)),
+    ttl_seconds=float(os.environ.get("ML_API_PREDICTION_CACHE_TTL", 3600))
+)
+def observe_microbatch(model_name, rows, waited):
+    MICROBATCH_ROWS.observe(rows, model=model_name)
+    MICROBATCH_WAIT_SECONDS.observe(waited, model=model_name)
+
+microbatchers = {
+    name: MicroBatcher(name, *(batch_config(name) if MICROBATCH_ENABLED else (1, 0)), observe=observe_microbatch)
+    for name in MODEL_PATHS
+}
+reuse_planner = ReusePlanner()
+explainers = ExplainerCache(
+    original_features, inference_pipeline.named_steps["interactions"],
+    top_features=int(os.environ.get("ML_API_EXPLAIN_TOP_FEATURES", 10)),
+    exact=os.environ.get("ML_API_EXPLAIN_EXACT", "0") == "1"
+) if inference_pipeline is not None else None
+drift_reference = read_reference() if os.environ.get("ML_API_DRIFT", "1") == "1" else None
+drift_monitor = DriftMonitor(drift_reference, original_features) if drift_reference and original_features else None
+BATCH_MAX_ROWS = int(os.environ.get("ML_API_BATCH_MAX_ROWS", 200000))
+BATCH_CHUNK_ROWS = int(os.environ.get("ML_API_BATCH_CHUNK_ROWS", 10000))
+
+if os.environ.get("ML_API_PRELOAD_MODELS", "0") == "1":
+    logger.info("Preloaded models: %s", model_registry.preload())
+
+def load_model_metrics():
+    try:
+        model_metrics = joblib.load("models/model_metrics.pkl")
+        logger.info("Loaded model metrics from pickle file")
+    except:
+        model_metrics = {
+            "lr": {"accuracy": 0.7136, "auc": 0.78, "precision": 0.68, "recall": 0.64, "f1": 0.66},
+            "rf": {"accuracy": 0.7130, "auc": 0.77, "precision": 0.69, "recall": 0.67, "f1": 0.68},
+            "xgb": {"accuracy": 0.7319, "auc": 0.79, "precision": 0.70, "recall": 0.69, "f1": 0.695}
+        }
+    return model_metrics
+
+def build_catalog():
+    # Everything below only changes when a model, the manifest or the metrics
+    # file changes on disk
+    model_metrics = load_model_metrics()
+    manifest = artifacts.read_manifest() if pipeline_from_manifest else None
+    available = [k for k, v in MODEL_PATHS.items() if os.path.exists(v)]
+    models = {}
+    comparison = {}
+    for model_key, model_path in MODEL_PATHS.items():
+        metrics_for_model = model_metrics.get(METRIC_KEYS.get(model_key, model_key), {})
+        models[model_key] = {
+            "name": model_key.replace("_", " ").title(),
+            "path": model_path,
+            "metrics": metrics_for_model if model_key in available else {},
+            "available": model_key in available
+        }
+        if model_key in available:
+            models[model_key]["artifact"] = artifact_status(model_key, manifest)
+            comparison[model_key] = {
+                "name": model_key.replace("_", " ").title(),
+                "metrics": metrics_for_model,
+                "type": ("Distilled" if model_key.endswith("_distilled") else
+                         "Ensemble" if "ensemble" in model_key or "stacking" in model_key else "Individual")
+            }
+    sorted_models = sorted(comparison.items(), key=lambda x: x[1]["metrics"].get("accuracy", 0), reverse=True)
+    return {
+        "metrics": model_metrics,
+        "available": available,
+        "models": models,
+        "missing_files": missing_artifacts(),
+        "comparison": {
+            "comparison": dict(sorted_models),
+            "best_model": sorted_models[0][0] if sorted_models else None,
+            "total_models": len(comparison)
+        },
+        "test": {
+            "message": "Flask ML-API server is running!",
+            "available_models": available,
+            "total_models": len(available),
+            "status": "healthy"
+        }
+    }
+
+catalog = ModelCatalog(["models", "models/model_metrics.pkl"], build_catalog, app.json.dumps, static=("comparison", "test"))
+
+def conditional_response(body, tag, last_modified=None, last_modified_header=None):
+    # Clients revalidate with If-None-Match / If-Modified-Since and get a 304
+    # while the catalog is unchanged. Headers are compared directly instead
+    # of going through Response.make_conditional, which costs more than
+    # serving the cached body.
+    headers = {"ETag": f'"{tag}"', "Cache-Control": "no-cache"}
+    if last_modified_header is not None:
+        headers["Last-Modified"] = last_modified_header
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(tag)
+    else:
+        since = request.if_modified_since
+        not_modified = last_modified is not None and since is not None and last_modified <= since
+    if not_modified:
+        return app.response_class(status=304, headers=headers)
+    return app.response_class(body, mimetype="application/json", headers=headers)
+
+def catalog_response(key):
+    snapshot = catalog.get()
+    body, tag = snapshot["bodies"][key]
+    return conditional_response(body, tag, snapshot["last_modified"], snapshot["last_modified_header"])
+
+def dynamic_response(payload):
+    # Runtime counters are part of the body, so only the ETag is meaningful
+    body = app.json.dumps(payload).encode()
+    return conditional_response(body, etag(body))
+
 @app.route("/models", methods=["GET"])
 def get_available_models():
     try:
-        available_models = {}
-        for model_key, model_path in MODEL_PATHS.items():
-            if os.path.exists(model_path):
-                metric_key = model_key
-                if model_key == "voting_ensemble":
-                    metric_key = "ensemble"
-                elif model_key == "stacking_model":
-                    metric_key = "stacking"
-                elif model_key == "logistic_regression":
-                    metric_key = "lr"
-                elif model_key == "random_forest":
-                    metric_key = "rf"
-                elif model_key == "xgboost":
-                    metric_key = "xgb"
-                elif model_key == "lightgbm":
-                    metric_key = "lgb"
-                elif model_key == "catboost":
-                    metric_key = "cat"
-                
-                available_models[model_key] = {
-                    "name": model_key.replace("_", " ").title(),
-                    "path": model_path,
-                    "metrics": model_metrics.get(metric_key, {}),
-                    "available": True
-                }
-            else:
-                available_models[model_key] = {
-                    "name": model_key.replace("_", " ").title(),
-                    "path": model_path,
-                    "metrics": {},
-                    "available": False
-                }
-        
-        return jsonify({
+        snapshot = catalog.get()
+        available_models = {
+            model_key: {**entry, "cache": model_registry.status(model_key)}
+            for model_key, entry in snapshot["models"].items()
+        }
+        return dynamic_response({
             "models": available_models,
             "total_models": len(available_models),
-            "available_count": sum(1 for m in available_models.values() if m["available"])
+            "available_count": len(snapshot["available"]),
+            "model_cache": model_registry.summary()
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def load_requested_model(model_name):
+    # Returns (model, version, error); the version comes from the same registry
+    # entry as the model and keys every cache entry derived from it
+    if inference_pipeline is None:
+        return None, None, (jsonify({"error": f"Model artifacts are not loaded: {missing_artifacts()}"}), 503)
+
+    if not model_name:
+        return None, None, (jsonify({"error": "Model name is empty"}), 400)
+    
+    if model_name not in MODEL_PATHS:
+        return None, None, (jsonify({"error": f"Invalid model name: '{model_name}'. Choose from {list(MODEL_PATHS.keys())}"}), 400)
+    
+    if model_name not in catalog.get()["available"]:
+        return None, None, (jsonify({"error": f"Model file not found: {MODEL_PATHS[model_name]}"}), 404)
+
+    status = catalog.get()["models"][model_name].get("artifact")
+    if status and not status["compatible"]:
+        return None, None, (jsonify({"error": status["error"]}), 409)
+    
+    try:
+        return (*model_registry.get_versioned(model_name), None)
+    except Exception as load_error:
+        logger.error("Model loading error: %s", load_error)
+        return None, None, (jsonify({"error": f"Failed to load model: {load_error}"}), 500)
+
+def scale_rows(X):
+    # StandardScaler.transform without its input validation: the same
+    # subtraction and division, so the result is bit-identical
+    scaler = inference_pipeline.named_steps["scaler"]
+    return (X - scaler.mean_) / scaler.scale_
+
+def wants_explanation(input_data=None):
+    # ?explain=1 on any prediction endpoint, or "explain": true in a /predict body
+    flag = request.args.get("explain")
+    if flag is None and isinstance(input_data, dict):
+        flag = input_data.get("explain")
+    return str(flag).lower() in ("1", "true", "yes")
+
+def explain_record(model_name, model, version, input_row):
+    # Contributions are cached under the same key as the prediction, in
+    # explanation_cache
+    explainer = explainers.get(model_name, model, version)
+    if explainer is None:
+        return {"error": f"Explanations are not available for {model_name}"}
+    contributions, cache_key = None, None
+    if explanation_cache.enabled:
+        cache_key = canonical_key(model_name, f"{version}-{pipeline_version}", input_row)
+        contributions = explanation_cache.get(cache_key)
+    if contributions is None:
+        selected_input = inference_pipeline.named_steps["interactions"].transform(scale_rows(input_row.reshape(1, -1)))
+        contributions = explainer.contributions(selected_input)[0]
+        if cache_key:
+            explanation_cache.set(cache_key, tuple(float(v) for v in contributions))
+    return explainer.summaries(contributions)[0]
+
+def prediction_response(model_name, model, probabilities):
+    probabilities = np.asarray(probabilities)
+    prediction = int(model.classes_[probabilities.argmax()])
+    probability = float(probabilities[prediction])
+    prob_class_0 = float(probabilities[0])
+    prob_class_1 = float(probabilities[1])
+    
+    metric_key = METRIC_KEYS.get(model_name, model_name)
+    
+    return {
+        "result": int(prediction),
+        "prediction": "High Risk" if prediction == 1 else "Low Risk",
+        "probability": probability,
+        "probabilities": {
+            "low_risk": prob_class_0,
+            "high_risk": prob_class_1
+        },
+        "model_used": model_name,
+        "model_display_name": model_name.replace("_", " ").title(),
+        "metrics": catalog.get()["metrics"].get(metric_key, {}),
+        "confidence": float(max(probabilities))
+    }
+
 @app.route("/predict", methods=["POST"])
 def predict():
+    timer = StageTimer()
+    model_name = ""
+    start = time.perf_counter()
     try:
-        input_data = request.get_json()
-        if not input_data or "model" not in input_data:
+        with timer.stage("parse"):
+            try:
+                input_data = loads(request.get_data())
+            except ValueError:
+                return jsonify({"error": "Request body is not valid JSON"}), 400
+        if not isinstance(input_data, dict) or "model" not in input_data:
             return jsonify({"error": "Missing input data or model field."}), 400
-        model_name = input_data.get("model", "").strip()
-        
-        if not model_name:
-            return jsonify({"error": "Model name is empty"}), 400
-        
-        if model_name not in MODEL_PATHS:
-            return jsonify({"error": f"Invalid model name: '{model_name}'. Choose from {list(MODEL_PATHS.keys())}"}), 400
+        model_name = str(input_data.get("model", "")).strip()
+        explain = wants_explanation(input_data)
         
-        if not os.path.exists(MODEL_PATHS[model_name]):
-            return jsonify({"error": f"Model file not found: {MODEL_PATHS[model_name]}"}), 404
+        model, version, error = load_requested_model(model_name)
+        if error:
+            return error
         
-        try:
-            model = joblib.load(MODEL_PATHS[model_name])
-        except Exception as load_error:
-            print(f"Model loading error: {load_error}")
-            return jsonify({"error": f"Failed to load model: {load_error}"}), 500
+        # Announced before validation so that concurrent requests for the same
+        # model can be coalesced into one predict_proba call
+        with microbatchers[model_name].expect() as expectation:
+            features = input_data.get("inputData", {})
+            if not features:
+                return jsonify({"error": "Missing 'inputData' field"}), 400
+            logger.debug("Features received: %s", list(features.keys()))
+
+            with timer.stage("validate"):
+                input_row, input_error = input_schema.vector(features, out=input_schema.buffer())
+            if input_error:
+                logger.info("Invalid input: %s", input_error)
+                return jsonify({"error": input_error}), 400
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Input data: %s", dict(zip(original_features, input_row.tolist())))
+
+            probabilities, cache_key = None, None
+            if prediction_cache.enabled:
+                cache_key = canonical_key(model_name, f"{version}-{pipeline_version}", input_row)
+                probabilities = prediction_cache.get(cache_key)
+            if probabilities is None:
+                if isinstance(model, FusedLogisticRegression):
+                    # Scores the engineered features directly in a few
+                    # microseconds; no scaler, interactions or micro-batch
+                    expectation.release()
+                    with timer.stage("predict_proba"):
+                        probabilities = model.predict_proba_raw(input_row.reshape(1, -1))[0]
+                else:
+                    with timer.stage("scale"):
+                        scaled_input = scale_rows(input_row.reshape(1, -1))
+                    with timer.stage("interactions"):
+                        selected_input = inference_pipeline.named_steps["interactions"].transform(scaled_input)
+                    with timer.stage("predict_proba"):
+                        probabilities = microbatchers[model_name].predict_proba(model, selected_input[0], expectation)
+                if prediction_cache.enabled:
+                    prediction_cache.set(cache_key, (float(probabilities[0]), float(probabilities[1])))
+        response_data = prediction_response(model_name, model, probabilities)
+        if explain:
+            with timer.stage("explain"):
+                response_data["explanation"] = explain_record(model_name, model, version, input_row)
+        if drift_monitor is not None:
+            drift_monitor.observe(input_row, {model_name: probabilities[1]})
+        logger.debug("Response: %s", response_data)
+        timer.observe(STAGE_SECONDS, model=model_name, endpoint="predict")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, endpoint="predict")
+        PREDICTIONS_TOTAL.inc(model=model_name, endpoint="predict")
+        return jsonify(response_data)
         
-        features = input_data.get("inputData", {})
-        if not features:
+    except Exception as e:
+        logger.exception("Prediction error: %s", e)
+        PREDICTION_ERRORS_TOTAL.inc(model=model_name, endpoint="predict")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/predict/all", methods=["POST"])
+def predict_all():
+    # One patient scored by several models: the input is validated, scaled and
+    # expanded once, independent models run on a thread pool and the
+    # ensembles reuse the outputs of served models equal to their base
+    # learners. Body: {"inputData": {...}, "models": [...]} (default: every
+    # available model).
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        with timer.stage("parse"):
+            try:
+                input_data = loads(request.get_data())
+            except ValueError:
+                input_data = None
+        if not isinstance(input_data, dict) or not input_data.get("inputData"):
             return jsonify({"error": "Missing 'inputData' field"}), 400
-        print(f"Features received: {list(features.keys())}")
-        print(f"Original features expected: {original_features}")
-
-        input_df = pd.DataFrame([features])
-        missing_cols = set(original_features) - set(input_df.columns)
-        if missing_cols:
-            print(f"Missing columns: {missing_cols}")
-            return jsonify({"error": f"Missing input fields: {list(missing_cols)}"}), 400
-        input_df = input_df[original_features]
-        print(f"Input data shape: {input_df.shape}")
-        print(f"Input data: {input_df.iloc[0].to_dict()}")
-        scaled_input = scaler.transform(input_df)
-        print(f"Scaled input shape: {scaled_input.shape}")
+        if inference_pipeline is None:
+            return jsonify({"error": f"Model artifacts are not loaded: {missing_artifacts()}"}), 503
+        requested = input_data.get("models") or catalog.get()["available"]
+        if not isinstance(requested, list):
+            return jsonify({"error": "'models' must be a list of model names"}), 400
 
-        try:
-            from sklearn.preprocessing import PolynomialFeatures
-            poly = PolynomialFeatures(degree=2, interaction_only=True, include_bias=False)
-            poly_input = poly.fit_transform(scaled_input)
-            selected_input = feature_selector.transform(poly_input)
-            print(f"Selected input shape: {selected_input.shape}")
-        except Exception as feature_error:
-            print(f"Feature transformation error: {feature_error}")
-            selected_input = scaled_input
-        
-        prediction = model.predict(selected_input)[0]
-        print(f"Prediction: {prediction}")
-
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(selected_input)[0]
-            probability = float(probabilities[int(prediction)])
-            prob_class_0 = float(probabilities[0])
-            prob_class_1 = float(probabilities[1])
-            print(f"Probabilities: {probabilities}")
+        results, models, versions = {}, {}, {}
+        for model_name in dict.fromkeys(requested):
+            model, version, error = load_requested_model(model_name)
+            if error:
+                results[model_name] = {"error": error[0].get_json()["error"], "status": error[1]}
+            else:
+                models[model_name], versions[model_name] = model, version
+
+        with timer.stage("validate"):
+            input_row, input_error = input_schema.vector(input_data["inputData"], out=input_schema.buffer())
+        if input_error:
+            return jsonify({"error": input_error}), 400
+        with timer.stage("scale"):
+            scaled_input = scale_rows(input_row.reshape(1, -1))
+        with timer.stage("interactions"):
+            selected_input = inference_pipeline.named_steps["interactions"].transform(scaled_input)
+
+        with timer.stage("predict_proba"):
+            served = {name: model for name, model in models.items() if base_learners(model) is None}
+            served_versions = {name: versions[name] for name in served}
+            plans = {
+                name: reuse_planner.plan(name, model, versions[name], served, served_versions)
+                for name, model in models.items() if name not in served
+            }
+            scored, errors = score_models(selected_input, models, plans)
+        for model_name in models:
+            if model_name in errors:
+                logger.error("Prediction error for %s: %s", model_name, errors[model_name])
+                PREDICTION_ERRORS_TOTAL.inc(model=model_name, endpoint="all")
+                results[model_name] = {"error": str(errors[model_name]), "status": 500}
+                continue
+            probabilities, seconds, shared = scored[model_name]
+            results[model_name] = {
+                **prediction_response(model_name, models[model_name], probabilities[0]),
+                "latency_ms": seconds * 1000,
+                "shared_base_learners": shared
+            }
+            PREDICTIONS_TOTAL.inc(model=model_name, endpoint="all")
+        if drift_monitor is not None:
+            drift_monitor.observe(input_row, {name: scored[name][0][0][1] for name in scored if name not in errors})
+
+        timer.observe(STAGE_SECONDS, model="all", endpoint="all")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, model="all", endpoint="all")
+        return jsonify({
+            "results": results,
+            "models_scored": len(scored),
+            "stage_ms": {stage: seconds * 1000 for stage, seconds in timer.durations.items()},
+            "total_ms": (time.perf_counter() - start) * 1000
+        })
+
+    except Exception as e:
+        logger.exception("Multi-model prediction error: %s", e)
+        PREDICTION_ERRORS_TOTAL.inc(model="all", endpoint="all")
+        return jsonify({"error": str(e)}), 500
+
+def parse_batch_body():
+    model_name = request.args.get("model", "")
+    record_errors = {}
+    if request.mimetype == "text/csv":
+        records_df = pd.read_csv(io.BytesIO(request.get_data()), sep=request.args.get("sep", ","))
+        return model_name, records_df, record_errors
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        records = []
+        lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError as parse_error:
+                record_errors[index] = f"Invalid JSON: {parse_error}"
+                records.append({})
+    else:
+        body = request.get_json(silent=True)
+        if body is None:
+            raise ValueError("Request body is not valid JSON")
+        if isinstance(body, dict):
+            model_name = body.get("model", model_name)
+            records = body.get("records", [])
         else:
-            probability = None
-            prob_class_0 = None
-            prob_class_1 = None
-        
-        metric_key = model_name
-        if model_name == "voting_ensemble":
-            metric_key = "ensemble"
-        elif model_name == "stacking_model":
-            metric_key = "stacking"
-        elif model_name == "logistic_regression":
-            metric_key = "lr"
-        elif model_name == "random_forest":
-            metric_key = "rf"
-        elif model_name == "xgboost":
-            metric_key = "xgb"
-        elif model_name == "lightgbm":
-            metric_key = "lgb"
-        elif model_name == "catboost":
-            metric_key = "cat"
-        
-        response_data = {
-            "result": int(prediction),
-            "prediction": "High Risk" if prediction == 1 else "Low Risk",
-            "probability": probability,
-            "probabilities": {
-                "low_risk": prob_class_0,
-                "high_risk": prob_class_1
-            },
-            "model_used": model_name,
-            "model_display_name": model_name.replace("_", " ").title(),
-            "metrics": model_metrics.get(metric_key, {}),
-            "confidence": float(max(probabilities)) if probabilities is not None else None
-        }
-        print(f"Response: {response_data}")
-        return jsonify(response_data)
-        
+            records = body
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON array of records or an object with a 'records' array")
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            record_errors[index] = "Record must be a JSON object"
+            records[index] = {}
+    return model_name, pd.DataFrame.from_records(records), record_errors
+
+def build_feature_matrix(records_df, record_errors):
+    # Records carry raw cardio.csv-style inputs (age in days as "age", or
+    # "age_years"); every engineered column is derived here with the same
+    # derive_features() used in training. Client-supplied engineered values
+    # are ignored. Range and category-code errors are the ones InputSchema
+    # reports for single records.
+    columns = RAW_INPUTS + ["age", "age_years"]
+    raw = records_df.reindex(columns=columns)
+    values = raw.apply(pd.to_numeric, errors="coerce")
+    missing = raw.isna().to_numpy()
+    invalid = values.isna().to_numpy() & ~missing
+    values["age_years"] = (values["age"] / 365.25).fillna(values["age_years"])
+    values = values.drop(columns=["age"])
+    age_missing = missing[:, -2] & missing[:, -1]
+    age_out_of_range = ~values["age_years"].between(0, 100, inclusive="right").to_numpy() & ~age_missing
+    out_of_range = input_schema.range_errors(values)
+    flagged = missing[:, :-2].any(axis=1) | age_missing | invalid.any(axis=1) | age_out_of_range
+    flagged[list(out_of_range)] = True
+    for index in np.flatnonzero(flagged):
+        if index in record_errors:
+            continue
+        messages = []
+        missing_fields = [f for f, m in zip(RAW_INPUTS, missing[index]) if m]
+        if age_missing[index]:
+            missing_fields.append("age_years")
+        invalid_fields = [f for f, m in zip(columns, invalid[index]) if m]
+        if missing_fields:
+            messages.append(f"Missing input fields: {missing_fields}")
+        if invalid_fields:
+            messages.append(f"Non-numeric input fields: {invalid_fields}")
+        else:
+            if age_out_of_range[index]:
+                messages.append("age_years must be between 0 and 100")
+            if index in out_of_range:
+                messages.append(out_of_range[index])
+        record_errors[int(index)] = "; ".join(messages)
+    valid = np.ones(len(values), dtype=bool)
+    valid[list(record_errors)] = False
+    return FeatureEngineer(original_features).transform(values[valid]), np.flatnonzero(valid)
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    timer = StageTimer()
+    model_name = ""
+    start = time.perf_counter()
+    try:
+        try:
+            with timer.stage("parse"):
+                model_name, records_df, record_errors = parse_batch_body()
+        except ValueError as parse_error:
+            return jsonify({"error": f"Could not parse batch body: {parse_error}"}), 400
+        if len(records_df) == 0:
+            return jsonify({"error": "Batch contains no records"}), 400
+        if len(records_df) > BATCH_MAX_ROWS:
+            return jsonify({"error": f"Batch too large: {len(records_df)} records (max {BATCH_MAX_ROWS})"}), 413
+
+        model_name = str(model_name).strip()
+        model, version, error = load_requested_model(model_name)
+        if error:
+            return error
+
+        with timer.stage("validate"):
+            input_df, valid_index = build_feature_matrix(records_df, record_errors)
+        # Explanations are computed per chunk with one batched call
+        explainer, explanation_error, contributions = None, None, None
+        if wants_explanation():
+            explainer = explainers.get(model_name, model, version)
+            if explainer is None:
+                explanation_error = f"Explanations are not available for {model_name}"
+            else:
+                contributions = np.empty((len(input_df), len(explainer.feature_names) + 1))
+        fused = isinstance(model, FusedLogisticRegression)
+        probabilities = np.empty((len(input_df), 2))
+        for offset in range(0, len(input_df), BATCH_CHUNK_ROWS):
+            chunk = input_df.iloc[offset:offset + BATCH_CHUNK_ROWS]
+            if fused:
+                with timer.stage("predict_proba"):
+                    probabilities[offset:offset + len(chunk)] = model.predict_proba_raw(chunk.to_numpy(dtype=np.float64))
+                if explainer is None:
+                    continue
+            with timer.stage("scale"):
+                scaled_chunk = inference_pipeline.named_steps["scaler"].transform(chunk)
+            with timer.stage("interactions"):
+                selected_chunk = inference_pipeline.named_steps["interactions"].transform(scaled_chunk)
+            if not fused:
+                with timer.stage("predict_proba"):
+                    probabilities[offset:offset + len(chunk)] = model.predict_proba(selected_chunk)
+            if explainer is not None:
+                with timer.stage("explain"):
+                    contributions[offset:offset + len(chunk)] = explainer.contributions(selected_chunk)
+        labels = model.classes_[probabilities.argmax(axis=1)].astype(int)
+        if drift_monitor is not None:
+            drift_monitor.observe_many(input_df.to_numpy(dtype=np.float64), {model_name: probabilities[:, 1]})
+
+        with timer.stage("serialize"):
+            results = [
+                {
+                    "index": index,
+                    "result": label,
+                    "prediction": "High Risk" if label == 1 else "Low Risk",
+                    "probability": p1 if label == 1 else p0,
+                    "probabilities": {"low_risk": p0, "high_risk": p1}
+                }
+                for index, label, p0, p1 in zip(
+                    valid_index.tolist(), labels.tolist(),
+                    probabilities[:, 0].tolist(), probabilities[:, 1].tolist()
+                )
+            ]
+            if contributions is not None:
+                for result, explanation in zip(results, explainer.summaries(contributions)):
+                    result["explanation"] = explanation
+            errors = [{"index": index, "error": message} for index, message in sorted(record_errors.items())]
+            payload = {
+                "model_used": model_name,
+                "model_display_name": model_name.replace("_", " ").title(),
+                "total_records": len(records_df),
+                "successful": len(results),
+                "failed": len(errors),
+                "results": results,
+                "errors": errors
+            }
+            if explanation_error:
+                payload["explanation_error"] = explanation_error
+            response = jsonify(payload)
+        timer.observe(STAGE_SECONDS, model=model_name, endpoint="batch")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, endpoint="batch")
+        PREDICTIONS_TOTAL.inc(model=model_name, endpoint="batch")
+        BATCH_ROWS_TOTAL.inc(len(results), model=model_name)
+        return response
+
+    except Exception as e:
+        logger.exception("Batch prediction error: %s", e)
+        PREDICTION_ERRORS_TOTAL.inc(model=model_name, endpoint="batch")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/drift", methods=["GET"])
+def drift_report():
+    # PSI/KS of recent prediction inputs and predicted risk against the
+    # training-time reference profile
+    if drift_monitor is None:
+        return jsonify({"error": f"Drift monitoring is disabled or {REFERENCE_PATH} is missing; run python -m models.drift"}), 404
+    try:
+        return dynamic_response(drift_monitor.report())
     except Exception as e:
-        print(f"PREDICTION ERROR: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    for model_key in MODEL_PATHS:
+        MODEL_CACHE_HITS.set(model_registry.hits[model_key], model=model_key)
+        MODEL_CACHE_MISSES.set(model_registry.misses[model_key], model=model_key)
+        MODEL_RESIDENT_BYTES.set(model_registry.status(model_key).get("size_bytes", 0), model=model_key)
+        MICROBATCH_QUEUE_DEPTH.set(microbatchers[model_key].queue_depth(), model=model_key)
+    cache_stats = prediction_cache.stats()
+    PREDICTION_CACHE_HITS.set(cache_stats["hits"])
+    PREDICTION_CACHE_MISSES.set(cache_stats["misses"])
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/model-metrics/<model_name>", methods=["GET"])
 def get_model_metrics(model_name):
     try:
-        metric_key = model_name
-        if model_name == "voting_ensemble":
-            metric_key = "ensemble"
-        elif model_name == "stacking_model":
-            metric_key = "stacking"
-        elif model_name == "logistic_regression":
-            metric_key = "lr"
-        elif model_name == "random_forest":
-            metric_key = "rf"
-        elif model_name == "xgboost":
-            metric_key = "xgb"
-        elif model_name == "lightgbm":
-            metric_key = "lgb"
-        elif model_name == "catboost":
-            metric_key = "cat"
+        metric_key = METRIC_KEYS.get(model_name, model_name)
+        model_metrics = catalog.get()["metrics"]
         
         if metric_key not in model_metrics:
             return jsonify({
@@ -216,42 +744,7 @@ def get_model_metrics(model_name):
 @app.route("/model-comparison", methods=["GET"])
 def model_comparison():
     try:
-        comparison_data = {}
-        
-        for model_key, model_path in MODEL_PATHS.items():
-            if os.path.exists(model_path):
-                metric_key = model_key
-                if model_key == "voting_ensemble":
-                    metric_key = "ensemble"
-                elif model_key == "stacking_model":
-                    metric_key = "stacking"
-                elif model_key == "logistic_regression":
-                    metric_key = "lr"
-                elif model_key == "random_forest":
-                    metric_key = "rf"
-                elif model_key == "xgboost":
-                    metric_key = "xgb"
-                elif model_key == "lightgbm":
-                    metric_key = "lgb"
-                elif model_key == "catboost":
-                    metric_key = "cat"
-                
-                comparison_data[model_key] = {
-                    "name": model_key.replace("_", " ").title(),
-                    "metrics": model_metrics.get(metric_key, {}),
-                    "type": "Ensemble" if "ensemble" in model_key or "stacking" in model_key else "Individual"
-                }        
-        sorted_models = sorted(
-            comparison_data.items(),
-            key=lambda x: x[1]["metrics"].get("accuracy", 0),
-            reverse=True
-        )
-        
-        return jsonify({
-            "comparison": dict(sorted_models),
-            "best_model": sorted_models[0][0] if sorted_models else None,
-            "total_models": len(comparison_data)
-        })
+        return catalog_response("comparison")
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -259,34 +752,33 @@ def model_comparison():
 @app.route("/test", methods=["GET", "POST"])
 def test_endpoint():
     if request.method == "GET":
-        available_models = [k for k, v in MODEL_PATHS.items() if os.path.exists(v)]
-        return jsonify({
-            "message": "Flask ML-API server is running!",
-            "available_models": available_models,
-            "total_models": len(available_models),
-            "status": "healthy"
-        })
+        return catalog_response("test")
     else:
         return jsonify({"received": request.get_json()})
 
 @app.route("/health", methods=["GET"])
 def health_check():
     try:
-        required_files = ["models/scaler.pkl", "models/feature_selector.pkl", "models/original_features.pkl"]
-        missing_files = [f for f in required_files if not os.path.exists(f)]
+        snapshot = catalog.get()
+        missing_files = snapshot["missing_files"]
+        available_models = snapshot["available"]
         
-        available_models = [k for k, v in MODEL_PATHS.items() if os.path.exists(v)]
-        
-        return jsonify({
+        return dynamic_response({
             "status": "healthy" if not missing_files else "warning",
             "available_models": available_models,
             "missing_files": missing_files,
-            "total_models": len(available_models)
+            "total_models": len(available_models),
+            "model_cache": model_registry.summary(),
+            "prediction_cache": prediction_cache.stats(),
+            "explanation_cache": explanation_cache.stats(),
+            "microbatching": {name: batcher.stats() for name, batcher in microbatchers.items()}
         })
         
     except Exception as e:
         return jsonify({"status": "error", "error": str(e)}), 500
 
 if __name__ == "__main__":
-    print("Starting CHD Diagnosis ML-API...")
+    if missing_artifacts():
+        raise SystemExit(f"Missing model artifacts: {missing_artifacts()}. Run python -m models.chd_model first.")
+    logger.warning("Starting CHD Diagnosis ML-API...")
     app.run(debug=True, port=5000)
\ No newline at end of file
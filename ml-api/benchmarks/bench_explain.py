@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ML_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_API_DIR)
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explanation latency per model: exact TreeSHAP vs path-based attribution")
+    parser.add_argument("--data", default=os.path.join(ML_API_DIR, "data/cardio.csv"))
+    parser.add_argument("--models", default=ML_API_DIR, help="Directory containing the models/ folder to load")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per batched explanation")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    os.chdir(args.models)
+    import app as api
+    from models.explain import ExplainerCache
+
+    if api.inference_pipeline is None:
+        sys.exit(f"Model artifacts are not loaded: {api.missing_artifacts()}")
+    interactions = api.inference_pipeline.named_steps["interactions"]
+    raw = pd.read_csv(args.data, sep=";").drop(columns=["id", "cardio"]).head(args.rows * 2)
+    input_df, _ = api.build_feature_matrix(raw, {})
+    selected = interactions.transform(api.scale_rows(input_df.to_numpy(dtype=np.float64)[:args.rows]))
+
+    caches = {
+        "exact": ExplainerCache(api.original_features, interactions, exact=True),
+        "path": ExplainerCache(api.original_features, interactions),
+    }
+    results = {}
+    print(f"{'model':<27}{'method':<7}{'build ms':>10}{'1 row ms':>10}{f'{len(selected)} rows ms':>14}{'max error':>11}")
+    for name in api.catalog.get()["available"]:
+        model = api.model_registry.get(name)
+        p1 = model.predict_proba(selected)[:, 1]
+        for method, cache in caches.items():
+            start = time.perf_counter()
+            explainer = cache.get(name, model, 0)
+            build_s = time.perf_counter() - start
+            if explainer is None:
+                print(f"{name:<27}{method:<7}{'not explainable':>24}")
+                continue
+            totals = explainer.contributions(selected).sum(axis=1)
+            explained = totals if explainer.units == "probability" else 1.0 / (1.0 + np.exp(-totals))
+            error = float(np.max(np.abs(explained - p1)))
+            single_s = best_of(lambda: explainer.contributions(selected[:1]), args.repeats * 10)
+            batch_s = best_of(lambda: explainer.contributions(selected), args.repeats)
+            results.setdefault(name, {})[method] = {
+                "build_ms": build_s * 1000, "single_ms": single_s * 1000, "batch_ms": batch_s * 1000, "max_error": error
+            }
+            print(f"{name:<27}{method:<7}{build_s * 1000:>10.1f}{single_s * 1000:>10.2f}{batch_s * 1000:>14.1f}{error:>11.1e}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"data": args.data, "rows": len(selected), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.data_processor import FeatureEngineer, engineer_features, remove_outliers, OUTLIER_COLUMNS, FEATURE_COLUMNS
+
+
+# Reference implementations as they were before vectorization. The benchmark
+# checks that the current code reproduces them exactly before timing it.
+def legacy_remove_outliers(df, columns):
+    df_clean = df.copy()
+    for col in columns:
+        if col in df_clean.columns:
+            Q1 = df_clean[col].quantile(0.25)
+            Q3 = df_clean[col].quantile(0.75)
+            IQR = Q3 - Q1
+            lower_bound = Q1 - 1.5 * IQR
+            upper_bound = Q3 + 1.5 * IQR
+            df_clean = df_clean[(df_clean[col] >= lower_bound) & (df_clean[col] <= upper_bound)]
+    return df_clean
+
+
+def legacy_engineer_features(df):
+    df['bmi'] = df['weight'] / ((df['height'] / 100) ** 2)
+    df['pulse_pressure'] = df['ap_hi'] - df['ap_lo']
+    if 'age' in df.columns:
+        df['age_years'] = df['age'] / 365.25
+    df['age_group'] = pd.cut(df['age_years'], bins=[0, 40, 50, 60, 70, 100], labels=[1, 2, 3, 4, 5]).astype(int)
+    df['lifestyle_risk'] = df['smoke'] + df['alco'] + (1 - df['active'])
+    df['metabolic_risk'] = (df['cholesterol'] - 1) + (df['gluc'] - 1)
+    df['bp_category'] = 0
+    df.loc[(df['ap_hi'] >= 140) | (df['ap_lo'] >= 90), 'bp_category'] = 2
+    df.loc[(df['ap_hi'].between(120, 139)) | (df['ap_lo'].between(80, 89)), 'bp_category'] = 1
+
+    def bmi_category(bmi):
+        if bmi < 18.5:
+            return 0
+        elif bmi < 25:
+            return 1
+        elif bmi < 30:
+            return 2
+        else:
+            return 3
+    df['bmi_category'] = df['bmi'].apply(bmi_category)
+    df['map'] = (df['ap_hi'] + 2 * df['ap_lo']) / 3
+    df['risk_score'] = (
+        df['smoke'] + df['alco'] +
+        (df['cholesterol'] > 1).astype(int) +
+        (df['gluc'] > 1).astype(int)
+    )
+    return df
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feature engineering and outlier removal: legacy vs vectorized")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    raw = pd.read_csv(args.data, sep=";").drop(columns=["id"]).rename(columns={"cardio": "target"})
+    legacy = legacy_remove_outliers(legacy_engineer_features(raw.copy()), OUTLIER_COLUMNS)
+    current = remove_outliers(engineer_features(raw.copy()), OUTLIER_COLUMNS)
+    pd.testing.assert_frame_equal(legacy, current, check_exact=True)
+    print(f"Outputs are bit-identical ({len(current)} of {len(raw)} rows kept)")
+
+    row = raw.iloc[0].to_dict()
+    batch = raw.iloc[:100]
+    engineer = FeatureEngineer(FEATURE_COLUMNS)
+    cases = {
+        "full_frame": (
+            lambda: legacy_remove_outliers(legacy_engineer_features(raw.copy()), OUTLIER_COLUMNS),
+            lambda: remove_outliers(engineer_features(raw.copy()), OUTLIER_COLUMNS),
+        ),
+        "batch_100": (
+            lambda: legacy_engineer_features(batch.copy())[FEATURE_COLUMNS],
+            lambda: engineer.transform(batch),
+        ),
+        "single_row": (
+            lambda: legacy_engineer_features(pd.DataFrame([row]))[FEATURE_COLUMNS],
+            lambda: engineer.transform(row),
+        ),
+    }
+    results = {}
+    print(f"{'case':<12}{'legacy ms':>12}{'vectorized ms':>15}{'speedup':>10}")
+    for name, (legacy_fn, current_fn) in cases.items():
+        repeats = args.repeats if name == "full_frame" else args.repeats * 100
+        legacy_s, current_s = best_of(legacy_fn, repeats), best_of(current_fn, repeats)
+        results[name] = {"legacy_ms": legacy_s * 1000, "vectorized_ms": current_s * 1000, "speedup": legacy_s / current_s}
+        print(f"{name:<12}{legacy_s * 1000:>12.3f}{current_s * 1000:>15.3f}{legacy_s / current_s:>9.1f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"data": args.data, "rows": len(raw), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+ML_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each measurement runs in a fresh interpreter so peak RSS belongs to one
+# loader only. ru_maxrss is reported in KiB on Linux.
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {ml_api_dir!r})
+from models.data_processor import load_and_preprocess_data
+from models.data_loader import stream_load_data
+start = time.perf_counter()
+if {loader!r} == "pandas":
+    result = load_and_preprocess_data({path!r})
+else:
+    result = stream_load_data({path!r}, cache_dir={cache_dir!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "train_rows": len(result[0]),
+    "test_rows": len(result[1])
+}}))
+"""
+
+
+def make_scaled_csv(source, scale, seed=42):
+    # Replicates cardio.csv `scale` times with small jitter on the measurements
+    # so the registry-sized file is not just exact duplicates.
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    df = pd.read_csv(source, sep=";")
+    rng = np.random.default_rng(seed)
+    for i in range(scale):
+        part = df.copy()
+        if i:
+            part["id"] += i * len(df)
+            part["weight"] = (part["weight"] + rng.normal(0, 1, len(part))).round(1)
+            part["age"] += rng.integers(-30, 30, len(part))
+        part.to_csv(path, sep=";", index=False, header=(i == 0), mode="a")
+    return path
+
+
+def measure(loader, path, cache_dir):
+    code = CHILD.format(ml_api_dir=ML_API_DIR, loader=loader, path=path, cache_dir=cache_dir)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ML_API_DIR)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load time and peak memory of the training data loaders")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate the dataset this many times")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.data) if args.scale == 1 else make_scaled_csv(args.data, args.scale)
+    cache_dir = tempfile.mkdtemp(prefix="chd-loader-cache-")
+    try:
+        results = {
+            "pandas": measure("pandas", path, cache_dir),
+            "stream_cold": measure("stream", path, cache_dir),
+            "stream_cached": measure("stream", path, cache_dir),
+        }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        if args.scale != 1:
+            os.remove(path)
+
+    print(f"{'loader':<15}{'seconds':>10}{'peak RSS MB':>14}{'train rows':>12}")
+    for name, r in results.items():
+        print(f"{name:<15}{r['seconds']:>10.2f}{r['peak_rss_mb']:>14.1f}{r['train_rows']:>12}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"data": args.data, "scale": args.scale, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAW_COLUMNS = ["age", "gender", "height", "weight", "ap_hi", "ap_lo", "cholesterol", "gluc", "smoke", "alco", "active"]
+
+
+def load_payloads(path, n, seed=42):
+    df = pd.read_csv(path, sep=";", usecols=RAW_COLUMNS)
+    # Plausible records only, so /predict accepts every payload
+    df = df[df["ap_hi"].between(50, 300) & df["ap_lo"].between(20, 200)
+            & df["height"].between(100, 250) & df["weight"].between(20, 300)]
+    return df.sample(n=min(n, len(df)), random_state=seed).to_dict("records")
+
+
+class TestClientTarget:
+    name = "test_client"
+
+    def __init__(self):
+        import app as ml_app
+        self.app = ml_app
+        self.local = threading.local()
+        self.cache_entries = ml_app.prediction_cache.max_entries
+
+    def models(self):
+        return [m for m, path in self.app.MODEL_PATHS.items() if os.path.exists(path)]
+
+    def post(self, path, body):
+        # One client per thread so concurrent runs do not share a cookie jar
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.app.test_client()
+        response = self.local.client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_json()}")
+        return response.get_json()
+
+    def make_cold(self, model_name):
+        self.app.model_registry.clear(model_name)
+        return True
+
+    def use_prediction_cache(self, enabled):
+        self.app.prediction_cache.max_entries = self.cache_entries if enabled else 0
+        return self.app.prediction_cache.enabled
+
+
+class HttpTarget:
+    name = "http"
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.seen = set()
+
+    def models(self):
+        with urllib.request.urlopen(f"{self.url}/models") as response:
+            models = json.load(response)["models"]
+        return [m for m, info in models.items() if info["available"]]
+
+    def post(self, path, body):
+        request = urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def make_cold(self, model_name):
+        # A remote server cannot be forced cold; only its first request per
+        # model counts as a cold sample.
+        if model_name in self.seen:
+            return False
+        self.seen.add(model_name)
+        return True
+
+    def use_prediction_cache(self, enabled):
+        # A remote server's cache cannot be switched; cold and warm samples
+        # rely on payloads it has not seen yet
+        return enabled
+
+
+def summarize(latencies, rows_per_call):
+    latencies = np.asarray(latencies)
+    total = latencies.sum()
+    return {
+        "calls": len(latencies),
+        "rows_per_call": rows_per_call,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "requests_per_s": float(len(latencies) / total) if total else None,
+        "rows_per_s": float(len(latencies) * rows_per_call / total) if total else None
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(target, models, payloads, requests, batch_sizes, cold_samples, warmup, concurrency=1, cache_hits=False):
+    # Cold, warmup and warm requests use disjoint payloads and the prediction
+    # cache is off, so every timed request runs the model. Cache hits are
+    # measured separately, as the "cached" state.
+    if len(payloads) < cold_samples + warmup + requests:
+        raise ValueError(f"{len(payloads)} payloads cannot cover {cold_samples + warmup + requests} distinct requests")
+    cold_payloads = payloads[:cold_samples]
+    warmup_payloads = payloads[cold_samples:cold_samples + warmup]
+    warm_payloads = payloads[cold_samples + warmup:cold_samples + warmup + requests]
+    target.use_prediction_cache(False)
+    results = []
+    for model in models:
+        cold = []
+        for payload in cold_payloads:
+            if not target.make_cold(model):
+                break
+            body = {"model": model, "inputData": payload}
+            cold.append(timed(lambda: target.post("/predict", body)))
+        if cold:
+            results.append({"model": model, "mode": "single", "state": "cold", **summarize(cold, 1)})
+
+        for payload in warmup_payloads:
+            target.post("/predict", {"model": model, "inputData": payload})
+        bodies = [{"model": model, "inputData": payload} for payload in warm_payloads]
+        if concurrency > 1:
+            # Latencies are per request; throughput is over the wall clock of
+            # the whole run since requests overlap
+            with ThreadPoolExecutor(concurrency) as pool:
+                start = time.perf_counter()
+                warm = list(pool.map(lambda body: timed(lambda: target.post("/predict", body)), bodies))
+                wall = time.perf_counter() - start
+            summary = summarize(warm, 1)
+            summary["requests_per_s"] = summary["rows_per_s"] = requests / wall
+            results.append({"model": model, "mode": f"single_c{concurrency}", "state": "warm", **summary})
+        else:
+            warm = [timed(lambda: target.post("/predict", body)) for body in bodies]
+            results.append({"model": model, "mode": "single", "state": "warm", **summarize(warm, 1)})
+
+        if cache_hits and target.use_prediction_cache(True):
+            # The warm payloads are sent once more to fill the cache, then
+            # timed as hits
+            for body in bodies:
+                target.post("/predict", body)
+            cached = [timed(lambda: target.post("/predict", body)) for body in bodies]
+            results.append({"model": model, "mode": "single", "state": "cached", **summarize(cached, 1)})
+            target.use_prediction_cache(False)
+
+        for batch_size in batch_sizes:
+            records = (payloads * (batch_size // len(payloads) + 1))[:batch_size]
+            body = {"model": model, "records": records}
+            calls = max(3, requests // max(1, batch_size // 10))
+            latencies = [timed(lambda: target.post("/predict/batch", body)) for _ in range(calls)]
+            results.append({"model": model, "mode": f"batch_{batch_size}", "state": "warm", **summarize(latencies, batch_size)})
+        print(f"{model}: done", file=sys.stderr)
+    return results
+
+
+def result_key(result):
+    return f"{result['model']}/{result['mode']}/{result['state']}"
+
+
+def compare(results, baseline, tolerance):
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result_key(result)}: p95 {result['p95_ms']:.2f}ms vs baseline {base['p95_ms']:.2f}ms")
+        if base["rows_per_s"] and result["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{result_key(result)}: {result['rows_per_s']:.0f} rows/s vs baseline {base['rows_per_s']:.0f} rows/s")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'model':<27}{'mode':<13}{'state':<8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>10}{'rows/s':>11}")
+    for r in results:
+        print(f"{r['model']:<27}{r['mode']:<13}{r['state']:<8}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['requests_per_s']:>10.1f}{r['rows_per_s']:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark for the CHD ML-API")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process Flask test client")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--models", nargs="*", help="Models to benchmark (default: every available model)")
+    parser.add_argument("--requests", type=int, default=200, help="Warm single-row requests per model")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[100, 1000])
+    parser.add_argument("--cold-samples", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent clients for the warm single-row requests")
+    parser.add_argument("--cache-hits", action="store_true", help="Also time single-row requests served from the prediction cache")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--baseline", help="Fail if results regress against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    target = HttpTarget(args.url) if args.url else TestClientTarget()
+    models = args.models or target.models()
+    payloads = load_payloads(args.data, max(args.cold_samples + args.warmup + args.requests, 1000), args.seed)
+    results = run(target, models, payloads, args.requests, args.batch_sizes, args.cold_samples, args.warmup,
+                  args.concurrency, args.cache_hits)
+    print_table(results)
+
+    report = {
+        "target": target.name if not args.url else args.url,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
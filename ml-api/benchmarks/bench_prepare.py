@@ -0,0 +1,116 @@
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+ML_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_API_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_loader import make_scaled_csv
+
+
+# Reference implementation as it was before the memory work: SMOTETomek with
+# brute-force neighbours and the full float64 interaction matrix for the
+# selector forest and the selector transform.
+def legacy_prepare_training_data(data_path, n_jobs=-1):
+    from imblearn.combine import SMOTETomek
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.feature_selection import SelectFromModel
+    from sklearn.preprocessing import PolynomialFeatures
+    from models.data_loader import stream_load_data
+    from models.pipeline import build_inference_pipeline
+    X_train, X_test, y_train, y_test, scaler, feature_columns = stream_load_data(data_path)
+    X_train_scaled = scaler.transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    X_train_balanced, y_train_balanced = SMOTETomek(random_state=42).fit_resample(X_train_scaled, y_train)
+    poly = PolynomialFeatures(degree=2, interaction_only=True, include_bias=False)
+    X_train_poly = poly.fit_transform(X_train_balanced)
+    feature_selector_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    feature_selector_model.fit(X_train_poly, y_train_balanced)
+    selector = SelectFromModel(feature_selector_model, prefit=True, threshold="median")
+    inference_pipeline = build_inference_pipeline(scaler, selector, feature_columns)
+    return {
+        "X_train": selector.transform(X_train_poly),
+        "y_train": np.asarray(y_train_balanced),
+        "X_test": inference_pipeline.named_steps["interactions"].transform(X_test_scaled),
+        "y_test": np.asarray(y_test),
+        "selector": selector
+    }
+
+
+def digest(array):
+    return hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest()
+
+
+def run_child(path, data):
+    # Runs in its own interpreter so peak RSS belongs to one path only.
+    # ru_maxrss is reported in KiB on Linux.
+    # Both paths import the training module so its libraries count for both
+    from models.chd_model import prepare_training_data
+    start = time.perf_counter()
+    if path == "legacy":
+        prep = legacy_prepare_training_data(data)
+    else:
+        prep = prepare_training_data(data)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "train_rows": len(prep["y_train"]),
+        "train_columns": prep["X_train"].shape[1],
+        "support": prep["selector"].get_support().tolist(),
+        "X_test": digest(prep["X_test"])
+    }))
+
+
+def measure(path, data):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path, "--data", data],
+                            capture_output=True, text=True, check=True, cwd=ML_API_DIR)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of training data preparation: legacy vs current")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate the dataset this many times")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--child", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.data)
+        return
+
+    path = os.path.abspath(args.data) if args.scale == 1 else make_scaled_csv(args.data, args.scale)
+    try:
+        results = {"legacy": measure("legacy", path), "current": measure("current", path)}
+    finally:
+        if args.scale != 1:
+            os.remove(path)
+
+    print(f"{'path':<10}{'seconds':>10}{'peak RSS MB':>14}{'train rows':>12}{'columns':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['seconds']:>10.2f}{r['peak_rss_mb']:>14.1f}{r['train_rows']:>12}{r['train_columns']:>10}")
+    # The KD-tree Tomek step pairs exact duplicates with each other, so a few
+    # more links are removed and the forest sees a slightly different set.
+    legacy, current = results["legacy"], results["current"]
+    changed = sum(a != b for a, b in zip(legacy["support"], current["support"]))
+    print(f"Training rows: {current['train_rows'] - legacy['train_rows']:+d} after Tomek-link removal")
+    print(f"Selected interactions: {changed} of {len(current['support'])} candidate columns differ")
+    if not changed:
+        print("Test matrix:", "bit-identical" if legacy["X_test"] == current["X_test"] else "DIFFERENT")
+    if args.output:
+        for r in results.values():
+            del r["support"]
+        with open(args.output, "w") as f:
+            json.dump({"data": args.data, "scale": args.scale, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ML_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_API_DIR)
+
+
+# Per-request work /predict does before the model call, as it was before the
+# compiled input schema: json body -> one-row DataFrame -> validation and
+# feature engineering in pandas -> StandardScaler.transform -> interactions.
+def legacy_build_feature_matrix(records_df, record_errors, raw_inputs, original_features, feature_engineer):
+    columns = raw_inputs + ["age", "age_years"]
+    raw = records_df.reindex(columns=columns)
+    values = raw.apply(pd.to_numeric, errors="coerce")
+    missing = raw.isna().to_numpy()
+    invalid = values.isna().to_numpy() & ~missing
+    values["age_years"] = (values["age"] / 365.25).fillna(values["age_years"])
+    values = values.drop(columns=["age"])
+    age_missing = missing[:, -2] & missing[:, -1]
+    age_out_of_range = ~values["age_years"].between(0, 100, inclusive="right").to_numpy() & ~age_missing
+    for index in np.flatnonzero(missing[:, :-2].any(axis=1) | age_missing | invalid.any(axis=1) | age_out_of_range):
+        messages = []
+        missing_fields = [f for f, m in zip(raw_inputs, missing[index]) if m]
+        if age_missing[index]:
+            missing_fields.append("age_years")
+        invalid_fields = [f for f, m in zip(columns, invalid[index]) if m]
+        if missing_fields:
+            messages.append(f"Missing input fields: {missing_fields}")
+        if invalid_fields:
+            messages.append(f"Non-numeric input fields: {invalid_fields}")
+        elif age_out_of_range[index]:
+            messages.append("age_years must be between 0 and 100")
+        record_errors[int(index)] = "; ".join(messages)
+    valid = np.ones(len(values), dtype=bool)
+    valid[list(record_errors)] = False
+    return feature_engineer(original_features).transform(values[valid]), np.flatnonzero(valid)
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request overhead before the model call: legacy pandas path vs compiled input schema")
+    parser.add_argument("--data", default=os.path.join(ML_API_DIR, "data/cardio.csv"))
+    parser.add_argument("--models", default=ML_API_DIR, help="Directory containing the models/ folder to load")
+    parser.add_argument("--records", type=int, default=500, help="Records checked for identical feature vectors")
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    os.chdir(args.models)
+    import app as api
+    from models.data_processor import FeatureEngineer
+    from models.schema import loads
+
+    if api.inference_pipeline is None:
+        sys.exit(f"Model artifacts are not loaded: {api.missing_artifacts()}")
+    scaler = api.inference_pipeline.named_steps["scaler"]
+    interactions = api.inference_pipeline.named_steps["interactions"]
+
+    def legacy(body):
+        features = json.loads(body)["inputData"]
+        errors = {}
+        input_df, _ = legacy_build_feature_matrix(pd.DataFrame([features]), errors, api.RAW_INPUTS,
+                                                  api.original_features, FeatureEngineer)
+        _ = input_df.iloc[0].to_dict()
+        return interactions.transform(scaler.transform(input_df))
+
+    def current(body):
+        features = loads(body)["inputData"]
+        input_row, _ = api.input_schema.vector(features)
+        return interactions.transform(api.scale_rows(input_row.reshape(1, -1)))
+
+    raw = pd.read_csv(args.data, sep=";").drop(columns=["id", "cardio"])
+    # Plausible records only, so both paths accept every one of them
+    valid = raw[raw["ap_hi"].between(50, 300) & raw["ap_lo"].between(20, 200)
+                & raw["height"].between(100, 250) & raw["weight"].between(20, 300)]
+    bodies = [json.dumps({"model": "logistic_regression", "inputData": record}).encode()
+              for record in valid.head(args.records).to_dict("records")]
+    for body in bodies:
+        if not np.array_equal(legacy(body), current(body)):
+            sys.exit("Model inputs differ between the legacy and current paths")
+    print(f"Model inputs are bit-identical on {len(bodies)} records")
+
+    body = bodies[0]
+    features = json.loads(body)["inputData"]
+    cases = {
+        "parse": (lambda: json.loads(body), lambda: loads(body)),
+        "validate": (
+            lambda: legacy_build_feature_matrix(pd.DataFrame([features]), {}, api.RAW_INPUTS,
+                                                api.original_features, FeatureEngineer),
+            lambda: api.input_schema.vector(features),
+        ),
+        "total": (lambda: legacy(body), lambda: current(body)),
+    }
+    results = {}
+    print(f"{'stage':<10}{'legacy us':>12}{'current us':>12}{'speedup':>10}")
+    for name, (legacy_fn, current_fn) in cases.items():
+        legacy_s, current_s = best_of(legacy_fn, args.repeats), best_of(current_fn, args.repeats)
+        results[name] = {"legacy_us": legacy_s * 1e6, "current_us": current_s * 1e6, "speedup": legacy_s / current_s}
+        print(f"{name:<10}{legacy_s * 1e6:>12.1f}{current_s * 1e6:>12.1f}{legacy_s / current_s:>9.1f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"data": args.data, "records": len(bodies), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import multiprocessing
+import os
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:application
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get("ML_API_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("ML_API_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("ML_API_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+timeout = int(os.environ.get("ML_API_TIMEOUT", 120))
+accesslog = os.environ.get("ML_API_ACCESS_LOG") or None
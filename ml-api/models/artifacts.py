@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
+from .pipeline import SelectedInteractions
+from .fast_trees import FlatTreeEnsemble, CompiledTreeModel, compile_tree_model
+from .fused_linear import fuse_logistic_regression, load_fused
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Served models and their pickle files, relative to the models directory
+MODEL_FILES = {
+    "logistic_regression": "logistic_regression.pkl",
+    "random_forest": "random_forest.pkl",
+    "xgboost": "xgboost.pkl",
+    "lightgbm": "lightgbm.pkl",
+    "catboost": "catboost.pkl",
+    "voting_ensemble": "voting_ensemble.pkl",
+    "stacking_model": "stacking_model.pkl",
+    "voting_ensemble_distilled": "voting_ensemble_distilled.pkl",
+    "stacking_model_distilled": "stacking_model_distilled.pkl",
+}
+
+FLAT_ARRAYS = ("roots", "feature", "threshold", "left", "right", "value")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint(feature_columns, mean, scale, support):
+    digest = hashlib.sha256(json.dumps(list(feature_columns)).encode())
+    for array in (mean, scale, support):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def atomic_dump(obj, path):
+    # Temp file plus rename, so the serving registry never sees a half-written
+    # pickle
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(models_dir="models"):
+    path = os.path.join(models_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != MANIFEST_VERSION:
+        logger.warning("Ignoring %s with unsupported format_version %s", path, manifest.get("format_version"))
+        return None
+    return manifest
+
+
+def manifest_files(manifest, models_dir="models"):
+    pipeline = manifest["pipeline"]
+    return [os.path.join(models_dir, pipeline[key]) for key in ("scaler_mean", "scaler_scale", "scaler_var", "support")]
+
+
+def load_pipeline(manifest, models_dir="models"):
+    # Rebuilds the scaler + interactions pipeline from raw arrays; nothing is
+    # unpickled.
+    spec = manifest["pipeline"]
+    feature_columns = manifest["feature_columns"]
+    scaler = StandardScaler()
+    scaler.mean_ = np.load(os.path.join(models_dir, spec["scaler_mean"]))
+    scaler.scale_ = np.load(os.path.join(models_dir, spec["scaler_scale"]))
+    scaler.var_ = np.load(os.path.join(models_dir, spec["scaler_var"]))
+    scaler.n_features_in_ = len(feature_columns)
+    scaler.feature_names_in_ = np.asarray(feature_columns, dtype=object)
+    scaler.n_samples_seen_ = spec["n_samples_seen"]
+    support = np.load(os.path.join(models_dir, spec["support"]))
+    interactions = SelectedInteractions(len(feature_columns), support).fit()
+    return feature_columns, Pipeline([("scaler", scaler), ("interactions", interactions)])
+
+
+def compatibility_error(manifest, name, fingerprint, n_output_features):
+    # Checks a model against the pipeline the server is running, from the
+    # manifest alone, before the model is deserialized.
+    entry = manifest["models"].get(name)
+    if entry is None:
+        return None
+    if entry["n_features"] != n_output_features:
+        return f"{name} expects {entry['n_features']} features but the pipeline produces {n_output_features}; retrain it"
+    if entry["pipeline_fingerprint"] != fingerprint:
+        return f"{name} was trained against a different preprocessing pipeline; retrain it or restart the server"
+    return None
+
+
+class LazyCompiledTreeModel(CompiledTreeModel):
+    # Flattened ensemble memory-mapped from the artifact directory; the
+    # library model is only unpickled the first time a large batch needs it.
+    def __init__(self, native_loader, ensemble, classes, n_features):
+        self._native_loader = native_loader
+        self._native = None
+        self.ensemble = ensemble
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+
+    @property
+    def native(self):
+        if self._native is None:
+            self._native = self._native_loader()
+        return self._native
+
+
+def load_flat_ensemble(directory, spec):
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in FLAT_ARRAYS}
+    return FlatTreeEnsemble(**arrays, max_depth=spec["max_depth"], strict=spec["strict"],
+                            float32_inputs=spec["float32_inputs"], aggregate=spec["aggregate"],
+                            scale=spec["scale"], bias=spec["bias"])
+
+
+def load_native(path, fmt):
+    if fmt == "xgboost":
+        from xgboost import XGBClassifier
+        model = XGBClassifier()
+        model.load_model(path)
+        return model
+    if fmt == "catboost":
+        from catboost import CatBoostClassifier
+        return CatBoostClassifier().load_model(path)
+    # Uncompressed joblib pickles memory-map their numpy arrays
+    return joblib.load(path, mmap_mode="r")
+
+
+def load_model(manifest, name, fingerprint, n_output_features, models_dir="models", fast_trees=True, fused_linear=True):
+    entry = manifest["models"][name]
+    error = compatibility_error(manifest, name, fingerprint, n_output_features)
+    if error:
+        raise ValueError(error)
+    if fused_linear and entry.get("fused"):
+        return load_fused(os.path.join(models_dir, entry["fused"]["path"]))
+    path = os.path.join(models_dir, entry["path"])
+    native_loader = lambda: load_native(path, entry["format"])
+    flat = entry.get("flat")
+    if fast_trees and flat:
+        ensemble = load_flat_ensemble(os.path.join(models_dir, flat["dir"]), flat)
+        return LazyCompiledTreeModel(native_loader, ensemble, entry["classes"], entry["n_features"])
+    model = native_loader()
+    if fused_linear and type(model).__name__ == "LogisticRegression":
+        # Entry written before fused scorers were exported
+        _, pipeline = load_pipeline(manifest, models_dir)
+        return fuse_logistic_regression(model, pipeline.named_steps["scaler"], pipeline.named_steps["interactions"]) or model
+    if fast_trees:
+        return compile_tree_model(model) or model
+    return model
+
+
+def served_bytes(manifest, name, models_dir="models", fast_trees=True, fused_linear=True):
+    # On-disk size of what load_model serves for this entry: the fused scorer,
+    # the memory-mapped flat arrays, or the model file itself
+    entry = manifest["models"][name]
+    if fused_linear and entry.get("fused"):
+        return os.path.getsize(os.path.join(models_dir, entry["fused"]["path"]))
+    if fast_trees and entry.get("flat"):
+        directory = os.path.join(models_dir, entry["flat"]["dir"])
+        return sum(os.path.getsize(os.path.join(directory, f"{array}.npy")) for array in FLAT_ARRAYS)
+    return os.path.getsize(os.path.join(models_dir, entry["path"]))
+
+
+def _timed_load(path, fmt):
+    start = time.perf_counter()
+    load_native(path, fmt)
+    return time.perf_counter() - start
+
+
+def _native_candidate(model, directory, name):
+    # Booster formats are kept only where they load faster than the pickle.
+    # They are written next to the pickle they describe.
+    kind = type(model).__name__
+    if kind == "XGBClassifier":
+        path, fmt = os.path.join(directory, f"{name}.ubj"), "xgboost"
+    elif kind == "CatBoostClassifier":
+        path, fmt = os.path.join(directory, f"{name}.cbm"), "catboost"
+    else:
+        return None
+    model.save_model(path)
+    return path, fmt
+
+
+def _save_flat(ensemble, directory):
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name in FLAT_ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(ensemble, name))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def write_manifest(models_dir, feature_columns, scaler, support, model_metrics=None, data_hash=None, models=None,
+                   sources=None):
+    # Called at the end of training, after the .pkl files are written. Models
+    # whose pickle is unchanged since the previous manifest keep their entry
+    # (and the pipeline they were trained with); the others are described
+    # against the current pipeline. `sources` maps a model name to a pickle
+    # outside the served location, e.g. a version directory that is published
+    # only after the manifest: the entry then points at that file, so the
+    # manifest never describes a pickle it has not seen.
+    previous = read_manifest(models_dir) or {"models": {}}
+    support = np.asarray(support, dtype=bool)
+    interactions = SelectedInteractions(len(feature_columns), support).fit()
+    os.makedirs(os.path.join(models_dir, "preprocessing"), exist_ok=True)
+    arrays = {"scaler_mean": scaler.mean_, "scaler_scale": scaler.scale_, "scaler_var": scaler.var_, "support": support}
+    pipeline = {key: f"preprocessing/{key}.npy" for key in arrays}
+    for key, array in arrays.items():
+        np.save(os.path.join(models_dir, pipeline[key]), array)
+    pipeline.update({
+        "n_samples_seen": int(np.max(scaler.n_samples_seen_)),
+        "n_output_features": int(support.sum()),
+        "fingerprint": pipeline_fingerprint(feature_columns, scaler.mean_, scaler.scale_, support),
+    })
+
+    entries = {}
+    for name, filename in MODEL_FILES.items():
+        path = (sources or {}).get(name) or os.path.join(models_dir, filename)
+        if not os.path.exists(path):
+            continue
+        digest = file_hash(path)
+        old = previous["models"].get(name)
+        if old and old.get("sha256") == digest:
+            entries[name] = old
+            continue
+        model = (models or {}).get(name) or joblib.load(path)
+        n_features = getattr(model, "n_features_in_", 0) or len(getattr(model, "feature_names_", []))
+        entry = {
+            "path": os.path.relpath(path, models_dir),
+            "format": "joblib",
+            "sha256": digest,
+            "size_bytes": os.path.getsize(path),
+            "n_features": int(n_features),
+            "classes": np.asarray(model.classes_).tolist(),
+            "pipeline_fingerprint": pipeline["fingerprint"],
+            "load_seconds": {"joblib": round(_timed_load(path, "joblib"), 4)},
+        }
+        candidate = _native_candidate(model, os.path.dirname(path), name)
+        if candidate:
+            native_path, fmt = candidate
+            entry["load_seconds"][fmt] = round(_timed_load(native_path, fmt), 4)
+            if entry["load_seconds"][fmt] < entry["load_seconds"]["joblib"]:
+                entry.update(path=os.path.relpath(native_path, models_dir), format=fmt)
+            else:
+                os.remove(native_path)
+        compiled = compile_tree_model(model)
+        if compiled is not None:
+            ensemble = compiled.ensemble
+            flat_dir = os.path.join("flat", f"{name}-{digest[:16]}")
+            _save_flat(ensemble, os.path.join(models_dir, flat_dir))
+            entry["flat"] = {
+                "dir": flat_dir, "max_depth": ensemble.max_depth, "strict": ensemble.strict,
+                "float32_inputs": ensemble.float32_inputs, "aggregate": ensemble.aggregate,
+                "scale": float(ensemble.scale), "bias": float(ensemble.bias),
+            }
+        fused = fuse_logistic_regression(model, scaler, interactions)
+        if fused is not None:
+            os.makedirs(os.path.join(models_dir, "fused"), exist_ok=True)
+            fused_path = os.path.join("fused", f"{name}-{digest[:16]}.npz")
+            fused.save(os.path.join(models_dir, fused_path))
+            entry["fused"] = {"path": fused_path}
+        entries[name] = entry
+        logger.info("Described %s in manifest", name)
+
+    # Flat arrays and fused scorers of replaced models are removed; processes
+    # that still map them keep their pages until they reload.
+    live = {entry["flat"]["dir"] for entry in entries.values() if entry.get("flat")}
+    flat_root = os.path.join(models_dir, "flat")
+    if os.path.isdir(flat_root):
+        for directory in os.listdir(flat_root):
+            if os.path.join("flat", directory) not in live:
+                shutil.rmtree(os.path.join(flat_root, directory), ignore_errors=True)
+    live = {entry["fused"]["path"] for entry in entries.values() if entry.get("fused")}
+    fused_root = os.path.join(models_dir, "fused")
+    if os.path.isdir(fused_root):
+        for filename in os.listdir(fused_root):
+            if os.path.join("fused", filename) not in live:
+                os.remove(os.path.join(fused_root, filename))
+
+    manifest = {
+        "format_version": MANIFEST_VERSION,
+        "created_at": time.time(),
+        "data_hash": data_hash,
+        "feature_columns": list(feature_columns),
+        "pipeline": pipeline,
+        "metrics": model_metrics or {},
+        "models": entries,
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=models_dir, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2, default=float)
+    os.replace(tmp_path, os.path.join(models_dir, MANIFEST_NAME))
+    return manifest
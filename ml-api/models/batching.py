@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MICROBATCH_ENABLED = os.environ.get("ML_API_MICROBATCH", "1") == "1"
+DEFAULT_MAX_ROWS = int(os.environ.get("ML_API_MICROBATCH_MAX_ROWS", 32))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("ML_API_MICROBATCH_WAIT_MS", 2))
+# Single rows of the flattened tree models and logistic regression cost less
+# than the hand-off to the scheduler thread, so only the ensembles, which run
+# five base models per call, are coalesced by default.
+MICROBATCH_MODELS = os.environ.get("ML_API_MICROBATCH_MODELS", "voting_ensemble,stacking_model").split(",")
+
+
+def batch_config(name):
+    # ML_API_MICROBATCH_<MODEL>="rows,wait_ms" overrides the defaults for one
+    # model, e.g. ML_API_MICROBATCH_STACKING_MODEL="64,5"; rows=1 disables it.
+    override = os.environ.get(f"ML_API_MICROBATCH_{name.upper()}")
+    if not override:
+        return (DEFAULT_MAX_ROWS if name in MICROBATCH_MODELS else 1), DEFAULT_MAX_WAIT_MS
+    rows, _, wait_ms = override.partition(",")
+    return int(rows), float(wait_ms) if wait_ms else DEFAULT_MAX_WAIT_MS
+
+
+class MicroBatcher:
+    # Coalesces concurrent single-row predictions for one model into one
+    # predict_proba call. A batch is flushed when it reaches max_rows, when the
+    # oldest row has waited max_wait_ms, or as soon as no other request that
+    # announced itself with expect() is still on its way, so a lone request is
+    # never held back by the deadline.
+    def __init__(self, name, max_rows=DEFAULT_MAX_ROWS, max_wait_ms=DEFAULT_MAX_WAIT_MS, observe=None):
+        self.name = name
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max_wait_ms / 1000.0
+        self.observe = observe
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_rows = 0
+        self._pending = []
+        self._incoming = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.max_rows > 1
+
+    def expect(self):
+        return _Expectation(self)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def submit(self, model, row, expectation=None):
+        future = Future()
+        with self._cond:
+            if expectation is not None and expectation.active:
+                expectation.active = False
+                self._incoming -= 1
+            self._pending.append((model, np.asarray(row, dtype=np.float64), future, time.perf_counter()))
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily so that gunicorn's preload fork never inherits
+                # a dead scheduler thread
+                self._thread = threading.Thread(target=self._run, name=f"microbatch-{self.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def predict_proba(self, model, row, expectation=None):
+        if not self.enabled:
+            if expectation is not None:
+                expectation.release()
+            return model.predict_proba(np.asarray(row, dtype=np.float64).reshape(1, -1))[0]
+        return self.submit(model, row, expectation).result()
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._pending)
+        return {
+            "enabled": self.enabled,
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": depth,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "max_batch_rows": self.max_batch_rows
+        }
+
+    def _ready(self):
+        if len(self._pending) >= self.max_rows or self._incoming == 0:
+            return True
+        return time.perf_counter() - self._pending[0][3] >= self.max_wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while not self._ready():
+                    self._cond.wait(max(0.0, self._pending[0][3] + self.max_wait - time.perf_counter()))
+                batch, self._pending = self._pending[:self.max_rows], self._pending[self.max_rows:]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        waited = time.perf_counter() - batch[0][3]
+        # Rows queued across a model reload are scored by the model they were
+        # submitted with
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item[0]), []).append(item)
+        for items in groups.values():
+            try:
+                probabilities = items[0][0].predict_proba(np.vstack([item[1] for item in items]))
+            except Exception as e:
+                logger.exception("Micro-batch for %s failed", self.name)
+                for item in items:
+                    item[2].set_exception(e)
+                continue
+            for item, p in zip(items, probabilities):
+                item[2].set_result(p)
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_batch_rows = max(self.max_batch_rows, len(batch))
+        if self.observe is not None:
+            self.observe(self.name, len(batch), waited)
+
+
+class _Expectation:
+    # Marks a request that will submit a row shortly (or release without one,
+    # e.g. on a cache hit or a validation error) so the scheduler knows whether
+    # waiting for company can pay off.
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.active = False
+
+    def __enter__(self):
+        with self.batcher._cond:
+            self.batcher._incoming += 1
+            self.active = True
+        return self
+
+    def release(self):
+        with self.batcher._cond:
+            if self.active:
+                self.active = False
+                self.batcher._incoming -= 1
+                self.batcher._cond.notify()
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
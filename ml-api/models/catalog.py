@@ -0,0 +1,70 @@
+import os
+import hashlib
+import threading
+from datetime import datetime, timezone
+from werkzeug.http import http_date
+
+# Served model name -> key of its entry in model_metrics.pkl
+METRIC_KEYS = {
+    "logistic_regression": "lr",
+    "random_forest": "rf",
+    "xgboost": "xgb",
+    "lightgbm": "lgb",
+    "catboost": "cat",
+    "voting_ensemble": "ensemble",
+    "stacking_model": "stacking",
+    "voting_ensemble_distilled": "ensemble_distilled",
+    "stacking_model_distilled": "stacking_distilled",
+}
+
+
+def etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class ModelCatalog:
+    # Snapshot of what the catalog endpoints report, rebuilt by `build` only
+    # when one of the `watch` paths changes. A directory's mtime moves when
+    # files in it are created, removed or atomically replaced; files that are
+    # rewritten in place (model_metrics.pkl) have to be watched themselves.
+    # The `static` responses are serialized once per snapshot, so their ETag
+    # and Last-Modified are the same in every worker.
+    def __init__(self, watch, build, serialize, static=()):
+        self.watch = list(watch)
+        self.build = build
+        self.serialize = serialize
+        self.static = tuple(static)
+        self.rebuilds = 0
+        self._signature = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        signature = []
+        for path in self.watch:
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self):
+        signature = self._current_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._snapshot = self._build(signature)
+                    self._signature = signature
+                    self.rebuilds += 1
+        return self._snapshot
+
+    def _build(self, signature):
+        data = self.build()
+        newest = max((s for s in signature if s is not None), default=0)
+        data["last_modified"] = datetime.fromtimestamp(newest // 10 ** 9, tz=timezone.utc)
+        data["last_modified_header"] = http_date(data["last_modified"])
+        data["bodies"] = {}
+        for key in self.static:
+            body = self.serialize(data[key]).encode()
+            data["bodies"][key] = (body, etag(body))
+        return data
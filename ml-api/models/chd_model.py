@@ -1,26 +1,53 @@
-import pandas as pd
 import numpy as np
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier, StackingClassifier
 from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
 from catboost import CatBoostClassifier
-from sklearn.model_selection import cross_val_score
 from sklearn.preprocessing import PolynomialFeatures
 from sklearn.metrics import accuracy_score, roc_auc_score, precision_score, recall_score, f1_score
 from sklearn.feature_selection import SelectFromModel
-from imblearn.combine import SMOTETomek
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KDTree, NearestNeighbors
+from imblearn.over_sampling import SMOTE
 import joblib
+import json
 import os
+import time
 import warnings
-import optuna
 from models.data_processor import load_and_preprocess_data
 from .data_processor import load_and_preprocess_data
+from .data_loader import stream_load_data
+from .pipeline import SelectedInteractions, build_inference_pipeline
+from .devices import cpu_threads, training_backend, record_backend
+from .tuning import run_study, cv_score, best_iteration
+from .fast_trees import compile_tree_model
+from .artifacts import atomic_dump, write_manifest, file_hash
+from .catalog import METRIC_KEYS
+from .drift import build_reference, served_risk, write_json as write_drift_json, REFERENCE_PATH
 
 
 warnings.filterwarnings('ignore')
 
-def tune_rf(X, y, n_trials=100):
+# stream: chunked CSV parsing into a memory-mapped column cache that later
+# runs reuse; pandas: the original whole-file read_csv path.
+DATA_LOADER = os.environ.get("CHD_DATA_LOADER", "stream").lower()
+# Rows of the balanced training set used to fit the random forest whose
+# importances pick the interaction columns
+SELECTOR_SAMPLE_ROWS = int(os.environ.get("CHD_SELECTOR_SAMPLE_ROWS", 100000))
+# Distillation: one shallow LightGBM student per ensemble, fitted to the
+# ensemble's probabilities on the training rows plus synthetic rows near its
+# decision boundary. A student is published only if its held-out AUC and
+# recall stay within these margins of its teacher's.
+DISTILL_SYNTHETIC_ROWS = int(os.environ.get("CHD_DISTILL_SYNTHETIC_ROWS", 50000))
+DISTILL_NOISE = float(os.environ.get("CHD_DISTILL_NOISE", 0.25))
+DISTILL_TREES = int(os.environ.get("CHD_DISTILL_TREES", 300))
+DISTILL_LEAVES = int(os.environ.get("CHD_DISTILL_LEAVES", 15))
+DISTILL_MAX_AUC_DROP = float(os.environ.get("CHD_DISTILL_MAX_AUC_DROP", 0.005))
+DISTILL_MAX_RECALL_DROP = float(os.environ.get("CHD_DISTILL_MAX_RECALL_DROP", 0.02))
+
+def tune_rf(X, y, n_trials=100, n_jobs=-1, storage=None, study_name=None, backend=None):
+    n_jobs = backend["threads"] if backend else cpu_threads(n_jobs)
     def objective(trial):
         clf = RandomForestClassifier(
             n_estimators=trial.suggest_int("n_estimators", 100, 600, step=50),
@@ -28,14 +55,14 @@ def tune_rf(X, y, n_trials=100):
             min_samples_split=trial.suggest_int("min_samples_split", 2, 15),
             min_samples_leaf=trial.suggest_int("min_samples_leaf", 1, 6),
             random_state=42,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
-        return cross_val_score(clf, X, y, cv=3, scoring="roc_auc").mean()
-    study = optuna.create_study(direction="maximize")
-    study.optimize(objective, n_trials=n_trials)
-    return RandomForestClassifier(**study.best_params, random_state=42, n_jobs=-1)
+        return cv_score(trial, clf, X, y)
+    study = run_study(objective, n_trials, storage, study_name, label="rf")
+    return RandomForestClassifier(**study.best_params, random_state=42, n_jobs=n_jobs)
 
-def tune_xgb(X, y, n_trials=100):
+def tune_xgb(X, y, n_trials=100, n_jobs=-1, storage=None, study_name=None, backend=None):
+    device_params = (backend or training_backend(n_jobs=n_jobs))["params"]["xgb"]
     def objective(trial):
         clf = XGBClassifier(
             n_estimators=trial.suggest_int("n_estimators", 100, 600, step=50),
@@ -44,53 +71,51 @@ def tune_xgb(X, y, n_trials=100):
             subsample=trial.suggest_float("subsample", 0.6, 1.0),
             colsample_bytree=trial.suggest_float("colsample_bytree", 0.6, 1.0),
             eval_metric="logloss",
-            tree_method="gpu_hist",
-            predictor="gpu_predictor",
             random_state=42,
-            n_jobs=-1
+            **device_params
         )
-        return cross_val_score(clf, X, y, cv=3, scoring="roc_auc").mean()
-    study = optuna.create_study(direction="maximize")
-    study.optimize(objective, n_trials=n_trials)
-    return XGBClassifier(**study.best_params, eval_metric="logloss", tree_method="gpu_hist", predictor="gpu_predictor", random_state=42, n_jobs=-1)
+        return cv_score(trial, clf, X, y, early_stopping=True)
+    study = run_study(objective, n_trials, storage, study_name, label="xgb")
+    params = {**study.best_params, "n_estimators": best_iteration(study, study.best_params["n_estimators"])}
+    return XGBClassifier(**params, eval_metric="logloss", random_state=42, **device_params)
 
-def tune_lgbm(X, y, n_trials=100):
+def tune_lgbm(X, y, n_trials=100, n_jobs=-1, storage=None, study_name=None, backend=None):
+    device_params = (backend or training_backend(n_jobs=n_jobs))["params"]["lgbm"]
     def objective(trial):
         params = {
             'num_leaves': trial.suggest_int('num_leaves', 20, 150),
             'max_depth': trial.suggest_int('max_depth', 3, 12),
-            'learning_rate': trial.suggest_loguniform('learning_rate', 1e-3, 0.3),
+            'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
             'n_estimators': trial.suggest_int('n_estimators', 100, 1000, step=50),
             'min_child_samples': trial.suggest_int('min_child_samples', 5, 100),
             'subsample': trial.suggest_float('subsample', 0.5, 1.0),
             'colsample_bytree': trial.suggest_float('colsample_bytree', 0.5, 1.0),
             'reg_alpha': trial.suggest_float('reg_alpha', 0.0, 1.0),
-            'reg_lambda': trial.suggest_float('reg_lambda', 0.0, 1.0),
-            'device': 'gpu'
+            'reg_lambda': trial.suggest_float('reg_lambda', 0.0, 1.0)
         }
-        clf = LGBMClassifier(**params, random_state=42, n_jobs=-1)
-        return cross_val_score(clf, X, y, cv=3, scoring='roc_auc').mean()
-    study = optuna.create_study(direction='maximize')
-    study.optimize(objective, n_trials=n_trials)
-    return LGBMClassifier(**study.best_params, random_state=42, n_jobs=-1, device='gpu')
+        clf = LGBMClassifier(**params, random_state=42, verbose=-1, **device_params)
+        return cv_score(trial, clf, X, y, early_stopping=True)
+    study = run_study(objective, n_trials, storage, study_name, label="lgb")
+    params = {**study.best_params, "n_estimators": best_iteration(study, study.best_params["n_estimators"])}
+    return LGBMClassifier(**params, random_state=42, verbose=-1, **device_params)
 
-def tune_catboost(X, y, n_trials=100):
+def tune_catboost(X, y, n_trials=100, n_jobs=-1, storage=None, study_name=None, backend=None):
+    device_params = (backend or training_backend(n_jobs=n_jobs))["params"]["catboost"]
     def objective(trial):
         params = {
             'iterations': trial.suggest_int('iterations', 200, 600, step=100),
             'depth': trial.suggest_int('depth', 3, 10),
-            'learning_rate': trial.suggest_loguniform('learning_rate', 1e-3, 0.3),
+            'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
             'l2_leaf_reg': trial.suggest_float('l2_leaf_reg', 1.0, 10.0),
-            'border_count': trial.suggest_int('border_count', 32, 255),
-            'task_type': 'GPU',
-            'devices': '0'
+            'border_count': trial.suggest_int('border_count', 32, 255)
         }
-        clf = CatBoostClassifier(**params, verbose=0, random_seed=42)
-        return cross_val_score(clf, X, y, cv=3, scoring='roc_auc', n_jobs=1).mean()
+        clf = CatBoostClassifier(**params, verbose=0, random_seed=42, **device_params)
+        return cv_score(trial, clf, X, y, early_stopping=True)
 
-    study = optuna.create_study(direction='maximize')
-    study.optimize(objective, n_trials=n_trials)
-    return CatBoostClassifier(**study.best_params, verbose=0, random_state=42, task_type='GPU', devices='0')
+    study = run_study(objective, n_trials, storage, study_name, label="cat")
+    # The final fit keeps the searched iteration count: CatBoost's best
+    # iteration on a fold's early-stopping split undershoots on the full data
+    return CatBoostClassifier(**study.best_params, verbose=0, random_state=42, **device_params)
 
 def evaluate_model(model, X_test, y_test, model_name):
     if hasattr(model, "predict_proba"):
@@ -106,35 +131,202 @@ def evaluate_model(model, X_test, y_test, model_name):
     print(f"{model_name}: Acc={acc:.4f}, AUC={auc:.4f}, Precision={prec:.4f}, Recall={rec:.4f}, F1={f1:.4f}")
     return {"accuracy": acc, "auc": auc, "precision": prec, "recall": rec, "f1": f1}
 
-def load_or_train(path, train_fn, X, y):
+def load_or_train(path, train_fn, X, y, backend=None):
     if os.path.exists(path):
         print(f"Loading {path}")
         return joblib.load(path)
     print(f"Training and saving {path}")
-    model = train_fn(X, y)
+    backend = backend or training_backend()
+    start = time.perf_counter()
+    model = train_fn(X, y, backend=backend)
     model.fit(X, y)
     joblib.dump(model, path)
+    record_backend(path, backend, time.perf_counter() - start)
     return model
 
-def train_and_save_models():
-    X_train, X_test, y_train, y_test, scaler, feature_columns = load_and_preprocess_data("data/cardio.csv")
+def remove_tomek_links(X, y):
+    # Same rule as imblearn's TomekLinks(sampling_strategy="all"): both samples
+    # of every pair of mutual nearest neighbours with different labels are
+    # dropped. A KD-tree replaces the brute-force search sklearn picks for 20
+    # columns, which scans every pair in working_memory-sized distance blocks.
+    # Exact duplicates are each other's neighbour rather than their own.
+    index = KDTree(X).query(X, k=2, return_distance=False)
+    rows = np.arange(len(y))
+    nearest = np.where(index[:, 0] == rows, index[:, 1], index[:, 0])
+    keep = np.flatnonzero((y[nearest] == y) | (nearest[nearest] != rows))
+    return X[keep], y[keep]
+
+def expand_interactions(X, interactions, dtype=np.float64, chunk_rows=4096):
+    # interactions.transform block by block, so the gathered columns and
+    # float64 products it creates only ever exist for one block. Trees split on
+    # float32, so a float32 expansion gives the selector forest exactly the
+    # values it would have cast a float64 matrix to.
+    out = np.empty((len(X), interactions.n_output_features_), dtype=dtype)
+    for start in range(0, len(X), chunk_rows):
+        out[start:start + chunk_rows] = interactions.transform(X[start:start + chunk_rows])
+    return out
+
+def prepare_training_data(data_path="data/cardio.csv", n_jobs=-1):
+    loader = stream_load_data if DATA_LOADER == "stream" else load_and_preprocess_data
+    X_train, X_test, y_train, y_test, scaler, feature_columns = loader(data_path)
     X_train_scaled = scaler.transform(X_train)
     X_test_scaled = scaler.transform(X_test)
-    smt = SMOTETomek(random_state=42)
-    X_train_balanced, y_train_balanced = smt.fit_resample(X_train_scaled, y_train)
-    poly = PolynomialFeatures(degree=2, interaction_only=True, include_bias=False)
-    X_train_poly = poly.fit_transform(X_train_balanced)
-    X_test_poly = poly.transform(X_test_scaled)
-    feature_selector_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    feature_selector_model.fit(X_train_poly, y_train_balanced)
+    y_train, y_test = np.asarray(y_train), np.asarray(y_test)
+    del X_train, X_test
+    smote = SMOTE(random_state=42, k_neighbors=NearestNeighbors(n_neighbors=6, algorithm="kd_tree"))
+    X_train_balanced, y_train_balanced = smote.fit_resample(X_train_scaled, y_train)
+    del X_train_scaled, y_train
+    X_train_balanced, y_train_balanced = remove_tomek_links(X_train_balanced, y_train_balanced)
+    # The importance forest is fitted on a stratified sample once the balanced
+    # set outgrows SELECTOR_SAMPLE_ROWS
+    sample = np.arange(len(y_train_balanced))
+    if len(sample) > SELECTOR_SAMPLE_ROWS:
+        sample, _ = train_test_split(sample, train_size=SELECTOR_SAMPLE_ROWS, stratify=y_train_balanced, random_state=42)
+        sample.sort()
+    n_features = len(feature_columns)
+    all_interactions = SelectedInteractions(n_features, np.ones(n_features * (n_features + 1) // 2, dtype=bool)).fit()
+    X_poly = expand_interactions(X_train_balanced[sample], all_interactions, dtype=np.float32)
+    feature_selector_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    feature_selector_model.fit(X_poly, y_train_balanced[sample])
+    del X_poly, sample
     selector = SelectFromModel(feature_selector_model, prefit=True, threshold="median")
-    X_train_selected = selector.transform(X_train_poly)
-    X_test_selected = selector.transform(X_test_poly)
+    inference_pipeline = build_inference_pipeline(scaler, selector, feature_columns)
+    interactions = inference_pipeline.named_steps["interactions"]
+    X_train_selected = expand_interactions(X_train_balanced, interactions)
+    del X_train_balanced
+    poly = PolynomialFeatures(degree=2, interaction_only=True, include_bias=False).fit(X_test_scaled[:1])
+    return {
+        "X_train": X_train_selected,
+        "y_train": y_train_balanced,
+        "X_test": expand_interactions(X_test_scaled, interactions),
+        "y_test": y_test,
+        "scaler": scaler,
+        "selector": selector,
+        "feature_columns": feature_columns,
+        "inference_pipeline": inference_pipeline,
+        "selected_features": [poly.get_feature_names_out(feature_columns)[i] for i in selector.get_support(indices=True)]
+    }
+
+def save_preprocessing_artifacts(prep):
+    joblib.dump(prep["scaler"], "models/scaler.pkl")
+    joblib.dump(prep["selector"], "models/feature_selector.pkl")
+    joblib.dump(prep["feature_columns"], "models/original_features.pkl")
+    joblib.dump(prep["inference_pipeline"], "models/inference_pipeline.pkl")
+    joblib.dump(prep["selected_features"], "models/selected_features.pkl")
+
+def save_manifest(prep, all_metrics, models, data_hash):
+    # models maps the short training names to fitted estimators so the
+    # manifest does not have to unpickle what is already in memory
+    names = {metric_key: name for name, metric_key in METRIC_KEYS.items()}
+    write_manifest("models", prep["feature_columns"], prep["scaler"], prep["selector"].get_support(),
+                   all_metrics, data_hash, {names[k]: m for k, m in models.items()})
+
+def save_drift_reference(prep, models, data_path="data/cardio.csv"):
+    # Reference profile for the ML API drift monitor: the engineered training
+    # inputs before scaling and every model's predicted risk on the test split
+    loader = stream_load_data if DATA_LOADER == "stream" else load_and_preprocess_data
+    names = {metric_key: name for name, metric_key in METRIC_KEYS.items()}
+    risk = served_risk({names[key]: model for key, model in models.items()}, np.asarray(prep["X_test"]))
+    write_drift_json(build_reference(loader(data_path)[0], risk, file_hash(data_path)), REFERENCE_PATH)
+    print(f"Drift reference written to {REFERENCE_PATH}")
+
+def boundary_samples(teacher, X_base, interactions, n_rows, noise=DISTILL_NOISE, seed=42):
+    # Synthetic rows near the teacher's decision boundary: the quarter of the
+    # training rows it is least sure about, jittered in the scaled feature
+    # space and expanded like real inputs.
+    rng = np.random.default_rng(seed)
+    p = teacher.predict_proba(interactions.transform(X_base))[:, 1]
+    uncertain = np.argsort(np.abs(p - 0.5))[:max(1, len(p) // 4)]
+    rows = X_base[rng.choice(uncertain, n_rows)]
+    return interactions.transform(rows + rng.normal(0.0, noise, rows.shape))
+
+def fit_student(X, soft_labels, n_jobs=-1):
+    # Cross-entropy against the soft labels with a plain binary classifier:
+    # every row is seen once as positive with weight p and once as negative
+    # with weight 1 - p. The student stays an LGBMClassifier, so the server
+    # flattens it like any other LightGBM model.
+    student = LGBMClassifier(n_estimators=DISTILL_TREES, num_leaves=DISTILL_LEAVES, learning_rate=0.05,
+                             min_child_samples=20, random_state=42, n_jobs=cpu_threads(n_jobs), verbose=-1)
+    student.fit(np.vstack([X, X]), np.repeat([1, 0], len(X)), sample_weight=np.concatenate([soft_labels, 1.0 - soft_labels]))
+    return student
+
+def single_row_latency(model, X, rows=100):
+    timings = []
+    for row in X[:rows]:
+        start = time.perf_counter()
+        model.predict_proba(row.reshape(1, -1))
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def distill_ensembles(prep, teachers, data_path="data/cardio.csv", n_jobs=-1):
+    # teachers maps metric keys ("ensemble", "stacking") to fitted ensembles.
+    # Returns the metrics and models of the published students under
+    # "<key>_distilled"; a report per student goes to models/distillation/.
+    loader = stream_load_data if DATA_LOADER == "stream" else load_and_preprocess_data
+    X_base = prep["scaler"].transform(loader(data_path)[0])
+    interactions = prep["inference_pipeline"].named_steps["interactions"]
+    X_train, X_test, y_test = np.asarray(prep["X_train"]), np.asarray(prep["X_test"]), np.asarray(prep["y_test"])
+    names = {metric_key: name for name, metric_key in METRIC_KEYS.items()}
+    os.makedirs("models/distillation", exist_ok=True)
+    student_metrics, students = {}, {}
+    for key, teacher in teachers.items():
+        name = names[f"{key}_distilled"]
+        path = f"models/{name}.pkl"
+        start = time.perf_counter()
+        X = np.vstack([X_train, boundary_samples(teacher, X_base, interactions, DISTILL_SYNTHETIC_ROWS)])
+        student = fit_student(X, teacher.predict_proba(X)[:, 1], n_jobs)
+        del X
+        fit_seconds = time.perf_counter() - start
+        teacher_metrics = evaluate_model(teacher, X_test, y_test, f"{names[key]} (teacher)")
+        metrics = evaluate_model(student, X_test, y_test, f"{name} (student)")
+        gap = np.abs(teacher.predict_proba(X_test)[:, 1] - student.predict_proba(X_test)[:, 1])
+        served = compile_tree_model(student) or student
+        report = {
+            "teacher": names[key],
+            "training_rows": len(X_train),
+            "synthetic_rows": DISTILL_SYNTHETIC_ROWS,
+            "fit_seconds": fit_seconds,
+            "teacher_metrics": teacher_metrics,
+            "student_metrics": metrics,
+            "mean_probability_gap": float(gap.mean()),
+            "max_probability_gap": float(gap.max()),
+            "latency_ms": {"teacher": single_row_latency(teacher, X_test), "student": single_row_latency(served, X_test)},
+            "gate": {"max_auc_drop": DISTILL_MAX_AUC_DROP, "max_recall_drop": DISTILL_MAX_RECALL_DROP},
+        }
+        failures = []
+        if metrics["auc"] < teacher_metrics["auc"] - DISTILL_MAX_AUC_DROP:
+            failures.append(f"AUC {metrics['auc']:.4f} < {teacher_metrics['auc']:.4f} - {DISTILL_MAX_AUC_DROP}")
+        if metrics["recall"] < teacher_metrics["recall"] - DISTILL_MAX_RECALL_DROP:
+            failures.append(f"recall {metrics['recall']:.4f} < {teacher_metrics['recall']:.4f} - {DISTILL_MAX_RECALL_DROP}")
+        report["published"] = not failures
+        report["rejected"] = failures
+        with open(f"models/distillation/{name}.json", "w") as f:
+            json.dump(report, f, indent=2)
+        latency = report["latency_ms"]
+        print(f"{name}: single-row {latency['teacher']:.2f}ms -> {latency['student']:.2f}ms, "
+              f"probability gap mean {report['mean_probability_gap']:.4f} / max {report['max_probability_gap']:.4f}")
+        if failures:
+            # A student of an earlier teacher must not stay on disk next to the new one
+            if os.path.exists(path):
+                os.remove(path)
+            print(f"{name} not published: {'; '.join(failures)}")
+            continue
+        atomic_dump(student, path)
+        student_metrics[f"{key}_distilled"] = metrics
+        students[f"{key}_distilled"] = student
+    return student_metrics, students
+
+def train_and_save_models(data_path="data/cardio.csv"):
+    prep = prepare_training_data(data_path)
+    X_train_selected, y_train_balanced = prep["X_train"], prep["y_train"]
+    X_test_selected, y_test = prep["X_test"], prep["y_test"]
     os.makedirs("models", exist_ok=True)
-    rf = load_or_train("models/random_forest.pkl", tune_rf, X_train_selected, y_train_balanced)
-    xgb = load_or_train("models/xgboost.pkl", tune_xgb, X_train_selected, y_train_balanced)
-    lgb = load_or_train("models/lightgbm.pkl", tune_lgbm, X_train_selected, y_train_balanced)
-    cat = load_or_train("models/catboost.pkl", tune_catboost, X_train_selected, y_train_balanced)
+    backend = training_backend()
+    print(f"Training on {backend['device'].upper()} with {backend['threads']} threads")
+    rf = load_or_train("models/random_forest.pkl", tune_rf, X_train_selected, y_train_balanced, backend)
+    xgb = load_or_train("models/xgboost.pkl", tune_xgb, X_train_selected, y_train_balanced, backend)
+    lgb = load_or_train("models/lightgbm.pkl", tune_lgbm, X_train_selected, y_train_balanced, backend)
+    cat = load_or_train("models/catboost.pkl", tune_catboost, X_train_selected, y_train_balanced, backend)
     if os.path.exists("models/logistic_regression.pkl"):
         print("Loading models/logistic_regression.pkl")
         lr = joblib.load("models/logistic_regression.pkl")
@@ -168,12 +360,12 @@ def train_and_save_models():
         stack_clf.fit(X_train_selected, y_train_balanced)
         joblib.dump(stack_clf, "models/stacking_model.pkl")
     stacking_metrics = evaluate_model(stack_clf, X_test_selected, y_test, "Stacking Ensemble")
-    joblib.dump(scaler, "models/scaler.pkl")
-    joblib.dump(selector, "models/feature_selector.pkl")
-    joblib.dump(feature_columns, "models/original_features.pkl")
-    joblib.dump([poly.get_feature_names_out(feature_columns)[i] for i in selector.get_support(indices=True)], "models/selected_features.pkl")
-    all_metrics = {**model_metrics, "ensemble": ensemble_metrics, "stacking": stacking_metrics}
+    student_metrics, students = distill_ensembles(prep, {"ensemble": voting, "stacking": stack_clf}, data_path)
+    save_preprocessing_artifacts(prep)
+    all_metrics = {**model_metrics, "ensemble": ensemble_metrics, "stacking": stacking_metrics, **student_metrics}
     joblib.dump(all_metrics, "models/model_metrics.pkl")
+    save_manifest(prep, all_metrics, {**models, "ensemble": voting, "stacking": stack_clf, **students}, file_hash(data_path))
+    save_drift_reference(prep, {**models, "ensemble": voting, "stacking": stack_clf, **students}, data_path)
     return all_metrics
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from .data_processor import body_mass_index, engineer_features, iqr_bounds, FEATURE_COLUMNS, OUTLIER_COLUMNS
+
+CHUNK_ROWS = int(os.environ.get("CHD_LOADER_CHUNK_ROWS", "200000"))
+# Rows kept for the outlier quantiles. Inputs up to this size give exact
+# quantiles; larger inputs use a uniform sample of this size.
+QUANTILE_SAMPLE_ROWS = int(os.environ.get("CHD_LOADER_SAMPLE_ROWS", "1000000"))
+CACHE_DIR = os.environ.get("CHD_DATA_CACHE", "data/.cache")
+
+# Categorical codes fit in int8; age is in days and stays integral.
+# Measurements keep float64, as read_csv gives them: weight has decimals that
+# float32 would round.
+COLUMN_DTYPES = {
+    "age": np.int32,
+    "gender": np.int8,
+    "height": np.float64,
+    "weight": np.float64,
+    "ap_hi": np.float64,
+    "ap_lo": np.float64,
+    "cholesterol": np.int8,
+    "gluc": np.int8,
+    "smoke": np.int8,
+    "alco": np.int8,
+    "active": np.int8,
+    "cardio": np.int8,
+}
+
+
+def source_key(filepath):
+    stat = os.stat(filepath)
+    payload = f"{os.path.abspath(filepath)}:{stat.st_size}:{stat.st_mtime_ns}:{sorted(COLUMN_DTYPES.items())}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def derived_outlier_columns(columns):
+    # bmi and pulse_pressure are filtered on too, so they are derived per
+    # chunk exactly as engineer_features does.
+    height, ap_hi, ap_lo = columns["height"], columns["ap_hi"], columns["ap_lo"]
+    return {
+        "age": columns["age"],
+        "height": height,
+        "weight": columns["weight"],
+        "ap_hi": ap_hi,
+        "ap_lo": ap_lo,
+        "bmi": body_mass_index(columns["weight"], height),
+        "pulse_pressure": ap_hi - ap_lo,
+    }
+
+
+class BottomKSample:
+    # Uniform row sample of fixed size: every row gets a random key and the k
+    # smallest keys are kept, so memory stays constant however many chunks
+    # are streamed through.
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.rows = None
+
+    def add(self, frame):
+        keys = np.concatenate([self.keys, self.rng.random(len(frame))])
+        rows = frame if self.rows is None else pd.concat([self.rows, frame], ignore_index=True)
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k)[:self.k]
+            keep.sort()
+            keys, rows = keys[keep], rows.iloc[keep].reset_index(drop=True)
+        self.keys, self.rows = keys, rows
+
+
+def build_column_cache(filepath, cache_path, chunk_rows=CHUNK_ROWS, sample_rows=QUANTILE_SAMPLE_ROWS):
+    # One pass over the CSV: each column is appended to its own raw binary
+    # file and a fixed-size sample of the outlier columns is kept for the
+    # quantiles. Nothing proportional to the file size is held in memory.
+    tmp_path = f"{cache_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    header = pd.read_csv(filepath, sep=";", nrows=0).columns
+    columns = [c for c in COLUMN_DTYPES if c in header]
+    files = {c: open(os.path.join(tmp_path, f"{c}.bin"), "wb") for c in columns}
+    sample = BottomKSample(sample_rows)
+    n_rows = 0
+    try:
+        for chunk in pd.read_csv(filepath, sep=";", usecols=columns, dtype={c: COLUMN_DTYPES[c] for c in columns},
+                                 chunksize=chunk_rows):
+            for col in columns:
+                files[col].write(np.ascontiguousarray(chunk[col].to_numpy()).tobytes())
+            sample.add(pd.DataFrame(derived_outlier_columns({c: chunk[c].to_numpy() for c in columns})))
+            n_rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+    sample.rows.to_pickle(os.path.join(tmp_path, "sample.pkl"))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"source": os.path.abspath(filepath), "rows": n_rows,
+                   "columns": {c: np.dtype(COLUMN_DTYPES[c]).name for c in columns}}, f, indent=2)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+
+
+def open_column_cache(cache_path):
+    with open(os.path.join(cache_path, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {
+        c: np.memmap(os.path.join(cache_path, f"{c}.bin"), dtype=dtype, mode="r", shape=(meta["rows"],))
+        for c, dtype in meta["columns"].items()
+    }
+    return columns, pd.read_pickle(os.path.join(cache_path, "sample.pkl"))
+
+
+def stream_load_data(filepath, test_size=0.2, random_state=42, cache_dir=CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    # Drop-in replacement for load_and_preprocess_data. The CSV is parsed once
+    # into a memory-mapped columnar cache; later runs read the cache directly.
+    cache_path = os.path.join(cache_dir, source_key(filepath))
+    if not os.path.exists(os.path.join(cache_path, "meta.json")):
+        os.makedirs(cache_dir, exist_ok=True)
+        build_column_cache(filepath, cache_path, chunk_rows)
+    columns, sample = open_column_cache(cache_path)
+    # remove_outliers' sequential IQR rule, evaluated on the sample
+    bounds, _ = iqr_bounds(sample, OUTLIER_COLUMNS)
+
+    keep = []
+    n_rows = len(columns["age"])
+    for offset in range(0, n_rows, chunk_rows):
+        derived = derived_outlier_columns({c: v[offset:offset + chunk_rows] for c, v in columns.items()})
+        mask = np.ones(len(derived["age"]), dtype=bool)
+        for col, (lower, upper) in bounds.items():
+            mask &= (derived[col] >= lower) & (derived[col] <= upper)
+        keep.append(np.flatnonzero(mask) + offset)
+    keep = np.concatenate(keep)
+
+    # Only surviving rows are materialized
+    df = pd.DataFrame({c: np.asarray(v[keep]) for c, v in columns.items()}, index=keep)
+    df = engineer_features(df.rename(columns={"cardio": "target"}))
+    available_features = [col for col in FEATURE_COLUMNS if col in df.columns]
+    X = df[available_features]
+    y = df["target"]
+    del df
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y
+    )
+    scaler = StandardScaler()
+    scaler.fit(X_train)
+    return X_train, X_test, y_train, y_test, scaler, available_features
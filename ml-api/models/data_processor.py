@@ -1,52 +1,126 @@
+from bisect import bisect_left, bisect_right
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
+from sklearn.base import BaseEstimator, TransformerMixin
+
+OUTLIER_COLUMNS = ['age', 'height', 'weight', 'ap_hi', 'ap_lo', 'bmi', 'pulse_pressure']
+FEATURE_COLUMNS = [
+    'age_years', 'gender', 'height', 'weight', 'bmi',
+    'ap_hi', 'ap_lo', 'pulse_pressure', 'bp_category',
+    'cholesterol', 'gluc', 'smoke', 'alco', 'active',
+    'age_group', 'lifestyle_risk', 'metabolic_risk','bmi_category', 'map', 'risk_score'
+]
+
+# Thresholds of the categorical features, shared by derive_features (arrays)
+# and derive_record (one request record). age_group k covers
+# (edge[k-1], edge[k]]; bmi_category k covers [edge[k-1], edge[k]).
+AGE_GROUP_EDGES = [0, 40, 50, 60, 70, 100]
+BMI_CATEGORY_EDGES = [18.5, 25, 30]
+# (bp_category, ap_hi range, ap_lo range), inclusive; the first band either
+# pressure falls in wins, so 120-139 / 80-89 wins over >=140 / >=90
+BP_CATEGORY_BANDS = [(1, (120, 139), (80, 89)), (2, (140, np.inf), (90, np.inf))]
+
+def iqr_bounds(df, columns):
+    # Bounds of each column are the 1.5 * IQR fences over the rows that
+    # survived the previous columns, as in the original per-column filtering,
+    # but taken from one stacked array with a running mask instead of a new
+    # DataFrame per column. Returns the bounds and the combined row mask.
+    columns = [col for col in columns if col in df.columns]
+    data = np.column_stack([np.asarray(df[col], dtype=np.float64) for col in columns]) if columns else np.empty((len(df), 0))
+    mask = np.ones(len(data), dtype=bool)
+    bounds = {}
+    for j, col in enumerate(columns):
+        kept = data[mask, j]
+        kept = kept[~np.isnan(kept)]
+        q1, q3 = np.quantile(kept, [0.25, 0.75]) if len(kept) else (np.nan, np.nan)
+        iqr = q3 - q1
+        bounds[col] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+        mask &= (data[:, j] >= bounds[col][0]) & (data[:, j] <= bounds[col][1])
+    return bounds, mask
 
 def remove_outliers(df, columns):
-    df_clean = df.copy()
-    for col in columns:
-        if col in df_clean.columns:
-            Q1 = df_clean[col].quantile(0.25)
-            Q3 = df_clean[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            df_clean = df_clean[(df_clean[col] >= lower_bound) & (df_clean[col] <= upper_bound)]
-    return df_clean
+    return df[iqr_bounds(df, columns)[1]]
 
-def engineer_features(df):
-    df['bmi'] = df['weight'] / ((df['height'] / 100) ** 2)
-    df['pulse_pressure'] = df['ap_hi'] - df['ap_lo']
-    df['age_years'] = df['age'] / 365.25  
-    df['age_group'] = pd.cut(
-        df['age_years'],
-        bins=[0, 40, 50, 60, 70, 100],
-        labels=[1, 2, 3, 4, 5]
-    ).astype(int)
-    df['lifestyle_risk'] = df['smoke'] + df['alco'] + (1 - df['active'])
-    df['metabolic_risk'] = (df['cholesterol'] - 1) + (df['gluc'] - 1)
-    df['bp_category'] = 0
-    df.loc[(df['ap_hi'] >= 140) | (df['ap_lo'] >= 90), 'bp_category'] = 2
-    df.loc[(df['ap_hi'].between(120, 139)) | (df['ap_lo'].between(80, 89)), 'bp_category'] = 1
-    def bmi_category(bmi):
-        if bmi < 18.5:
-            return 0
-        elif bmi < 25:
-            return 1
-        elif bmi < 30:
-            return 2
-        else:
-            return 3
-    df['bmi_category'] = df['bmi'].apply(bmi_category)
-    df['map'] = (df['ap_hi'] + 2 * df['ap_lo']) / 3
-    df['risk_score'] = (
-        df['smoke'] + df['alco'] +
-        (df['cholesterol'] > 1).astype(int) +
-        (df['gluc'] > 1).astype(int)
+def body_mass_index(weight, height):
+    return weight / ((height / 100) ** 2)
+
+def _arithmetic_features(v):
+    # Formulas of the non-categorical engineered features; `v` maps raw
+    # fields to arrays or to plain numbers
+    return {
+        'bmi': body_mass_index(v['weight'], v['height']),
+        'pulse_pressure': v['ap_hi'] - v['ap_lo'],
+        'lifestyle_risk': v['smoke'] + v['alco'] + (1 - v['active']),
+        'metabolic_risk': (v['cholesterol'] - 1) + (v['gluc'] - 1),
+        'map': (v['ap_hi'] + 2 * v['ap_lo']) / 3,
+        'risk_score': v['smoke'] + v['alco'] + (v['cholesterol'] > 1) * 1 + (v['gluc'] > 1) * 1,
+    }
+
+def derive_features(df):
+    # Engineered columns as NumPy arrays, in the order engineer_features adds
+    # them. Works the same for one row, a request batch or the training frame.
+    v = {name: df[name].to_numpy() for name in ('weight', 'height', 'ap_hi', 'ap_lo', 'smoke', 'alco', 'active',
+                                                'cholesterol', 'gluc')}
+    arithmetic = _arithmetic_features(v)
+    features = {'bmi': arithmetic['bmi'], 'pulse_pressure': arithmetic['pulse_pressure']}
+    age_years = df['age'].to_numpy() / 365.25 if 'age' in df.columns else df['age_years'].to_numpy()
+    if 'age' in df.columns:
+        features['age_years'] = age_years
+    age_group = np.digitize(age_years, AGE_GROUP_EDGES, right=True)
+    if ((age_group < 1) | (age_group > 5)).any():
+        raise ValueError("age_years must be in (0, 100]")
+    features['age_group'] = age_group.astype(int)
+    features['lifestyle_risk'] = arithmetic['lifestyle_risk']
+    features['metabolic_risk'] = arithmetic['metabolic_risk']
+    features['bp_category'] = np.select(
+        [((v['ap_hi'] >= hi[0]) & (v['ap_hi'] <= hi[1])) | ((v['ap_lo'] >= lo[0]) & (v['ap_lo'] <= lo[1]))
+         for _, hi, lo in BP_CATEGORY_BANDS],
+        [category for category, _, _ in BP_CATEGORY_BANDS],
+        default=0
     )
+    features['bmi_category'] = np.digitize(features['bmi'], BMI_CATEGORY_EDGES)
+    features['map'] = arithmetic['map']
+    features['risk_score'] = arithmetic['risk_score']
+    return features
+
+def derive_record(values):
+    # derive_features for one validated record: `values` maps the raw fields
+    # and age_years to numbers. Same formulas and thresholds, without the
+    # per-call NumPy overhead.
+    features = _arithmetic_features(values)
+    features['age_group'] = bisect_left(AGE_GROUP_EDGES, values['age_years'])
+    features['bp_category'] = next((category for category, hi, lo in BP_CATEGORY_BANDS
+                                    if hi[0] <= values['ap_hi'] <= hi[1] or lo[0] <= values['ap_lo'] <= lo[1]), 0)
+    features['bmi_category'] = bisect_right(BMI_CATEGORY_EDGES, features['bmi'])
+    return features
+
+def engineer_features(df):
+    for name, values in derive_features(df).items():
+        df[name] = values
     return df
 
+class FeatureEngineer(BaseEstimator, TransformerMixin):
+    # Stateless transformer around derive_features. Accepts a DataFrame, a
+    # list of records or a single record dict, leaves the input untouched and
+    # returns `columns` (every column when None).
+    def __init__(self, columns=None):
+        self.columns = columns
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        if isinstance(X, dict):
+            X = pd.DataFrame([X])
+        elif not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame.from_records(X)
+        data = {name: X[name] for name in X.columns}
+        data.update(derive_features(X))
+        names = self.columns if self.columns is not None else list(data)
+        return pd.DataFrame({name: data[name] for name in names}, index=X.index)
+
 def load_and_preprocess_data(filepath, test_size=0.2, random_state=42):
     df = pd.read_csv(filepath, sep=";")
     if 'id' in df.columns:
@@ -54,15 +128,8 @@ def load_and_preprocess_data(filepath, test_size=0.2, random_state=42):
     if "cardio" in df.columns:
         df.rename(columns={"cardio": "target"}, inplace=True)
     df = engineer_features(df)
-    outlier_cols = ['age', 'height', 'weight', 'ap_hi', 'ap_lo', 'bmi', 'pulse_pressure']
-    df = remove_outliers(df, outlier_cols)
-    feature_columns = [
-        'age_years', 'gender', 'height', 'weight', 'bmi',
-        'ap_hi', 'ap_lo', 'pulse_pressure', 'bp_category',
-        'cholesterol', 'gluc', 'smoke', 'alco', 'active',
-        'age_group', 'lifestyle_risk', 'metabolic_risk','bmi_category', 'map', 'risk_score'
-    ]
-    available_features = [col for col in feature_columns if col in df.columns]
+    df = remove_outliers(df, OUTLIER_COLUMNS)
+    available_features = [col for col in FEATURE_COLUMNS if col in df.columns]
 
     X = df[available_features]
     y = df["target"]
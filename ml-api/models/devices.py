@@ -0,0 +1,91 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+
+# auto picks the GPU only when one is visible and the libraries can use it;
+# cpu / gpu force the choice.
+TRAIN_DEVICE = os.environ.get("CHD_TRAIN_DEVICE", "auto").lower()
+
+# Histogram resolution for LightGBM and XGBoost on CPU. 255 is the library
+# default; fewer bins trade a little accuracy for faster split finding.
+CPU_MAX_BIN = int(os.environ.get("CHD_TRAIN_MAX_BIN", "255"))
+
+
+def cpu_threads(n_jobs=-1):
+    # Physical cores are not exposed portably; the affinity mask respects
+    # taskset/cgroup limits where os.cpu_count() does not.
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    return available if n_jobs is None or n_jobs < 1 else min(n_jobs, available)
+
+
+def gpu_available():
+    if os.environ.get("CUDA_VISIBLE_DEVICES", None) in ("", "-1"):
+        return False
+    if shutil.which("nvidia-smi") is None:
+        return False
+    try:
+        result = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and "GPU" in result.stdout
+
+
+def resolve_device(device=None):
+    device = (device or TRAIN_DEVICE).lower()
+    if device not in ("auto", "cpu", "gpu"):
+        raise ValueError(f"Unknown training device '{device}', expected auto, cpu or gpu")
+    if device == "auto":
+        return "gpu" if gpu_available() else "cpu"
+    return device
+
+
+def training_backend(device=None, n_jobs=-1):
+    # Estimator keyword arguments for every boosting library, plus a record of
+    # the choice that is stored next to the trained model.
+    device = resolve_device(device)
+    threads = cpu_threads(n_jobs)
+    if device == "gpu":
+        params = {
+            "xgb": {"tree_method": "hist", "device": "cuda", "n_jobs": threads},
+            "lgbm": {"device_type": "gpu", "n_jobs": threads},
+            "catboost": {"task_type": "GPU", "devices": "0", "thread_count": threads},
+        }
+    else:
+        params = {
+            "xgb": {"tree_method": "hist", "device": "cpu", "max_bin": CPU_MAX_BIN, "n_jobs": threads},
+            "lgbm": {"device_type": "cpu", "max_bin": CPU_MAX_BIN, "force_col_wise": True, "n_jobs": threads},
+            "catboost": {"task_type": "CPU", "thread_count": threads},
+        }
+    return {"device": device, "threads": threads, "params": params}
+
+
+def describe_backend(backend):
+    import catboost
+    import lightgbm
+    import xgboost
+    return {
+        "device": backend["device"],
+        "threads": backend["threads"],
+        "params": backend["params"],
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "versions": {
+            "xgboost": xgboost.__version__,
+            "lightgbm": lightgbm.__version__,
+            "catboost": catboost.__version__,
+        },
+    }
+
+
+def record_backend(model_path, backend, seconds=None):
+    record = describe_backend(backend)
+    if seconds is not None:
+        record["train_seconds"] = round(seconds, 1)
+    with open(os.path.splitext(model_path)[0] + ".backend.json", "w") as f:
+        json.dump(record, f, indent=2)
+    return record
@@ -0,0 +1,328 @@
+import argparse
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PATH = "models/drift_reference.json"
+SNAPSHOT_DIR = os.environ.get("ML_API_DRIFT_DIR", "models/drift")
+# Each sketch counts the current window and the one before it, so scores
+# cover the last WINDOW to 2 * WINDOW observations
+WINDOW = int(os.environ.get("ML_API_DRIFT_WINDOW", 5000))
+SNAPSHOT_SECONDS = float(os.environ.get("ML_API_DRIFT_SNAPSHOT_SECONDS", 60))
+MIN_COUNT = int(os.environ.get("ML_API_DRIFT_MIN_COUNT", 200))
+
+CONTINUOUS_FIELDS = ("age_years", "height", "weight", "bmi", "ap_hi", "ap_lo", "pulse_pressure", "map")
+CATEGORICAL_FIELDS = ("gender", "cholesterol", "gluc", "smoke", "alco", "active", "bp_category", "bmi_category")
+# Reference percentiles used as bin edges; PSI merges them into PSI_BINS
+# groups of roughly equal reference mass
+EDGE_QUANTILES = np.arange(1, 100) / 100
+PSI_BINS = 10
+PSI_WARNING = 0.1
+PSI_DRIFT = 0.25
+REPORT_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def continuous_reference(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    edges = np.unique(np.quantile(values, EDGE_QUANTILES))
+    counts = np.bincount(np.searchsorted(edges, values, side="left"), minlength=len(edges) + 1)
+    return {
+        "edges": edges.tolist(),
+        "proportions": (counts / len(values)).tolist(),
+        "quantiles": {f"p{round(q * 100):02d}": float(np.quantile(values, q)) for q in REPORT_QUANTILES},
+        "rows": int(len(values)),
+    }
+
+
+def categorical_reference(values):
+    codes, counts = np.unique(np.asarray(values, dtype=np.float64), return_counts=True)
+    # The last bucket collects codes never seen in training
+    return {"codes": codes.tolist(), "proportions": (counts / counts.sum()).tolist() + [0.0], "rows": int(counts.sum())}
+
+
+def build_reference(X_train, risk, data_hash=None):
+    # X_train: engineered training features (a DataFrame as returned by
+    # load_and_preprocess_data); risk: {served model name: P(high risk) on
+    # the test split}
+    return {
+        "created": time.time(),
+        "data_hash": data_hash,
+        "inputs": {
+            **{field: {"type": "continuous", **continuous_reference(X_train[field])}
+               for field in CONTINUOUS_FIELDS if field in X_train.columns},
+            **{field: {"type": "categorical", **categorical_reference(X_train[field])}
+               for field in CATEGORICAL_FIELDS if field in X_train.columns},
+        },
+        "risk": {name: continuous_reference(p1) for name, p1 in risk.items()},
+    }
+
+
+def write_json(obj, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def read_reference(path=REFERENCE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def psi(reference, live, groups):
+    reference = np.bincount(groups, weights=reference, minlength=groups.max() + 1)
+    live = np.bincount(groups, weights=live, minlength=groups.max() + 1)
+    reference, live = np.clip(reference, 1e-4, None), np.clip(live, 1e-4, None)
+    return float(np.sum((live - reference) * np.log(live / reference)))
+
+
+def status(psi_value, count):
+    if count < MIN_COUNT:
+        return "insufficient_data"
+    return "drift" if psi_value >= PSI_DRIFT else "warning" if psi_value >= PSI_WARNING else "ok"
+
+
+class Sketch:
+    # Fixed-size counts over the reference bins. add() is a bisect over at
+    # most 99 edges (or a dict lookup for category codes) and one increment;
+    # the window rotates every WINDOW observations.
+    def __init__(self, reference, window=WINDOW):
+        self.categorical = reference.get("type") == "categorical"
+        self.reference = np.asarray(reference["proportions"], dtype=np.float64)
+        self.reference_rows = reference["rows"]
+        self.window = window
+        if self.categorical:
+            self.codes = {code: i for i, code in enumerate(reference["codes"])}
+            self.groups = np.arange(len(self.reference))
+        else:
+            self.edges = list(reference["edges"])
+            self.reference_quantiles = reference["quantiles"]
+            # PSI group of each bin by the reference CDF at its midpoint
+            midpoint = np.cumsum(self.reference) - self.reference / 2
+            self.groups = np.minimum((midpoint * PSI_BINS).astype(np.intp), PSI_BINS - 1)
+        self.current = [0] * len(self.reference)
+        self.previous = [0] * len(self.reference)
+        self.current_total = 0
+
+    def bin(self, value):
+        if self.categorical:
+            return self.codes.get(value, len(self.reference) - 1)
+        return bisect.bisect_left(self.edges, value)
+
+    def add(self, value):
+        if value != value:
+            return
+        self.current[self.bin(value)] += 1
+        self.current_total += 1
+        if self.current_total >= self.window:
+            self.previous, self.current, self.current_total = self.current, [0] * len(self.reference), 0
+
+    def add_many(self, values):
+        # Batches are counted in one step and may overshoot the window by
+        # one batch
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if self.categorical:
+            bins = np.array([self.bin(value) for value in values.tolist()], dtype=np.intp)
+        else:
+            bins = np.searchsorted(self.edges, values, side="left")
+        counts = np.bincount(bins, minlength=len(self.reference))
+        self.current = [a + int(b) for a, b in zip(self.current, counts)]
+        self.current_total += len(values)
+        if self.current_total >= self.window:
+            self.previous, self.current, self.current_total = self.current, [0] * len(self.reference), 0
+
+    def counts(self):
+        return [a + b for a, b in zip(self.previous, self.current)]
+
+    def scores(self, counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        n = int(counts.sum())
+        result = {"count": n}
+        if n == 0:
+            return {**result, "status": status(0.0, 0)}
+        live = counts / n
+        result["psi"] = psi(self.reference, live, self.groups)
+        if not self.categorical:
+            # KS at the bin edges: a lower bound of the exact statistic
+            result["ks"] = float(np.max(np.abs(np.cumsum(live) - np.cumsum(self.reference))))
+            result["ks_critical"] = 1.36 * math.sqrt((n + self.reference_rows) / (n * self.reference_rows))
+            result["quantiles"] = {f"p{round(q * 100):02d}": self.quantile(live, q) for q in REPORT_QUANTILES}
+            result["reference_quantiles"] = self.reference_quantiles
+        result["status"] = status(result["psi"], n)
+        return result
+
+    def quantile(self, live, q):
+        # Linear interpolation inside the bin that holds q; the open outer
+        # bins report their inner edge
+        cumulative = np.cumsum(live)
+        index = int(np.searchsorted(cumulative, q, side="left"))
+        if index == 0 or index >= len(self.edges):
+            return float(self.edges[min(index, len(self.edges) - 1)])
+        low, high = self.edges[index - 1], self.edges[index]
+        below = cumulative[index - 1]
+        share = (q - below) / max(live[index], 1e-12)
+        return float(low + (high - low) * min(max(share, 0.0), 1.0))
+
+
+class DriftMonitor:
+    # Streams prediction inputs and predicted risk into fixed-size sketches
+    # and compares them with the reference profile written at training time.
+    # Each worker snapshots its counts to SNAPSHOT_DIR; report() adds the
+    # recent snapshots of the other workers.
+    def __init__(self, reference, feature_columns, window=WINDOW, snapshot_dir=SNAPSHOT_DIR,
+                 snapshot_seconds=SNAPSHOT_SECONDS):
+        self.reference = reference
+        self.window = window
+        slots = {name: i for i, name in enumerate(feature_columns)}
+        self.inputs = {field: Sketch(spec, window) for field, spec in reference["inputs"].items() if field in slots}
+        self.slots = [(slots[field], sketch) for field, sketch in self.inputs.items()]
+        self.risk = {name: Sketch(spec, window) for name, spec in reference["risk"].items()}
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_seconds = snapshot_seconds
+        self._last_snapshot = time.monotonic()
+        self._snapshotting = False
+        self._lock = threading.Lock()
+
+    def observe(self, row, risks):
+        # One record: `row` in feature_columns order, `risks` maps model name
+        # to P(high risk)
+        with self._lock:
+            for slot, sketch in self.slots:
+                sketch.add(float(row[slot]))
+            for name, p1 in risks.items():
+                if name in self.risk:
+                    self.risk[name].add(float(p1))
+        self.maybe_snapshot()
+
+    def observe_many(self, X, risks):
+        X = np.asarray(X, dtype=np.float64)
+        with self._lock:
+            for slot, sketch in self.slots:
+                sketch.add_many(X[:, slot])
+            for name, p1 in risks.items():
+                if name in self.risk:
+                    self.risk[name].add_many(p1)
+        self.maybe_snapshot()
+
+    def counts(self):
+        with self._lock:
+            return {
+                "inputs": {field: sketch.counts() for field, sketch in self.inputs.items()},
+                "risk": {name: sketch.counts() for name, sketch in self.risk.items()},
+            }
+
+    def maybe_snapshot(self):
+        # At most one writer, at most every snapshot_seconds; the write is a
+        # few KB regardless of traffic
+        if self.snapshot_seconds <= 0 or time.monotonic() - self._last_snapshot < self.snapshot_seconds:
+            return
+        with self._lock:
+            if self._snapshotting:
+                return
+            self._snapshotting = True
+        try:
+            self.snapshot()
+        except OSError as e:
+            logger.warning("Drift snapshot failed: %s", e)
+        finally:
+            self._last_snapshot = time.monotonic()
+            self._snapshotting = False
+
+    @property
+    def snapshot_path(self):
+        # Resolved per call: a monitor created in the gunicorn master is
+        # inherited by every worker
+        return os.path.join(self.snapshot_dir, f"drift-{os.getpid()}.json")
+
+    def snapshot(self):
+        counts = self.counts()
+        write_json({"pid": os.getpid(), "time": time.time(), "counts": counts,
+                    "report": self.scores(counts)}, self.snapshot_path)
+
+    def peer_counts(self):
+        # Snapshots of other workers written within the last few intervals
+        peers, own = [], self.snapshot_path
+        for path in glob.glob(os.path.join(self.snapshot_dir, "drift-*.json")):
+            if path == own:
+                continue
+            try:
+                if time.time() - os.path.getmtime(path) > 3 * max(self.snapshot_seconds, 1):
+                    continue
+                with open(path) as f:
+                    peers.append(json.load(f)["counts"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return peers
+
+    def scores(self, counts):
+        inputs = {field: sketch.scores(counts["inputs"][field]) for field, sketch in self.inputs.items()}
+        risk = {name: sketch.scores(counts["risk"][name]) for name, sketch in self.risk.items()}
+        ranked = [entry["status"] for entry in list(inputs.values()) + list(risk.values())]
+        overall = next((s for s in ("drift", "warning", "ok") if s in ranked), "insufficient_data")
+        return {"status": overall, "inputs": inputs, "risk": risk}
+
+    def report(self, include_peers=True):
+        counts = self.counts()
+        peers = self.peer_counts() if include_peers else []
+        for peer in peers:
+            for kind in ("inputs", "risk"):
+                for name, values in peer.get(kind, {}).items():
+                    if name in counts[kind] and len(values) == len(counts[kind][name]):
+                        counts[kind][name] = [a + b for a, b in zip(counts[kind][name], values)]
+        return {
+            **self.scores(counts),
+            "workers": 1 + len(peers),
+            "window": self.window,
+            "thresholds": {"psi_warning": PSI_WARNING, "psi_drift": PSI_DRIFT, "min_count": MIN_COUNT},
+            "reference": {"created": self.reference.get("created"), "data_hash": self.reference.get("data_hash")},
+        }
+
+
+def served_risk(models, X_test):
+    # models: {served model name: fitted model}
+    return {name: np.asarray(model.predict_proba(X_test))[:, 1] for name, model in models.items()}
+
+
+def main():
+    # Writes the reference profile for an existing model directory:
+    # training inputs from load_and_preprocess_data, predicted risk of every
+    # served model on the test split
+    import joblib
+    from .artifacts import file_hash
+    from .chd_model import DATA_LOADER
+    from .data_loader import stream_load_data
+    from .data_processor import load_and_preprocess_data
+    from .pipeline import build_inference_pipeline
+    from .catalog import METRIC_KEYS
+    parser = argparse.ArgumentParser(description="Write the drift reference profile for the trained models")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--output", default=REFERENCE_PATH)
+    args = parser.parse_args()
+    loader = stream_load_data if DATA_LOADER == "stream" else load_and_preprocess_data
+    X_train, X_test, _, _, _, _ = loader(args.data)
+    feature_columns = joblib.load("models/original_features.pkl")
+    pipeline = build_inference_pipeline(joblib.load("models/scaler.pkl"), joblib.load("models/feature_selector.pkl"),
+                                        feature_columns)
+    models = {name: joblib.load(f"models/{name}.pkl") for name in METRIC_KEYS if os.path.exists(f"models/{name}.pkl")}
+    reference = build_reference(X_train, served_risk(models, pipeline.transform(X_test[feature_columns])),
+                                file_hash(args.data))
+    write_json(reference, args.output)
+    print(f"Wrote {args.output}: {len(reference['inputs'])} inputs, risk of {sorted(reference['risk'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import logging
+import threading
+import numpy as np
+from .fast_trees import CompiledTreeModel, FAST_PATH_TOLERANCE
+from .fused_linear import FusedLogisticRegression
+
+logger = logging.getLogger(__name__)
+
+PROBE_ROWS = 32
+
+
+def selected_feature_names(original_features, interactions):
+    # The names PolynomialFeatures gives the kept columns, i.e. the contents
+    # of selected_features.pkl: "a" for a linear term, "a b" for a pair
+    names = [None] * interactions.n_output_features_
+    for position, column in zip(interactions.linear_positions_, interactions.linear_columns_):
+        names[position] = original_features[column]
+    for position, left, right in zip(interactions.pair_positions_, interactions.pair_left_, interactions.pair_right_):
+        names[position] = f"{original_features[left]} {original_features[right]}"
+    return names
+
+
+def input_aggregation(interactions):
+    # (selected features x original_features) matrix: a linear term counts
+    # fully towards its input, a pair term half towards each of its inputs
+    matrix = np.zeros((interactions.n_output_features_, interactions.n_features_in_))
+    matrix[interactions.linear_positions_, interactions.linear_columns_] = 1.0
+    matrix[interactions.pair_positions_, interactions.pair_left_] += 0.5
+    matrix[interactions.pair_positions_, interactions.pair_right_] += 0.5
+    return matrix
+
+
+def _linear_contributions(coef, intercept):
+    def contributions(X):
+        X = np.asarray(X, dtype=np.float64)
+        return np.column_stack([X * coef, np.full(len(X), intercept)])
+    return contributions
+
+
+def _xgboost_contributions(model, exact):
+    import xgboost
+    booster = model.get_booster()
+    best_iteration = getattr(model, "best_iteration", None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    return lambda X: booster.predict(xgboost.DMatrix(np.asarray(X)), pred_contribs=True, approx_contribs=not exact,
+                                     iteration_range=iteration_range).astype(np.float64)
+
+
+def _catboost_contributions(model, exact):
+    from catboost import Pool
+    calc_type = "Regular" if exact else "Approximate"
+    return lambda X: np.asarray(model.get_feature_importance(Pool(np.asarray(X)), type="ShapValues",
+                                                             shap_calc_type=calc_type), dtype=np.float64)
+
+
+def _path_contributions(trees, n_features, bias, float32_inputs=False):
+    # Saabas attribution on trees flattened into node arrays (leaves point to
+    # themselves): every step down a tree credits the change in node value to
+    # the feature of the node it leaves. All rows walk all trees in lock-step,
+    # as in fast_trees. `trees` holds one (feature, threshold, left, right,
+    # value, max_depth) tuple per tree, with -1 children at leaves.
+    feature, threshold, left, right, credit, roots = [], [], [], [], [], []
+    max_depth, offset = 0, 0
+    for tree_feature, tree_threshold, tree_left, tree_right, value, depth in trees:
+        nodes = np.arange(len(value))
+        leaf = tree_left == -1
+        step = np.zeros(len(value))
+        for children in (tree_left[~leaf], tree_right[~leaf]):
+            step[children] = value[children] - value[nodes[~leaf]]
+        feature.append(np.where(leaf, 0, tree_feature))
+        threshold.append(tree_threshold)
+        left.append(offset + np.where(leaf, nodes, tree_left))
+        right.append(offset + np.where(leaf, nodes, tree_right))
+        credit.append(step)
+        roots.append(offset)
+        max_depth = max(max_depth, depth)
+        offset += len(value)
+    feature, threshold = np.concatenate(feature), np.concatenate(threshold)
+    left, right, credit = np.concatenate(left), np.concatenate(right), np.concatenate(credit)
+    roots = np.array(roots, dtype=np.intp)
+
+    def contributions(X):
+        X = np.asarray(X, dtype=np.float32 if float32_inputs else np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        cell = rows * n_features
+        node = np.broadcast_to(roots, (X.shape[0], len(roots))).copy()
+        totals = np.zeros(X.shape[0] * n_features)
+        for _ in range(max_depth):
+            split = feature[node]
+            child = np.where(X[rows, split] <= threshold[node], left[node], right[node])
+            moved = child != node
+            if not moved.any():
+                break
+            totals += np.bincount((cell + split)[moved], weights=credit[child[moved]], minlength=len(totals))
+            node = child
+        return np.column_stack([totals.reshape(X.shape[0], n_features), np.full(X.shape[0], bias)])
+    return contributions
+
+
+def _forest_contributions(model):
+    # Node values are positive-class fractions divided by the number of
+    # trees, so contributions add up to predict_proba. float32 inputs against
+    # float64 thresholds, as the forest compares.
+    trees, bias = [], 0.0
+    n_trees = len(model.estimators_)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        values = tree.value[:, 0, :]
+        value = values[:, 1] / values.sum(axis=1) / n_trees
+        trees.append((tree.feature, tree.threshold, tree.children_left, tree.children_right, value, tree.max_depth))
+        bias += value[0]
+    return _path_contributions(trees, model.n_features_in_, bias, float32_inputs=True)
+
+
+def _lightgbm_contributions(model, exact):
+    if exact:
+        return lambda X: np.asarray(model.predict(np.asarray(X), pred_contrib=True), dtype=np.float64)
+    # Internal node values come from the model dump; numerical "<=" splits
+    # only, as in fast_trees
+    dump = model.booster_.dump_model()
+    sigmoid = float(dump["objective"].split("sigmoid:")[1]) if "sigmoid:" in dump["objective"] else 1.0
+    tree_info = dump["tree_info"]
+    best_iteration = getattr(model, "best_iteration_", 0) or 0
+    if best_iteration > 0:
+        tree_info = tree_info[:best_iteration]
+    trees, bias = [], 0.0
+    for info in tree_info:
+        feature, threshold, left, right, value = [], [], [], [], []
+        max_depth = 0
+
+        def visit(node, depth):
+            nonlocal max_depth
+            max_depth = max(max_depth, depth)
+            index = len(value)
+            feature.append(0)
+            threshold.append(np.inf)
+            left.append(-1)
+            right.append(-1)
+            if "leaf_value" in node:
+                value.append(node["leaf_value"])
+                return index
+            if node["decision_type"] != "<=" or node.get("missing_type", "None") == "Zero":
+                raise ValueError("unsupported LightGBM split")
+            value.append(node["internal_value"])
+            feature[index] = node["split_feature"]
+            threshold[index] = node["threshold"]
+            left[index] = visit(node["left_child"], depth + 1)
+            right[index] = visit(node["right_child"], depth + 1)
+            return index
+
+        visit(info["tree_structure"], 0)
+        value = sigmoid * np.array(value)
+        trees.append((np.array(feature), np.array(threshold), np.array(left), np.array(right), value, max_depth))
+        bias += value[0]
+    return _path_contributions(trees, model.n_features_in_, bias)
+
+
+def contribution_function(model, exact=False):
+    # Returns (function, units) or None. function(X) maps selected features to
+    # (rows, n_selected + 1) contributions whose last column is the base value;
+    # each row sums to the model's log-odds ("log_odds") or to P(high risk)
+    # for the random forest ("probability"). Tree models use path-based
+    # (Saabas) attribution unless `exact` asks for TreeSHAP.
+    if isinstance(model, CompiledTreeModel):
+        model = model.native
+    if isinstance(model, FusedLogisticRegression):
+        return _linear_contributions(model.coef, model.intercept), "log_odds"
+    name = type(model).__name__
+    if len(getattr(model, "classes_", [])) != 2:
+        return None
+    if name == "LogisticRegression":
+        return _linear_contributions(model.coef_[0], float(model.intercept_[0])), "log_odds"
+    if name == "XGBClassifier":
+        return _xgboost_contributions(model, exact), "log_odds"
+    if name == "LGBMClassifier":
+        return _lightgbm_contributions(model, exact), "log_odds"
+    if name == "CatBoostClassifier":
+        return _catboost_contributions(model, exact), "log_odds"
+    if name == "RandomForestClassifier":
+        return _forest_contributions(model), "probability"
+    return None
+
+
+class Explainer:
+    def __init__(self, contributions, units, input_names, feature_names, aggregation, top_features):
+        self.contributions = contributions
+        self.units = units
+        self.input_names = input_names
+        self.feature_names = feature_names
+        self.aggregation = aggregation
+        self.top_features = top_features
+
+    def summaries(self, contributions):
+        # One response entry per row of a contributions matrix: every
+        # original input and the strongest selected features, ordered by
+        # absolute contribution
+        contributions = np.asarray(contributions, dtype=np.float64).reshape(-1, len(self.feature_names) + 1)
+        per_input = contributions[:, :-1] @ self.aggregation
+        top = min(self.top_features, len(self.feature_names))
+        summaries = []
+        for row, by_input in zip(contributions, per_input):
+            input_order = np.argsort(-np.abs(by_input), kind="stable")
+            feature_order = np.argsort(-np.abs(row[:-1]), kind="stable")[:top]
+            summaries.append({
+                "units": self.units,
+                "base_value": float(row[-1]),
+                "inputs": [{"input": self.input_names[i], "contribution": float(by_input[i])} for i in input_order],
+                "features": [{"feature": self.feature_names[i], "contribution": float(row[i])} for i in feature_order]
+            })
+        return summaries
+
+
+class ExplainerCache:
+    # One Explainer per model artifact version. A model is only explained when
+    # its contributions add up to its own predict_proba on a random probe.
+    def __init__(self, original_features, interactions, top_features=10, exact=False, tolerance=FAST_PATH_TOLERANCE,
+                 seed=0):
+        self.original_features = list(original_features)
+        self.feature_names = selected_feature_names(self.original_features, interactions)
+        self.aggregation = input_aggregation(interactions)
+        self.top_features = top_features
+        self.exact = exact
+        self.tolerance = tolerance
+        self.seed = seed
+        self._explainers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, model, version):
+        key = (name, version)
+        with self._lock:
+            if key in self._explainers:
+                return self._explainers[key]
+        explainer = self._build(name, model)
+        with self._lock:
+            self._explainers = {k: v for k, v in self._explainers.items() if k[0] != name}
+            self._explainers[key] = explainer
+        return explainer
+
+    def _build(self, name, model):
+        spec = contribution_function(model, self.exact)
+        if spec is None:
+            return None
+        contributions, units = spec
+        try:
+            probe = np.random.default_rng(self.seed).normal(0.0, 1.5, size=(PROBE_ROWS, len(self.feature_names)))
+            totals = contributions(probe).sum(axis=1)
+            explained = totals if units == "probability" else 1.0 / (1.0 + np.exp(-totals))
+            error = float(np.max(np.abs(explained - model.predict_proba(probe)[:, 1])))
+        except Exception as e:
+            logger.warning("Could not build explanations for %s: %s", name, e)
+            return None
+        if error > self.tolerance:
+            logger.warning("Contributions of %s differ from predict_proba by %.3g; explanations disabled", name, error)
+            return None
+        return Explainer(contributions, units, self.original_features, self.feature_names, self.aggregation,
+                         self.top_features)
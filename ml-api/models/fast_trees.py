@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maximum absolute difference in P(high risk) accepted between the flattened
+# evaluator and the library's own predict_proba on the verification probe.
+# Random forest and LightGBM agree to ~1e-15; XGBoost accumulates margins in
+# float32, which accounts for the remaining ~1e-6.
+FAST_PATH_TOLERANCE = 1e-5
+
+# Larger inputs go to the library's multi-threaded predict_proba, which wins
+# once the per-call overhead is amortized.
+FAST_PATH_MAX_ROWS = 64
+
+
+class FlatTreeEnsemble:
+    # All trees of an ensemble stored as one set of node arrays with absolute
+    # child indices. Leaves point to themselves and always go left, so every row
+    # can walk every tree in lock-step for max_depth vectorized steps.
+    def __init__(self, roots, feature, threshold, left, right, value, max_depth,
+                 strict=False, float32_inputs=False, aggregate="sum", scale=1.0, bias=0.0):
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.max_depth = int(max_depth)
+        self.strict = strict
+        self.float32_inputs = float32_inputs
+        self.aggregate = aggregate
+        self.scale = scale
+        self.bias = bias
+
+    def leaf_values(self, X):
+        X = np.asarray(X, dtype=np.float32 if self.float32_inputs else np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = x < self.threshold[node] if self.strict else x <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            if self.is_leaf[node].all():
+                break
+        return self.value[node]
+
+    def positive_proba(self, X):
+        values = self.leaf_values(X)
+        if self.aggregate == "mean":
+            return values.mean(axis=1)
+        return 1.0 / (1.0 + np.exp(-(self.scale * values.sum(axis=1) + self.bias)))
+
+
+class CompiledTreeModel:
+    # Drop-in wrapper used by the server: predict_proba goes through the
+    # flattened ensemble, everything else is available on `native`.
+    def __init__(self, native, ensemble):
+        self.native = native
+        self.ensemble = ensemble
+        self.classes_ = native.classes_
+        self.n_features_in_ = _n_features(native)
+
+    def predict_proba(self, X):
+        if len(X) > FAST_PATH_MAX_ROWS:
+            return self.native.predict_proba(X)
+        p1 = self.ensemble.positive_proba(X)
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class _NodeBuilder:
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right, self.value = [], [], [], [], []
+
+    def add(self, feature=0, threshold=np.inf, value=0.0):
+        index = len(self.feature)
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(index)
+        self.right.append(index)
+        self.value.append(value)
+        return index
+
+    def link(self, node, left, right):
+        self.left[node] = left
+        self.right[node] = right
+
+
+def _from_sklearn_forest(model):
+    builder = _NodeBuilder()
+    roots, max_depth = [], 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        offset = len(builder.feature)
+        values = tree.value[:, 0, :]
+        fractions = values[:, 1] / values.sum(axis=1)
+        for node in range(tree.node_count):
+            if tree.children_left[node] == -1:
+                builder.add(value=fractions[node])
+            else:
+                builder.add(tree.feature[node], tree.threshold[node])
+        for node in range(tree.node_count):
+            if tree.children_left[node] != -1:
+                builder.link(offset + node, offset + tree.children_left[node], offset + tree.children_right[node])
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+    return FlatTreeEnsemble(roots, builder.feature, np.array(builder.threshold), builder.left, builder.right,
+                            builder.value, max_depth, float32_inputs=True, aggregate="mean")
+
+
+def _from_xgboost(model):
+    booster = model.get_booster()
+    config = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    if config["objective"]["name"] != "binary:logistic":
+        return None
+    base_score = float(str(config["learner_model_param"]["base_score"]).strip("[]"))
+    trees = config["gradient_booster"]["model"]["trees"]
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+    builder = _NodeBuilder()
+    roots, max_depth = [], 0
+    for tree in trees:
+        offset = len(builder.feature)
+        left, right = tree["left_children"], tree["right_children"]
+        conditions, indices = tree["split_conditions"], tree["split_indices"]
+        depth = {0: 0}
+        for node in range(len(left)):
+            if left[node] == -1:
+                builder.add(value=conditions[node])
+            else:
+                builder.add(indices[node], np.float32(conditions[node]))
+                depth[left[node]] = depth[right[node]] = depth[node] + 1
+        for node in range(len(left)):
+            if left[node] != -1:
+                builder.link(offset + node, offset + left[node], offset + right[node])
+        roots.append(offset)
+        max_depth = max(max_depth, max(depth.values()))
+    return FlatTreeEnsemble(roots, builder.feature, np.array(builder.threshold, dtype=np.float32), builder.left,
+                            builder.right, builder.value, max_depth, strict=True, float32_inputs=True,
+                            bias=float(np.log(base_score / (1.0 - base_score))))
+
+
+def _from_lightgbm(model):
+    dump = model.booster_.dump_model()
+    if not dump["objective"].startswith("binary"):
+        return None
+    sigmoid = float(dump["objective"].split("sigmoid:")[1]) if "sigmoid:" in dump["objective"] else 1.0
+    tree_info = dump["tree_info"]
+    best_iteration = getattr(model, "best_iteration_", 0) or 0
+    if best_iteration > 0:
+        tree_info = tree_info[:best_iteration]
+    builder = _NodeBuilder()
+    roots, max_depth = [], 0
+
+    def visit(node, depth):
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        if "leaf_value" in node:
+            return builder.add(value=node["leaf_value"])
+        if node["decision_type"] != "<=" or node.get("missing_type", "None") == "Zero":
+            raise ValueError("unsupported LightGBM split")
+        index = builder.add(node["split_feature"], node["threshold"])
+        builder.link(index, visit(node["left_child"], depth + 1), visit(node["right_child"], depth + 1))
+        return index
+
+    for tree in tree_info:
+        roots.append(visit(tree["tree_structure"], 0))
+    return FlatTreeEnsemble(roots, builder.feature, np.array(builder.threshold), builder.left, builder.right,
+                            builder.value, max_depth, scale=sigmoid)
+
+
+def _from_catboost(model):
+    # Oblivious trees are expanded into full binary trees. Split d sets bit d
+    # of the leaf index when x > border.
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        model.save_model(path, format="json")
+        with open(path) as f:
+            dump = json.load(f)
+    flat_index = {f["feature_index"]: f["flat_feature_index"] for f in dump["features_info"]["float_features"]}
+    scale, biases = dump.get("scale_and_bias", [1.0, [0.0]])
+    builder = _NodeBuilder()
+    roots, max_depth = [], 0
+    for tree in dump["oblivious_trees"]:
+        splits, leaves = tree["splits"], tree["leaf_values"]
+        if any(s["split_type"] != "FloatFeature" for s in splits):
+            raise ValueError("unsupported CatBoost split")
+        max_depth = max(max_depth, len(splits))
+
+        def expand(depth, leaf_index):
+            if depth == len(splits):
+                return builder.add(value=leaves[leaf_index])
+            split = splits[depth]
+            index = builder.add(flat_index[split["float_feature_index"]], np.float32(split["border"]))
+            builder.link(index, expand(depth + 1, leaf_index), expand(depth + 1, leaf_index | (1 << depth)))
+            return index
+
+        roots.append(expand(0, 0))
+    return FlatTreeEnsemble(roots, builder.feature, np.array(builder.threshold, dtype=np.float32), builder.left,
+                            builder.right, builder.value, max_depth, float32_inputs=True,
+                            scale=float(scale), bias=float(biases[0] if isinstance(biases, list) else biases))
+
+
+def _n_features(model):
+    # CatBoost reports n_features_in_ as 0 after unpickling
+    return getattr(model, "n_features_in_", 0) or len(model.feature_names_)
+
+
+def _converter_for(model):
+    name = type(model).__name__
+    if name == "RandomForestClassifier":
+        return _from_sklearn_forest
+    if name == "XGBClassifier":
+        return _from_xgboost
+    if name == "LGBMClassifier":
+        return _from_lightgbm
+    if name == "CatBoostClassifier":
+        return _from_catboost
+    return None
+
+
+def compile_tree_model(model, probe_rows=256, tolerance=FAST_PATH_TOLERANCE, seed=0):
+    # Returns a CompiledTreeModel when the model is a supported binary tree
+    # ensemble whose flattened form reproduces predict_proba on a random probe
+    # within `tolerance`; otherwise None, and the caller keeps the native model.
+    converter = _converter_for(model)
+    if converter is None or len(getattr(model, "classes_", [])) != 2:
+        return None
+    try:
+        ensemble = converter(model)
+        if ensemble is None:
+            return None
+        probe = np.random.default_rng(seed).normal(0.0, 1.5, size=(probe_rows, _n_features(model)))
+        expected = model.predict_proba(probe)[:, 1]
+        error = float(np.max(np.abs(ensemble.positive_proba(probe) - expected)))
+    except Exception as e:
+        logger.warning("Could not compile %s: %s", type(model).__name__, e)
+        return None
+    if error > tolerance:
+        logger.warning("Compiled %s differs from native by %.3g; using native predict_proba", type(model).__name__, error)
+        return None
+    logger.info("Compiled %s fast path (max abs error %.3g)", type(model).__name__, error)
+    return CompiledTreeModel(model, ensemble)
@@ -0,0 +1,103 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maximum absolute difference in P(high risk) accepted between the fused
+# scorer and scaler -> interactions -> LogisticRegression.predict_proba on the
+# verification probe.
+FUSED_TOLERANCE = 1e-9
+
+FUSED_ARRAYS = ("bias", "weights", "pair_left", "pair_right", "pair_weights", "coef", "intercept", "classes")
+
+
+def _expit(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class FusedLogisticRegression:
+    # Logistic regression on the scaled, interaction-expanded features folded
+    # into one quadratic form over the unscaled original_features:
+    #   logit(x) = bias + weights @ x + sum_k pair_weights[k] * x[pair_left[k]] * x[pair_right[k]]
+    # predict_proba_raw takes the FeatureEngineer output directly. predict_proba
+    # keeps the usual contract (selected interaction features) so the model is
+    # a drop-in replacement wherever the served LR is used.
+    def __init__(self, bias, weights, pair_left, pair_right, pair_weights, coef, intercept, classes):
+        self.bias = float(bias)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.pair_left = np.asarray(pair_left, dtype=np.intp)
+        self.pair_right = np.asarray(pair_right, dtype=np.intp)
+        self.pair_weights = np.asarray(pair_weights, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = len(self.coef)
+        self.n_raw_features = len(self.weights)
+
+    def decision_function_raw(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return self.bias + X @ self.weights + (X[:, self.pair_left] * X[:, self.pair_right]) @ self.pair_weights
+
+    def predict_proba_raw(self, X):
+        p1 = _expit(self.decision_function_raw(X))
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict_proba(self, X):
+        p1 = _expit(np.asarray(X, dtype=np.float64) @ self.coef + self.intercept)
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, "classes_" if name == "classes" else name) for name in FUSED_ARRAYS})
+
+
+def load_fused(path):
+    with np.load(path) as arrays:
+        return FusedLogisticRegression(**{name: arrays[name] for name in FUSED_ARRAYS})
+
+
+def fold_logistic_regression(mean, scale, interactions, coef, intercept):
+    # With z = (x - mean) / scale = a * x + c, a linear term w * z_i becomes
+    # w * a_i * x_i + w * c_i and a pair term w * z_i * z_j becomes
+    # w * a_i * a_j * x_i * x_j + w * a_i * c_j * x_i + w * c_i * a_j * x_j + w * c_i * c_j.
+    a = 1.0 / np.asarray(scale, dtype=np.float64)
+    c = -np.asarray(mean, dtype=np.float64) * a
+    coef = np.asarray(coef, dtype=np.float64)
+    weights = np.zeros(len(a))
+    np.add.at(weights, interactions.linear_columns_, coef[interactions.linear_positions_] * a[interactions.linear_columns_])
+    bias = float(intercept) + float(coef[interactions.linear_positions_] @ c[interactions.linear_columns_])
+    w = coef[interactions.pair_positions_]
+    left, right = interactions.pair_left_, interactions.pair_right_
+    np.add.at(weights, left, w * a[left] * c[right])
+    np.add.at(weights, right, w * c[left] * a[right])
+    bias += float(w @ (c[left] * c[right]))
+    return bias, weights, left, right, w * a[left] * a[right]
+
+
+def fuse_logistic_regression(model, scaler, interactions, probe_rows=256, tolerance=FUSED_TOLERANCE, seed=0):
+    # Returns a FusedLogisticRegression when `model` is a binary
+    # LogisticRegression and the fused form reproduces the sklearn chain on a
+    # random probe within `tolerance`; otherwise None.
+    if type(model).__name__ != "LogisticRegression" or len(getattr(model, "classes_", [])) != 2:
+        return None
+    if getattr(scaler, "with_mean", True) is False or getattr(scaler, "with_std", True) is False:
+        return None
+    try:
+        coef, intercept = model.coef_[0], model.intercept_[0]
+        bias, weights, left, right, pair_weights = fold_logistic_regression(
+            scaler.mean_, scaler.scale_, interactions, coef, intercept)
+        fused = FusedLogisticRegression(bias, weights, left, right, pair_weights, coef, intercept, model.classes_)
+        # Probe rows spread around the training distribution of each feature
+        probe = scaler.mean_ + scaler.scale_ * np.random.default_rng(seed).normal(0.0, 1.5, size=(probe_rows, len(scaler.mean_)))
+        expected = model.predict_proba(interactions.transform((probe - scaler.mean_) / scaler.scale_))[:, 1]
+        error = float(np.max(np.abs(fused.predict_proba_raw(probe)[:, 1] - expected)))
+    except Exception as e:
+        logger.warning("Could not fuse %s: %s", type(model).__name__, e)
+        return None
+    if error > tolerance:
+        logger.warning("Fused logistic regression differs from sklearn by %.3g; using sklearn", error)
+        return None
+    logger.info("Fused logistic regression (max abs error %.3g)", error)
+    return fused
@@ -5,6 +5,7 @@ from sklearn.model_selection import cross_val_score
 from sklearn.ensemble import RandomForestClassifier
 from xgboost import XGBClassifier
 from models.data_processor import load_and_preprocess_data
+from models.devices import cpu_threads, training_backend, record_backend
 
 def tune_rf(X, y):
     model_path = Path("models/rf_tuned.pkl")
@@ -23,14 +24,14 @@ def tune_rf(X, y):
             min_samples_split=min_samples_split,
             min_samples_leaf=min_samples_leaf,
             random_state=42,
-            n_jobs=-1
+            n_jobs=cpu_threads()
         )
         scores = cross_val_score(clf, X, y, cv=3, scoring="accuracy")
         return scores.mean()
     study = optuna.create_study(direction="maximize")
     study.optimize(objective, n_trials=20)
     best_params = study.best_params
-    model = RandomForestClassifier(**best_params, random_state=42, n_jobs=-1)
+    model = RandomForestClassifier(**best_params, random_state=42, n_jobs=cpu_threads())
     model.fit(X, y)
     joblib.dump(model, model_path)
     print("Best RF Params:", best_params)
@@ -42,6 +43,8 @@ def tune_xgb(X, y):
         model = joblib.load(model_path)
         print("Loaded XGB Model from file")
         return model
+    backend = training_backend()
+    device_params = backend["params"]["xgb"]
     def objective(trial):
         n_estimators = trial.suggest_int("n_estimators", 100, 400, step=50)
         max_depth = trial.suggest_int("max_depth", 3, 10)
@@ -55,10 +58,8 @@ def tune_xgb(X, y):
             subsample=subsample,
             colsample_bytree=colsample_bytree,
             eval_metric="logloss",
-            tree_method="gpu_hist",
-            predictor="gpu_predictor",
             random_state=42,
-            n_jobs=-1
+            **device_params
         )
         scores = cross_val_score(clf, X, y, cv=3, scoring="accuracy")
         return scores.mean()
@@ -68,13 +69,12 @@ def tune_xgb(X, y):
     model = XGBClassifier(
         **best_params,
         eval_metric="logloss",
-        tree_method="gpu_hist",
-        predictor="gpu_predictor",
         random_state=42,
-        n_jobs=-1
+        **device_params
     )
     model.fit(X, y)
     joblib.dump(model, model_path)
+    record_backend(str(model_path), backend)
     print("Best XGB Params:", best_params)
     return model
 
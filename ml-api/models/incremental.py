@@ -0,0 +1,291 @@
+import argparse
+import copy
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.utils import Bunch
+from .artifacts import write_manifest, file_hash
+from .catalog import METRIC_KEYS
+from .chd_model import DATA_LOADER, evaluate_model
+from .data_loader import stream_load_data
+from .data_processor import load_and_preprocess_data, FeatureEngineer, OUTLIER_COLUMNS
+from .pipeline import build_inference_pipeline
+from .training_orchestrator import atomic_dump, publish
+
+DROP_DIR = os.environ.get("CHD_INCREMENTAL_DIR", "data/incoming")
+VERSIONS_DIR = "models/versions"
+BOOST_ROUNDS = int(os.environ.get("CHD_INCREMENTAL_ROUNDS", "50"))
+RF_TREES = int(os.environ.get("CHD_INCREMENTAL_TREES", "20"))
+# Rows of the original training split mixed into every update, so a small
+# drop does not pull the models towards a handful of patients
+REPLAY_ROWS = int(os.environ.get("CHD_INCREMENTAL_REPLAY_ROWS", "20000"))
+# An updated model is only published if its AUC on the original test split
+# drops by at most this much
+MAX_AUC_DROP = float(os.environ.get("CHD_INCREMENTAL_MAX_AUC_DROP", "0.01"))
+# Mean shift (in training standard deviations) of any feature at which a full
+# retrain is recommended
+SCALER_DRIFT_WARNING = float(os.environ.get("CHD_INCREMENTAL_DRIFT_WARNING", "0.1"))
+
+LABEL_FIELDS = ("outcome", "cardio", "target")
+INPUT_FIELDS = ["age_years", "gender", "height", "weight", "ap_hi", "ap_lo", "cholesterol", "gluc", "smoke", "alco", "active"]
+BASE_MODELS = ("lr", "rf", "xgb", "lgb", "cat")
+ENSEMBLES = ("ensemble", "stacking")
+SERVED_NAMES = {metric_key: name for name, metric_key in METRIC_KEYS.items()}
+
+
+def model_path(short_name, models_dir="models"):
+    return os.path.join(models_dir, f"{SERVED_NAMES[short_name]}.pkl")
+
+
+def read_drop_files(drop_dir=DROP_DIR):
+    paths = sorted(
+        p for pattern in ("*.jsonl", "*.json", "*.csv") for p in glob.glob(os.path.join(drop_dir, pattern))
+    )
+    records = []
+    for path in paths:
+        if path.endswith(".csv"):
+            with open(path) as f:
+                sep = ";" if ";" in f.readline() else ","
+            records.extend(pd.read_csv(path, sep=sep).to_dict("records"))
+        elif path.endswith(".jsonl"):
+            with open(path) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+        else:
+            with open(path) as f:
+                data = json.load(f)
+            records.extend(data if isinstance(data, list) else [data])
+    return paths, records
+
+
+def normalize_record(record):
+    # Diagnosis documents carry the form fields under inputData, with age in
+    # years; cardio.csv-style rows carry age in days. Only a confirmed label
+    # counts: the stored `prediction` is the model's own output and is never
+    # used as a target.
+    features = dict(record.get("inputData") or record)
+    label = next((record[k] for k in LABEL_FIELDS if record.get(k) is not None), None)
+    if label is None:
+        label = next((features[k] for k in LABEL_FIELDS if features.get(k) is not None), None)
+    if label is None:
+        return None, None
+    if "inputData" in record and "age" in features:
+        features["age_years"] = features.pop("age")
+    return features, int(label)
+
+
+def build_increment(records, feature_columns, ranges):
+    rows, labels, skipped = [], [], 0
+    for record in records:
+        features, label = normalize_record(record)
+        if features is None or label not in (0, 1):
+            skipped += 1
+            continue
+        rows.append(features)
+        labels.append(label)
+    if not rows:
+        return pd.DataFrame(columns=feature_columns), np.empty(0, dtype=int), skipped
+    df = pd.DataFrame.from_records(rows)
+    if "age_years" not in df.columns:
+        df["age_years"] = df["age"] / 365.25
+    missing = [c for c in INPUT_FIELDS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Records are missing input fields {missing}")
+    valid = df[INPUT_FIELDS].notna().all(axis=1) & (df["age_years"] > 0) & (df["age_years"] <= 100) & (df["height"] > 0)
+    # Invalid rows get placeholder values so the frame can be engineered in
+    # one pass; they are dropped below
+    X = FeatureEngineer(feature_columns).transform(df[INPUT_FIELDS].where(valid, 1).astype(float))
+    # Rows outside the range that survived outlier removal in training are
+    # dropped, as remove_outliers would have
+    for col, (lower, upper) in ranges.items():
+        valid &= (X[col] >= lower) & (X[col] <= upper)
+    skipped += int((~valid).sum())
+    return X[valid], np.asarray(labels)[valid.to_numpy()], skipped
+
+
+def continue_training(short_name, model, X, y):
+    # Boosters continue from their current trees; the forest grows extra trees
+    # on the new data; logistic regression (liblinear has no warm start) is
+    # refit, which takes well under a second.
+    kind = type(model).__name__
+    if kind == "XGBClassifier":
+        updated = type(model)(**model.get_params())
+        updated.set_params(n_estimators=BOOST_ROUNDS, early_stopping_rounds=None)
+        updated.fit(X, y, xgb_model=model.get_booster(), verbose=False)
+        return updated
+    if kind == "LGBMClassifier":
+        updated = type(model)(**model.get_params())
+        updated.set_params(n_estimators=BOOST_ROUNDS)
+        updated.fit(X, y, init_model=model.booster_)
+        return updated
+    if kind == "CatBoostClassifier":
+        updated = type(model)(**model.get_params())
+        updated.set_params(iterations=BOOST_ROUNDS)
+        updated.fit(X, y, init_model=model, verbose=False)
+        return updated
+    if kind == "RandomForestClassifier":
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + RF_TREES)
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+        return model
+    if kind == "LogisticRegression":
+        updated = LogisticRegression(**model.get_params())
+        updated.fit(X, y)
+        return updated
+    raise ValueError(f"No incremental update for {short_name} ({kind})")
+
+
+def replace_base_learners(ensemble, updated):
+    # The voting mean and the stacking meta-learner are kept; only the base
+    # learners are swapped for their updated versions.
+    ensemble = copy.copy(ensemble)
+    names = list(ensemble.named_estimators_)
+    ensemble.estimators_ = [updated.get(name, estimator) for name, estimator in ensemble.named_estimators_.items()]
+    ensemble.named_estimators_ = Bunch(**dict(zip(names, ensemble.estimators_)))
+    return ensemble
+
+
+def scaler_drift(scaler, X):
+    # Running statistics over training + new rows. The served scaler is kept:
+    # refitting it would move the inputs of every existing tree split.
+    running = copy.deepcopy(scaler)
+    running.partial_fit(X)
+    shift = np.abs(running.mean_ - scaler.mean_) / scaler.scale_
+    return running, dict(zip(scaler.feature_names_in_, shift.round(4).tolist()))
+
+
+def load_reference_data(data_path, pipeline, seed=42):
+    loader = stream_load_data if DATA_LOADER == "stream" else load_and_preprocess_data
+    X_train, X_test, y_train, y_test, _, _ = loader(data_path)
+    rng = np.random.default_rng(seed)
+    replay = np.sort(rng.choice(len(X_train), size=min(REPLAY_ROWS, len(X_train)), replace=False)).astype(np.intp)
+    ranges = {col: (X_train[col].min(), X_train[col].max()) for col in OUTLIER_COLUMNS + ["age_years"] if col in X_train.columns}
+    X_test = pipeline.transform(X_test)
+    X_replay = pipeline.transform(X_train.iloc[replay]) if len(replay) else np.empty((0, X_test.shape[1]))
+    return X_replay, np.asarray(y_train)[replay], X_test, np.asarray(y_test), ranges
+
+
+def write_json(obj, path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f, indent=2, default=float)
+    os.replace(tmp_path, path)
+
+
+def incremental_update(data_path="data/cardio.csv", drop_dir=DROP_DIR, dry_run=False):
+    started = time.perf_counter()
+    paths, records = read_drop_files(drop_dir)
+    if not records:
+        print(f"No new records in {drop_dir}")
+        return None
+    scaler = joblib.load("models/scaler.pkl")
+    selector = joblib.load("models/feature_selector.pkl")
+    feature_columns = joblib.load("models/original_features.pkl")
+    pipeline = build_inference_pipeline(scaler, selector, feature_columns)
+
+    X_replay, y_replay, X_test, y_test, ranges = load_reference_data(data_path, pipeline)
+    X_new_raw, y_new, skipped = build_increment(records, feature_columns, ranges)
+    print(f"[ingest] {len(y_new)} labeled records from {len(paths)} files ({skipped} skipped)")
+    if not len(y_new):
+        return None
+    running_scaler, drift = scaler_drift(scaler, X_new_raw)
+    worst = max(drift, key=drift.get)
+    if drift[worst] > SCALER_DRIFT_WARNING:
+        print(f"[ingest] WARNING: {worst} shifted by {drift[worst]:.3f} sd since the scaler was fit; run a full retrain")
+
+    X = np.vstack([X_replay, pipeline.transform(X_new_raw)])
+    y = np.concatenate([y_replay, y_new])
+
+    previous_metrics = joblib.load("models/model_metrics.pkl") if os.path.exists("models/model_metrics.pkl") else {}
+    updated, metrics, rejected = {}, {}, {}
+    for short in BASE_MODELS:
+        if not os.path.exists(model_path(short)):
+            continue
+        start = time.perf_counter()
+        model = continue_training(short, joblib.load(model_path(short)), X, y)
+        metrics[short] = evaluate_model(model, X_test, y_test, f"{short} (incremental)")
+        baseline = previous_metrics.get(short, {}).get("auc")
+        if baseline is not None and metrics[short]["auc"] < baseline - MAX_AUC_DROP:
+            rejected[short] = f"AUC {metrics[short]['auc']:.4f} < {baseline:.4f} - {MAX_AUC_DROP}"
+            continue
+        updated[short] = model
+        print(f"[{short}] updated in {time.perf_counter() - start:.1f}s")
+    for short in ENSEMBLES:
+        if not os.path.exists(model_path(short)) or not updated:
+            continue
+        model = replace_base_learners(joblib.load(model_path(short)), updated)
+        metrics[short] = evaluate_model(model, X_test, y_test, f"{short} (incremental)")
+        baseline = previous_metrics.get(short, {}).get("auc")
+        if baseline is not None and metrics[short]["auc"] < baseline - MAX_AUC_DROP:
+            rejected[short] = f"AUC {metrics[short]['auc']:.4f} < {baseline:.4f} - {MAX_AUC_DROP}"
+            continue
+        updated[short] = model
+    for short, reason in rejected.items():
+        print(f"[{short}] not published: {reason}")
+    if dry_run or not updated:
+        return {"updated": sorted(updated), "rejected": rejected, "metrics": metrics, "published": False}
+
+    # Every artifact of the update is written to its own version directory
+    # first. The manifest, with the new flat arrays and fused scorers, is
+    # written next and points at those pickles, so a server that reloads on
+    # the manifest change loads the new model as a whole. The served .pkl
+    # files are replaced last, one rename at a time.
+    digest = hashlib.sha256("".join(file_hash(p) for p in paths).encode()).hexdigest()
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+    for short, model in updated.items():
+        atomic_dump(model, model_path(short, version_dir))
+    all_metrics = {**previous_metrics, **{short: metrics[short] for short in updated}}
+    current_path = os.path.join(VERSIONS_DIR, "current.json")
+    parent = None
+    if os.path.exists(current_path):
+        with open(current_path) as f:
+            parent = json.load(f)["version"]
+    record = {
+        "version": version,
+        "parent": parent,
+        "created_at": time.time(),
+        "records": int(len(y_new)),
+        "skipped": skipped,
+        "replay_rows": int(len(y_replay)),
+        "sources": [os.path.basename(p) for p in paths],
+        "updated": sorted(updated),
+        "rejected": rejected,
+        "metrics": {short: metrics[short] for short in updated},
+        "scaler_drift": drift,
+        "running_scaler": {"mean": running_scaler.mean_.tolist(), "var": running_scaler.var_.tolist(),
+                           "n_samples_seen": int(np.max(running_scaler.n_samples_seen_))},
+    }
+    write_json(record, os.path.join(version_dir, "version.json"))
+
+    atomic_dump(all_metrics, "models/model_metrics.pkl")
+    write_manifest("models", feature_columns, scaler, selector.get_support(), all_metrics,
+                   f"{file_hash(data_path)}+{digest}", {SERVED_NAMES[short]: m for short, m in updated.items()},
+                   sources={SERVED_NAMES[short]: model_path(short, version_dir) for short in updated})
+    for short in updated:
+        publish(model_path(short, version_dir), model_path(short))
+    write_json({"version": version}, current_path)
+
+    ingested_dir = os.path.join(drop_dir, "ingested", version)
+    os.makedirs(ingested_dir, exist_ok=True)
+    for path in paths:
+        shutil.move(path, os.path.join(ingested_dir, os.path.basename(path)))
+    print(f"Published version {version} ({', '.join(sorted(updated))}) in {time.perf_counter() - started:.1f}s")
+    return {**record, "published": True}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the served models with newly labeled records")
+    parser.add_argument("--data", default="data/cardio.csv", help="Original training data, used for replay and the test split")
+    parser.add_argument("--drop-dir", default=DROP_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Train and evaluate but do not publish")
+    args = parser.parse_args()
+    incremental_update(args.data, args.drop_dir, args.dry_run)
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .catalog import METRIC_KEYS
+from .fast_trees import FAST_PATH_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+PREDICT_ALL_THREADS = int(os.environ.get("ML_API_PREDICT_ALL_THREADS", min(4, os.cpu_count() or 1)))
+PROBE_ROWS = 64
+
+# Ensemble estimator names are the short training names ("rf", "xgb", ...)
+SERVED_NAMES = {metric_key: name for name, metric_key in METRIC_KEYS.items()}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    # Created on first use so that gunicorn's preload fork does not inherit
+    # the pool's threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREDICT_ALL_THREADS, thread_name_prefix="predict-all")
+        return _executor
+
+
+def base_learners(model):
+    # Returns ("voting" | "stacking", [(short_name, fitted_estimator), ...]) for
+    # ensembles whose output is a plain function of their base learners'
+    # predict_proba, or None when the ensemble has to be scored as a whole.
+    kind = type(model).__name__
+    if kind == "VotingClassifier" and model.voting == "soft" and model.weights is None:
+        return "voting", list(model.named_estimators_.items())
+    if (kind == "StackingClassifier" and not model.passthrough and len(model.classes_) == 2
+            and all(method == "predict_proba" for method in model.stack_method_)):
+        return "stacking", list(model.named_estimators_.items())
+    return None
+
+
+def combine(kind, ensemble, probabilities):
+    if kind == "voting":
+        return np.mean(probabilities, axis=0)
+    # Binary stacking keeps only the positive-class column of each learner
+    return ensemble.final_estimator_.predict_proba(np.column_stack([p[:, 1] for p in probabilities]))
+
+
+class ReusePlanner:
+    # Decides, once per combination of artifact versions, which base learners
+    # of an ensemble give the same probabilities as a served model on a random
+    # probe. Those are taken from the served model's output instead of being
+    # evaluated again.
+    def __init__(self, tolerance=FAST_PATH_TOLERANCE, seed=0):
+        self.tolerance = tolerance
+        self.seed = seed
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def plan(self, name, ensemble, version, served, served_versions):
+        spec = base_learners(ensemble)
+        if spec is None:
+            return None
+        key = (name, version, tuple(sorted(served_versions.items())))
+        with self._lock:
+            if key in self._plans:
+                return self._plans[key]
+        kind, learners = spec
+        probe = np.random.default_rng(self.seed).normal(size=(PROBE_ROWS, ensemble.n_features_in_))
+        shared = {}
+        for short, estimator in learners:
+            candidate = SERVED_NAMES.get(short)
+            if candidate not in served:
+                continue
+            error = np.abs(served[candidate].predict_proba(probe) - estimator.predict_proba(probe)).max()
+            if error <= self.tolerance:
+                shared[short] = candidate
+            else:
+                logger.info("%s.%s differs from served %s by %.3g; scoring it separately", name, short, candidate, error)
+        plan = {"kind": kind, "learners": learners, "shared": shared}
+        with self._lock:
+            self._plans[key] = plan
+        return plan
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def score_models(X, models, plans):
+    # models: name -> model to score; plans: name -> ReusePlanner plan for the
+    # ensembles among them. Independent models and the base learners that
+    # cannot be shared run concurrently; ensembles are then assembled from
+    # their base learners' outputs. Returns name -> (probabilities, seconds,
+    # shared base learners) and name -> exception.
+    pool = executor()
+    futures = {name: pool.submit(_timed, model.predict_proba, X) for name, model in models.items() if plans.get(name) is None}
+    own = {
+        (name, short): pool.submit(_timed, estimator.predict_proba, X)
+        for name, plan in plans.items() if plan is not None
+        for short, estimator in plan["learners"] if short not in plan["shared"]
+    }
+    results, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            probabilities, seconds = future.result()
+            results[name] = (probabilities, seconds, [])
+        except Exception as e:
+            errors[name] = e
+    for name, plan in plans.items():
+        if plan is None:
+            continue
+        try:
+            probabilities, seconds = [], 0.0
+            for short, estimator in plan["learners"]:
+                served = plan["shared"].get(short)
+                if served is not None and served in results:
+                    probabilities.append(results[served][0])
+                    continue
+                if served is not None:
+                    # The served model was not requested or failed; use the
+                    # ensemble's own copy
+                    p, s = _timed(estimator.predict_proba, X)
+                else:
+                    p, s = own[(name, short)].result()
+                probabilities.append(p)
+                seconds += s
+            combined, s = _timed(combine, plan["kind"], models[name], probabilities)
+            shared = [short for short, served in plan["shared"].items() if served in results]
+            results[name] = (combined, seconds + s, shared)
+        except Exception as e:
+            errors[name] = e
+    return results, errors
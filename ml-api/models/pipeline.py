@@ -0,0 +1,43 @@
+import numpy as np
+from itertools import combinations
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+
+class SelectedInteractions(BaseEstimator, TransformerMixin):
+    # Same output as PolynomialFeatures(degree=2, interaction_only=True,
+    # include_bias=False) followed by the SelectFromModel support mask, but only
+    # the kept columns are computed. Poly column order is the n linear terms
+    # followed by every pair (i, j) with i < j.
+    def __init__(self, n_features, support):
+        self.n_features = n_features
+        self.support = support
+
+    def fit(self, X=None, y=None):
+        terms = [(i, i) for i in range(self.n_features)] + list(combinations(range(self.n_features), 2))
+        support = np.asarray(self.support, dtype=bool)
+        if len(support) != len(terms):
+            raise ValueError(f"Support mask has {len(support)} entries, expected {len(terms)} for {self.n_features} features")
+        kept = [terms[i] for i in np.flatnonzero(support)]
+        self.linear_positions_ = np.array([p for p, (a, b) in enumerate(kept) if a == b], dtype=np.intp)
+        self.linear_columns_ = np.array([a for a, b in kept if a == b], dtype=np.intp)
+        self.pair_positions_ = np.array([p for p, (a, b) in enumerate(kept) if a != b], dtype=np.intp)
+        self.pair_left_ = np.array([a for a, b in kept if a != b], dtype=np.intp)
+        self.pair_right_ = np.array([b for a, b in kept if a != b], dtype=np.intp)
+        self.n_features_in_ = self.n_features
+        self.n_output_features_ = len(kept)
+        return self
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} scaled features, got {X.shape[1]}")
+        out = np.empty((X.shape[0], self.n_output_features_), dtype=np.float64)
+        out[:, self.linear_positions_] = X[:, self.linear_columns_]
+        out[:, self.pair_positions_] = X[:, self.pair_left_] * X[:, self.pair_right_]
+        return out
+
+
+def build_inference_pipeline(scaler, selector, feature_columns):
+    interactions = SelectedInteractions(len(feature_columns), selector.get_support()).fit()
+    return Pipeline([("scaler", scaler), ("interactions", interactions)])
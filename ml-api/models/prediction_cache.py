@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_key(model_name, version, features, decimals=6):
+    # Rounds away float noise (e.g. age_years from days) and folds -0.0 into
+    # 0.0 so equivalent inputs share an entry.
+    row = np.round(np.asarray(features, dtype=np.float64), decimals) + 0.0
+    digest = hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()
+    return f"{model_name}:{version}:{digest}"
+
+
+class PredictionCache:
+    # In-process LRU with TTL, optionally backed by a SQLite file that several
+    # worker processes can share. Keys embed the model and pipeline artifact
+    # versions, so a retrained model never serves stale entries.
+    def __init__(self, max_entries=10000, ttl_seconds=3600, db_path=None, db_max_entries=100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+        value = self._disk_get(key, now) if self.db_path else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value, now)
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+        if self.db_path:
+            self._disk_set(key, value, now)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _connection(self):
+        # sqlite connections must not cross threads or forked processes
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=1.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _disk_get(self, key, now):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM predictions WHERE key = ? AND created >= ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Prediction cache read failed: %s", e)
+            return None
+        return tuple(float(v) for v in row[0].split(",")) if row else None
+
+    def _disk_set(self, key, value, now):
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                    (key, ",".join(repr(float(v)) for v in value), now)
+                )
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    connection.execute("DELETE FROM predictions WHERE created < ?", (now - self.ttl_seconds,))
+                    connection.execute(
+                        "DELETE FROM predictions WHERE key NOT IN "
+                        "(SELECT key FROM predictions ORDER BY created DESC LIMIT ?)", (self.db_max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Prediction cache write failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared_db": self.db_path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,146 @@
+import os
+import time
+import logging
+import threading
+from collections import Counter, OrderedDict
+import joblib
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    # Keeps loaded models resident between requests. Size is the on-disk size
+    # of the artifact actually loaded, as reported by `size(name)`, or of the
+    # pickle; it tracks the in-memory footprint closely for these
+    # numpy-backed estimators. When the byte budget is exceeded the least
+    # recently used entries are evicted; a model larger than the whole budget
+    # is still kept so it can be served. `stamp(name)` identifies what the
+    # loader will actually serve (e.g. the manifest entry's hash); an entry is
+    # reloaded when either it or the pickle's mtime changes.
+    def __init__(self, paths, max_bytes=None, loader=joblib.load, stamp=None, size=None):
+        self.paths = dict(paths)
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.stamp = stamp or (lambda name: None)
+        self.size = size or (lambda name: None)
+        self.hits = Counter()
+        self.misses = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+    def get(self, name):
+        return self.get_versioned(name)[0]
+
+    def get_versioned(self, name):
+        # (model, version) read from one registry entry, so the version always
+        # describes the model returned even if the entry is evicted right after
+        cached = self._cached(name)
+        if cached is not None:
+            return cached
+        # Loads run outside the registry lock, so a slow load never blocks
+        # requests for other models; the per-name lock lets one thread load a
+        # model while concurrent requests for it wait and reuse the result
+        with self._load_lock(name):
+            cached = self._cached(name)
+            if cached is not None:
+                return cached
+            path = self.paths[name]
+            stat = os.stat(path)
+            stamp = self.stamp(name)
+            with self._lock:
+                self.misses[name] += 1
+                if self._entries.pop(name, None) is not None:
+                    logger.info("Reloading %s (artifact changed on disk)", path)
+            start = time.perf_counter()
+            model = self.loader(path)
+            size_bytes = self.size(name)
+            entry = {
+                "model": model,
+                "path": path,
+                "mtime_ns": stat.st_mtime_ns,
+                "stamp": stamp,
+                "size_bytes": stat.st_size if size_bytes is None else size_bytes,
+                "load_seconds": time.perf_counter() - start,
+                "loaded_at": time.time(),
+            }
+            with self._lock:
+                self._entries[name] = entry
+                self._evict(keep=name)
+            return model, self._entry_version(entry)
+
+    def _cached(self, name):
+        stat = os.stat(self.paths[name])
+        stamp = self.stamp(name)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["stamp"] != stamp:
+                return None
+            self._entries.move_to_end(name)
+            self.hits[name] += 1
+            return entry["model"], self._entry_version(entry)
+
+    def _load_lock(self, name):
+        with self._lock:
+            return self._load_locks.setdefault(name, threading.Lock())
+
+    def preload(self, names=None):
+        loaded = []
+        for name in names or list(self.paths):
+            if os.path.exists(self.paths[name]):
+                self.get(name)
+                loaded.append(name)
+        return loaded
+
+    def version(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            return self._entry_version(entry) if entry else None
+
+    @staticmethod
+    def _entry_version(entry):
+        return f"{entry['mtime_ns']}-{entry['stamp']}" if entry["stamp"] else str(entry["mtime_ns"])
+
+    def clear(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(e["size_bytes"] for e in self._entries.values())
+
+    def _evict(self, keep):
+        if not self.max_bytes:
+            return
+        while self.resident_bytes() > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                self._entries.move_to_end(keep)
+                continue
+            logger.info("Evicting %s from model cache", oldest)
+            del self._entries[oldest]
+
+    def status(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return {"resident": False}
+            return {
+                "resident": True,
+                "size_bytes": entry["size_bytes"],
+                "load_seconds": round(entry["load_seconds"], 4),
+                "loaded_at": entry["loaded_at"],
+            }
+
+    def summary(self):
+        with self._lock:
+            return {
+                "resident": {name: self.status(name) for name in self._entries},
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": sum(self.hits.values()),
+                "misses": sum(self.misses.values()),
+            }
@@ -0,0 +1,155 @@
+import json
+import math
+import threading
+import numpy as np
+from .data_processor import derive_record
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Raw inputs of a prediction request, in the order errors are reported.
+# Continuous fields have an inclusive plausibility range; coded fields only
+# accept their category codes.
+RAW_FIELDS = {
+    "gender": {"codes": (1, 2)},
+    "height": {"range": (100, 250)},
+    "weight": {"range": (20, 300)},
+    "ap_hi": {"range": (50, 300)},
+    "ap_lo": {"range": (20, 200)},
+    "cholesterol": {"codes": (1, 2, 3)},
+    "gluc": {"codes": (1, 2, 3)},
+    "smoke": {"codes": (0, 1)},
+    "alco": {"codes": (0, 1)},
+    "active": {"codes": (0, 1)},
+}
+AGE_DAYS_PER_YEAR = 365.25
+
+# Everything derive_features can produce, so the schema can fill any
+# original_features order
+DERIVED = ("age_years", "bmi", "pulse_pressure", "age_group", "lifestyle_risk", "metabolic_risk",
+           "bp_category", "bmi_category", "map", "risk_score")
+
+
+def _missing(value):
+    # None and NaN count as missing, as pd.isna does in the batch path
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _number(value):
+    # Same acceptance as pd.to_numeric on one value: numbers, booleans and
+    # numeric strings; NaN and infinities are not numbers here
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def range_error(name, value):
+    spec = RAW_FIELDS[name]
+    if "codes" in spec:
+        if value not in spec["codes"]:
+            return f"{name} must be one of {list(spec['codes'])}, got {value:g}"
+    else:
+        low, high = spec["range"]
+        if not low <= value <= high:
+            return f"{name} must be between {low} and {high}, got {value:g}"
+    return None
+
+
+class InputSchema:
+    # Compiled once from original_features: maps every feature to its slot in
+    # the model input vector, so a request record is parsed, validated and
+    # feature-engineered straight into a float64 array without pandas. The
+    # derived values come from derive_record, which shares its formulas and
+    # thresholds with derive_features.
+    def __init__(self, feature_columns):
+        unknown = [name for name in feature_columns if name not in RAW_FIELDS and name not in DERIVED]
+        if unknown:
+            raise ValueError(f"No input schema for features {unknown}")
+        self.feature_columns = list(feature_columns)
+        self.slots = {name: i for i, name in enumerate(self.feature_columns)}
+        self.n_features = len(self.feature_columns)
+        self._buffers = threading.local()
+
+    def buffer(self):
+        # One reusable output vector per thread, for vector(out=...). A
+        # request thread is done with its vector before it parses the next one.
+        out = getattr(self._buffers, "out", None)
+        if out is None:
+            out = self._buffers.out = np.empty(self.n_features)
+        return out
+
+    def validate(self, record):
+        # Returns (values, None) or (None, message) with the messages of
+        # build_feature_matrix, plus one message per out-of-range field
+        if not isinstance(record, dict):
+            return None, "Record must be a JSON object"
+        values, missing, invalid = {}, [], []
+        for name in RAW_FIELDS:
+            raw = record.get(name)
+            if _missing(raw):
+                missing.append(name)
+                continue
+            number = _number(raw)
+            if number is None:
+                invalid.append(name)
+            else:
+                values[name] = number
+        # Age in days ("age") wins over "age_years" when both are given
+        age_years = None
+        for name in ("age", "age_years"):
+            raw = record.get(name)
+            if _missing(raw):
+                continue
+            number = _number(raw)
+            if number is None:
+                invalid.append(name)
+            elif age_years is None:
+                age_years = number / AGE_DAYS_PER_YEAR if name == "age" else number
+        if _missing(record.get("age")) and _missing(record.get("age_years")):
+            missing.append("age_years")
+        messages = []
+        if missing:
+            messages.append(f"Missing input fields: {missing}")
+        if invalid:
+            messages.append(f"Non-numeric input fields: {invalid}")
+        else:
+            if age_years is not None and not 0 < age_years <= 100:
+                messages.append("age_years must be between 0 and 100")
+            messages += [error for error in (range_error(name, value) for name, value in values.items()) if error]
+        if messages:
+            return None, "; ".join(messages)
+        values["age_years"] = age_years
+        return values, None
+
+    def vector(self, record, out=None):
+        # Returns (float64 vector in feature order, None) or (None, message)
+        values, error = self.validate(record)
+        if error:
+            return None, error
+        out = np.empty(self.n_features) if out is None else out
+        values.update(derive_record(values))
+        for name, slot in self.slots.items():
+            out[slot] = values[name]
+        return out, None
+
+    def range_errors(self, values):
+        # Vectorized range and code checks for the batch path. `values` maps
+        # raw field names to float arrays; returns {row: message}.
+        errors = {}
+        for name, spec in RAW_FIELDS.items():
+            column = np.asarray(values[name], dtype=np.float64)
+            if "codes" in spec:
+                bad = ~np.isin(column, spec["codes"])
+            else:
+                bad = (column < spec["range"][0]) | (column > spec["range"][1])
+            for row in np.flatnonzero(bad & ~np.isnan(column)):
+                message = range_error(name, float(column[row]))
+                errors[int(row)] = f"{errors[int(row)]}; {message}" if int(row) in errors else message
+        return errors
@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import VotingClassifier, StackingClassifier
+from sklearn.linear_model import LogisticRegression
+from .chd_model import (
+    DATA_LOADER, SELECTOR_SAMPLE_ROWS, tune_rf, tune_xgb, tune_lgbm, tune_catboost, evaluate_model,
+    prepare_training_data, save_preprocessing_artifacts, save_manifest, distill_ensembles, save_drift_reference
+)
+from .artifacts import atomic_dump, file_hash
+from .devices import resolve_device, training_backend, record_backend
+from . import tuning
+from .tuning import TUNE_PRUNER, EARLY_STOPPING_ROUNDS, EARLY_STOPPING_FRACTION
+
+CACHE_DIR = "models/.cache"
+
+TUNING_JOBS = {
+    "rf": ("models/random_forest.pkl", tune_rf),
+    "xgb": ("models/xgboost.pkl", tune_xgb),
+    "lgb": ("models/lightgbm.pkl", tune_lgbm),
+    "cat": ("models/catboost.pkl", tune_catboost),
+}
+
+
+def stage_key(stage, data_hash, params):
+    payload = json.dumps({"stage": stage, "data": data_hash, "params": params}, sort_keys=True, default=str)
+    return f"{stage}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+
+def tuner_version(tune_fn):
+    # Source hash of the tuner and of the shared CV and early-stopping code,
+    # so editing a search space, the CV setup or the final estimator's
+    # parameters re-runs the search instead of publishing the cached model
+    source = inspect.getsource(tune_fn) + inspect.getsource(tuning)
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+def publish(cache_path, model_path):
+    # Copy then rename, so the serving registry never sees a half-written file
+    tmp_path = f"{model_path}.tmp"
+    shutil.copyfile(cache_path, tmp_path)
+    os.replace(tmp_path, model_path)
+    backend_record = os.path.splitext(cache_path)[0] + ".backend.json"
+    if os.path.exists(backend_record):
+        shutil.copyfile(backend_record, os.path.splitext(model_path)[0] + ".backend.json")
+
+
+def cpu_budget(n_jobs_total, n_workers):
+    # Each concurrent tuning job gets an equal share of the cores, so nested
+    # n_jobs inside the estimators never oversubscribe the machine.
+    total = n_jobs_total if n_jobs_total and n_jobs_total > 0 else os.cpu_count() or 1
+    workers = max(1, min(n_workers, total))
+    return workers, max(1, total // workers)
+
+
+def set_thread_count(estimator, n_jobs):
+    params = estimator.get_params(deep=False)
+    if "thread_count" in params:
+        estimator.set_params(thread_count=n_jobs)
+    elif "n_jobs" in params:
+        estimator.set_params(n_jobs=n_jobs)
+    return estimator
+
+
+def load_prepared_data(data_path, data_hash, n_jobs):
+    key = stage_key("prepare", data_hash, {"smote_random_state": 42, "tomek": "kdtree", "selector": "rf100-median",
+                                              "selector_sample_rows": SELECTOR_SAMPLE_ROWS, "loader": DATA_LOADER})
+    prep_dir = os.path.join(CACHE_DIR, key)
+    meta_path = os.path.join(prep_dir, "preprocessing.pkl")
+    if os.path.exists(meta_path):
+        print(f"[prepare] cached ({key})")
+    else:
+        print(f"[prepare] running ({key})")
+        prep = prepare_training_data(data_path, n_jobs=n_jobs)
+        tmp_dir = f"{prep_dir}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in ("X_train", "y_train", "X_test", "y_test"):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), prep.pop(name))
+        joblib.dump(prep, os.path.join(tmp_dir, "preprocessing.pkl"))
+        shutil.rmtree(prep_dir, ignore_errors=True)
+        os.replace(tmp_dir, prep_dir)
+    return prep_dir
+
+
+def prepared_data_key(prep_dir, prep):
+    # Downstream stages are keyed on the prepare stage and the features it
+    # selected, not only on the raw data, so a changed preprocessing step
+    # never reuses models fitted on other inputs
+    support = np.asarray(prep["selector"].get_support(), dtype=bool)
+    return f"{os.path.basename(prep_dir)}-{hashlib.sha256(support.tobytes()).hexdigest()[:16]}"
+
+
+def open_prepared_data(prep_dir):
+    # Arrays are memory-mapped so concurrent tuning processes share the pages
+    prep = joblib.load(os.path.join(prep_dir, "preprocessing.pkl"))
+    for name in ("X_train", "y_train", "X_test", "y_test"):
+        prep[name] = np.load(os.path.join(prep_dir, f"{name}.npy"), mmap_mode="r")
+    return prep
+
+
+def run_tuning_job(name, prep_dir, prep_key, n_trials, n_jobs):
+    model_path, tune_fn = TUNING_JOBS[name]
+    backend = training_backend(n_jobs=n_jobs)
+    key = stage_key(f"tune_{name}", prep_key, {
+        "n_trials": n_trials, "tuner": tune_fn.__name__, "tuner_version": tuner_version(tune_fn),
+        "device": backend["device"], "pruner": TUNE_PRUNER, "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+        "early_stopping_fraction": EARLY_STOPPING_FRACTION
+    })
+    cache_path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    if os.path.exists(cache_path):
+        return name, cache_path, 0.0, True
+    start = time.perf_counter()
+    prep = open_prepared_data(prep_dir)
+    X, y = np.asarray(prep["X_train"]), np.asarray(prep["y_train"])
+    storage = f"sqlite:///{os.path.abspath(os.path.join(CACHE_DIR, f'optuna-{name}.db'))}"
+    model = tune_fn(X, y, n_trials=n_trials, n_jobs=n_jobs, storage=storage, study_name=key, backend=backend)
+    model.fit(X, y)
+    atomic_dump(model, cache_path)
+    record_backend(cache_path, backend, time.perf_counter() - start)
+    return name, cache_path, time.perf_counter() - start, False
+
+
+def fit_ensemble(kind, models, X, y, prep_key, n_jobs):
+    base_params = {name: model.get_params(deep=False) for name, model in models.items()}
+    key = stage_key(kind, prep_key, base_params)
+    cache_path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    if os.path.exists(cache_path):
+        print(f"[{kind}] cached ({key})")
+        return joblib.load(cache_path), cache_path
+    print(f"[{kind}] fitting ({key})")
+    n_workers, per_estimator = cpu_budget(n_jobs, len(models))
+    estimators = [(name, set_thread_count(clone(model), per_estimator)) for name, model in models.items()]
+    if kind == "voting":
+        ensemble = VotingClassifier(estimators=estimators, voting="soft", n_jobs=n_workers)
+    else:
+        ensemble = StackingClassifier(estimators=estimators, final_estimator=LogisticRegression(max_iter=2000), cv=5, n_jobs=n_workers)
+    ensemble.fit(X, y)
+    atomic_dump(ensemble, cache_path)
+    return ensemble, cache_path
+
+
+def orchestrate(data_path="data/cardio.csv", n_trials=100, n_jobs=None, max_workers=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    started = time.perf_counter()
+    data_hash = file_hash(data_path)
+    total_cpus = n_jobs or os.cpu_count() or 1
+    prep_dir = load_prepared_data(data_path, data_hash, total_cpus)
+    prep = open_prepared_data(prep_dir)
+    X_train, y_train = np.asarray(prep["X_train"]), np.asarray(prep["y_train"])
+    X_test, y_test = np.asarray(prep["X_test"]), np.asarray(prep["y_test"])
+    prep_key = prepared_data_key(prep_dir, prep)
+
+    n_workers, per_job = cpu_budget(total_cpus, max_workers or len(TUNING_JOBS))
+    print(f"[tune] {len(TUNING_JOBS)} jobs on {n_workers} processes x {per_job} threads ({resolve_device().upper()})")
+    models = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(run_tuning_job, name, prep_dir, prep_key, n_trials, per_job) for name in TUNING_JOBS]
+        for future in as_completed(futures):
+            name, cache_path, seconds, cached = future.result()
+            print(f"[tune_{name}] {'cached' if cached else f'done in {seconds:.1f}s'}")
+            publish(cache_path, TUNING_JOBS[name][0])
+            models[name] = joblib.load(cache_path)
+
+    lr_key = stage_key("lr", prep_key, {"C": 0.1, "solver": "liblinear"})
+    lr_path = os.path.join(CACHE_DIR, f"{lr_key}.pkl")
+    if not os.path.exists(lr_path):
+        lr = LogisticRegression(max_iter=2000, C=0.1, penalty='l2', solver='liblinear', random_state=42)
+        lr.fit(X_train, y_train)
+        atomic_dump(lr, lr_path)
+    publish(lr_path, "models/logistic_regression.pkl")
+    models = {"lr": joblib.load(lr_path), **{name: models[name] for name in TUNING_JOBS}}
+
+    model_metrics = {name: evaluate_model(model, X_test, y_test, name) for name, model in models.items()}
+    voting, voting_path = fit_ensemble("voting", models, X_train, y_train, prep_key, total_cpus)
+    publish(voting_path, "models/voting_ensemble.pkl")
+    stacking, stacking_path = fit_ensemble("stacking", models, X_train, y_train, prep_key, total_cpus)
+    publish(stacking_path, "models/stacking_model.pkl")
+    model_metrics["ensemble"] = evaluate_model(voting, X_test, y_test, "Voting Ensemble")
+    model_metrics["stacking"] = evaluate_model(stacking, X_test, y_test, "Stacking Ensemble")
+    student_metrics, students = distill_ensembles(prep, {"ensemble": voting, "stacking": stacking}, data_path, total_cpus)
+    model_metrics.update(student_metrics)
+
+    save_preprocessing_artifacts(prep)
+    joblib.dump(model_metrics, "models/model_metrics.pkl")
+    save_manifest(prep, model_metrics, {**models, "ensemble": voting, "stacking": stacking, **students}, data_hash)
+    save_drift_reference(prep, {**models, "ensemble": voting, "stacking": stacking, **students}, data_path)
+    print(f"Training finished in {time.perf_counter() - started:.1f}s")
+    return model_metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable training of all CHD models")
+    parser.add_argument("--data", default="data/cardio.csv")
+    parser.add_argument("--n-trials", type=int, default=100)
+    parser.add_argument("--n-jobs", type=int, default=None, help="Total CPU budget (default: all cores)")
+    parser.add_argument("--max-workers", type=int, default=None, help="Concurrent tuning processes")
+    args = parser.parse_args()
+    metrics = orchestrate(args.data, args.n_trials, args.n_jobs, args.max_workers)
+    print("\nFINAL RESULTS SUMMARY:")
+    print("=" * 50)
+    for model_name, metric in metrics.items():
+        print(f"{model_name.upper()}: Acc={metric['accuracy']:.4f}, AUC={metric['auc']:.4f}, Recall={metric['recall']:.4f}")
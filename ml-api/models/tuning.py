@@ -0,0 +1,180 @@
+import json
+import os
+import numpy as np
+import optuna
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+# median | halving | none
+TUNE_PRUNER = os.environ.get("CHD_TUNE_PRUNER", "median").lower()
+EARLY_STOPPING_ROUNDS = int(os.environ.get("CHD_EARLY_STOPPING_ROUNDS", "50"))
+# Share of each training fold held out to drive early stopping; the scoring
+# fold is never seen before it is scored
+EARLY_STOPPING_FRACTION = float(os.environ.get("CHD_EARLY_STOPPING_FRACTION", "0.15"))
+REPORT_DIR = "models/tuning"
+
+# Boosting rounds of the first fold are reported as steps 0..n_rounds; the
+# running mean after each fold is reported from this step on, so the two
+# kinds of intermediate values never share a step.
+FOLD_STEP_OFFSET = 100000
+
+
+def make_pruner(kind=None):
+    kind = (kind or TUNE_PRUNER).lower()
+    if kind == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=20)
+    if kind == "halving":
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=20, reduction_factor=3)
+    if kind == "none":
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unknown pruner '{kind}', expected median, halving or none")
+
+
+def run_study(objective, n_trials, storage=None, study_name=None, label=None):
+    # With a storage URL the study is resumable: finished trials are kept and
+    # only the remainder of n_trials is run.
+    study = optuna.create_study(direction="maximize", storage=storage, study_name=study_name,
+                                load_if_exists=storage is not None, pruner=make_pruner(),
+                                sampler=optuna.samplers.TPESampler(seed=42))
+    finished = [t for t in study.trials if t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)]
+    if len(finished) < n_trials:
+        study.optimize(objective, n_trials=n_trials - len(finished))
+    save_report(study, label or study.study_name)
+    return study
+
+
+def tuning_report(study):
+    complete = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+    pruned = [t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED]
+    seconds = lambda trials: [t.duration.total_seconds() for t in trials if t.duration is not None]
+    complete_seconds, pruned_seconds = seconds(complete), seconds(pruned)
+    # A pruned trial would have cost about as much as an average completed one
+    mean_complete = float(np.mean(complete_seconds)) if complete_seconds else 0.0
+    saved = sum(max(0.0, mean_complete - s) for s in pruned_seconds)
+    spent = sum(complete_seconds) + sum(pruned_seconds)
+    return {
+        "trials": len(study.trials),
+        "complete": len(complete),
+        "pruned": len(pruned),
+        "best_value": study.best_value if complete else None,
+        "seconds_spent": round(spent, 1),
+        "seconds_saved_estimate": round(saved, 1),
+        "saved_fraction": round(saved / (spent + saved), 3) if spent + saved else 0.0,
+    }
+
+
+def save_report(study, label):
+    report = tuning_report(study)
+    print(f"[{label}] {report['complete']} complete, {report['pruned']} pruned, "
+          f"{report['seconds_spent']:.0f}s spent, ~{report['seconds_saved_estimate']:.0f}s saved by pruning")
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    with open(os.path.join(REPORT_DIR, f"{label}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+class RoundReporter:
+    # Reports per-round validation AUC of the first fold to Optuna. When the
+    # pruner gives up on the trial, `pruned` is set and the library is asked
+    # to stop training; the objective raises TrialPruned once fit returns.
+    def __init__(self, trial):
+        self.trial = trial
+        self.pruned = False
+
+    def report(self, step, value):
+        if self.trial is None or self.pruned:
+            return self.pruned
+        self.trial.report(value, step)
+        self.pruned = self.trial.should_prune()
+        return self.pruned
+
+
+def lightgbm_callback(reporter):
+    def callback(env):
+        for _, metric, value, _ in env.evaluation_result_list:
+            if metric == "auc" and reporter.report(env.iteration, value):
+                import lightgbm
+                raise lightgbm.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+    callback.order = 30
+    return callback
+
+
+def xgboost_callback(reporter):
+    from xgboost.callback import TrainingCallback
+
+    class Callback(TrainingCallback):
+        def after_iteration(self, model, epoch, evals_log):
+            scores = next(iter(evals_log.values()), {}).get("auc")
+            return bool(scores) and reporter.report(epoch, scores[-1])
+
+    return Callback()
+
+
+class CatBoostCallback:
+    def __init__(self, reporter):
+        self.reporter = reporter
+
+    def after_iteration(self, info):
+        scores = info.metrics.get("validation", {}).get("AUC")
+        return not (scores and self.reporter.report(info.iteration, scores[-1]))
+
+
+def fit_booster(clf, X_train, y_train, X_valid, y_valid, reporter):
+    # Native early stopping on the given validation split, plus round-level
+    # pruning.
+    name = type(clf).__name__
+    if name == "XGBClassifier":
+        clf.set_params(eval_metric="auc", early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                       callbacks=[xgboost_callback(reporter)] if reporter else None)
+        clf.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], verbose=False)
+        return clf.best_iteration + 1
+    if name == "LGBMClassifier":
+        import lightgbm
+        callbacks = [lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)]
+        if reporter:
+            callbacks.append(lightgbm_callback(reporter))
+        clf.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], eval_metric="auc", callbacks=callbacks)
+        return clf.best_iteration_ or clf.n_estimators
+    if name == "CatBoostClassifier":
+        clf.set_params(eval_metric="AUC", early_stopping_rounds=EARLY_STOPPING_ROUNDS, use_best_model=True)
+        gpu = str(clf.get_params().get("task_type", "CPU")).upper() == "GPU"
+        callbacks = [CatBoostCallback(reporter)] if reporter and not gpu else None
+        clf.fit(X_train, y_train, eval_set=(X_valid, y_valid), callbacks=callbacks)
+        return clf.get_best_iteration() + 1
+    clf.fit(X_train, y_train)
+    return None
+
+
+def cv_score(trial, clf, X, y, n_splits=3, early_stopping=False):
+    # Stratified CV AUC. The running mean is reported after every fold so
+    # hopeless trials stop after the first one; boosters additionally use early
+    # stopping on an inner split of the training fold and report every round
+    # of the first fold. The mean best iteration is stored on the trial for
+    # the final fit.
+    X, y = np.asarray(X), np.asarray(y)
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    scores, best_iterations = [], []
+    for fold, (train_index, valid_index) in enumerate(folds.split(X, y)):
+        model = clone(clf)
+        reporter = RoundReporter(trial) if early_stopping and fold == 0 else None
+        if early_stopping:
+            fit_index, stop_index = train_test_split(train_index, test_size=EARLY_STOPPING_FRACTION,
+                                                     stratify=y[train_index], random_state=42)
+            best_iterations.append(fit_booster(model, X[fit_index], y[fit_index],
+                                               X[stop_index], y[stop_index], reporter))
+            if reporter and reporter.pruned:
+                raise optuna.TrialPruned()
+        else:
+            model.fit(X[train_index], y[train_index])
+        scores.append(roc_auc_score(y[valid_index], model.predict_proba(X[valid_index])[:, 1]))
+        trial.report(float(np.mean(scores)), FOLD_STEP_OFFSET + fold)
+        if fold < n_splits - 1 and trial.should_prune():
+            raise optuna.TrialPruned()
+    if best_iterations:
+        trial.set_user_attr("best_iteration", int(np.mean(best_iterations)))
+    return float(np.mean(scores))
+
+
+def best_iteration(study, default):
+    return study.best_trial.user_attrs.get("best_iteration", default)
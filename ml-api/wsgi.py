@@ -0,0 +1,31 @@
+import gc
+import logging
+import os
+import sys
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+
+import app as ml_app
+
+logger = logging.getLogger("ml_api")
+
+
+def prepare():
+    # Runs once in the gunicorn master (preload_app). Everything loaded here is
+    # inherited by the forked workers and shared copy-on-write.
+    missing = ml_app.missing_artifacts()
+    if missing:
+        raise SystemExit(f"Missing model artifacts: {missing}. Run python -m models.chd_model first.")
+    loaded = ml_app.model_registry.preload()
+    if not loaded:
+        raise SystemExit(f"No model files found; expected any of {list(ml_app.MODEL_PATHS.values())}")
+    logger.warning("Preloaded models before fork: %s", loaded)
+    # Move everything allocated so far out of the collector's generations so
+    # that gc passes in the workers do not touch (and copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+prepare()
+application = ml_app.app